@@ -0,0 +1,323 @@
+"""
+   Micro- and macro-benchmarks for the tracking pipeline, on synthetic bodies (no camera needed).
+
+   python -m benchmarks.benchmark_pipeline --output results.json
+   python -m benchmarks.benchmark_pipeline --compare results.json      # 与上一次的结果对比
+"""
+import argparse
+import json
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import cv2
+
+import modules.emotion_recognition as er
+import modules.frame_codec as fc
+import modules.interaction_checker as ic
+import modules.posture_checker as pc
+import cv_viewer.tracking_viewer as cv_viewer
+from modules.behavior_state import BehaviorStateEngine
+from modules.body_arrays import BodyArrays
+from modules.body_sources import SyntheticSource
+from modules.change_detector import ChangeDetector
+from modules.coordinates import frame_matrix, transform_points
+from modules.keypoint_filter import KeypointSmoother
+from modules.pipeline import LatestQueue, Pipeline, Stage
+from modules.social_groups import GroupTracker
+from modules.udp_publisher import UdpPublisher
+
+
+def measure(fn, min_time=0.2, min_calls=5):
+    """
+    反复调用 fn 至少 min_time 秒、min_calls 次
+
+    返回值:
+    dict: calls, mean_us, p50_us, p90_us, min_us
+    """
+    fn()    # 预热
+    times = []
+    start = time.perf_counter()
+    while len(times) < min_calls or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    times = np.array(times) * 1e6
+    return {
+        "calls": len(times),
+        "mean_us": float(times.mean()),
+        "p50_us": float(np.percentile(times, 50)),
+        "p90_us": float(np.percentile(times, 90)),
+        "min_us": float(times.min()),
+    }
+
+
+def synthetic_frame(people, steps=3):
+    """
+    返回值:
+    tuple: (BodyArrays, body_views, image)，图像为 1280×720 BGRA 噪声图 (比纯黑图更接近真实的 JPEG 编码开销)
+    """
+    source = SyntheticSource(people)
+    body_arrays = BodyArrays(source.keypoint_count)
+    for _ in range(steps):
+        body_list, _, _ = source.read(body_arrays, want_image=False)
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 255, (source.display_resolution[1], source.display_resolution[0], 4), dtype=np.uint8)
+    return body_arrays, body_list, image
+
+
+def sdk_like_bodies(body_arrays, body_list):
+    """
+    给 BodyView 补上 serializeBodyData 需要而 BodyArrays 没有的属性，模拟 sl.Bodies
+    """
+    for body in body_list:
+        body.unique_object_id = "synthetic-%d" % body.id
+        body.action_state = "IDLE"
+        body.bounding_box = np.zeros((8, 3), dtype=np.float32)
+        body.keypoints_covariance = np.zeros((body_arrays.keypoint_count, 6), dtype=np.float32)
+        body.local_position_per_joint = np.zeros((0, 3), dtype=np.float32)
+        body.local_orientation_per_joint = np.zeros((0, 4), dtype=np.float32)
+    return SimpleNamespace(is_new=True, is_tracked=True, body_list=body_list,
+                           timestamp=SimpleNamespace(data_ns=body_arrays.timestamp_ns))
+
+
+def micro_benchmarks(people, min_time):
+    """
+    返回值:
+    list: [{"name", "people", "calls", "mean_us", ...} 或 {"name", "people", "skipped"}, ...]
+    """
+    body_arrays, body_list, image = synthetic_frame(people)
+    count = body_arrays.count
+    ids, keypoints = body_arrays.ids[:count], body_arrays.keypoints[:count]
+    body_dicts = body_arrays.body_dicts()
+    binary_frame = fc.encode_frame(ids, keypoints, body_arrays.timestamp_ns, 1)
+    state_engine = BehaviorStateEngine()
+    states = state_engine.compute(keypoints, ids)
+    smoother = KeypointSmoother(body_arrays.keypoint_count)
+    detector = ChangeDetector(0.01, keyframe_interval=1e9)
+    world_matrix = frame_matrix("world", np.eye(4))
+    groups = GroupTracker()
+    rects, valid = er.head_crop_rects(body_arrays.head_bounding_box_2d[:count], image.shape)
+    rects = rects[valid]
+    clock = [0.0]
+
+    def smooth():
+        clock[0] += 1 / 30
+        smoother.filter(ids, keypoints, clock[0])
+
+    benches = [
+        ("body_arrays.copy", lambda: body_arrays.copy()),
+        ("body_arrays.body_dicts", lambda: body_arrays.body_dicts()),
+        ("encode_text", lambda: fc.encode_text(ids, keypoints)),
+        ("encode_frame", lambda: fc.encode_frame(ids, keypoints, body_arrays.timestamp_ns, 1)),
+        ("encode_states", lambda: fc.encode_states(ids, states, body_arrays.timestamp_ns, 1)),
+        ("decode_frame", lambda: fc.decode_frame(binary_frame)),
+        ("decode_frame_py", lambda: fc.decode_frame_py(binary_frame)),
+        ("classify_posture (per person)", lambda: [pc.classify_posture(k) for k in keypoints]),
+        ("classify_postures", lambda: pc.classify_postures(keypoints)),
+        ("check_interaction", lambda: ic.check_interaction(body_dicts)),
+        ("check_interaction_using_head", lambda: ic.check_interaction_using_head(body_dicts)),
+        ("interaction_matrices", lambda: ic.interaction_matrices_from_bodies(body_arrays)),
+        ("group_tracker.update", lambda: groups.update_from_bodies(body_arrays)),
+        ("behavior_state.compute", lambda: state_engine.compute(keypoints, ids)),
+        ("keypoint_smoother.filter", smooth),
+        ("change_detector.select", lambda: detector.select(ids, keypoints)),
+        ("transform_points (world)", lambda: transform_points(keypoints, world_matrix)),
+        ("emotion imencode frame", lambda: cv2.imencode('.jpg', image[:, :, :3])),
+        ("emotion head mosaic + imencode", lambda: cv2.imencode('.jpg', er.build_head_mosaic(image, rects)[0])),
+        ("cv_viewer.render_2D", lambda: cv_viewer.render_2D(image.copy(), [1.0, 1.0], body_list, True, "BODY_34")),
+    ]
+
+    bodies = sdk_like_bodies(body_arrays, body_arrays.body_views())
+    benches.append(("serializeBodies", lambda: fc.serializeBodies(bodies)))
+
+    try:
+        import ogl_viewer.viewer as gl
+
+        def build_skeletons():
+            for body in body_list:
+                gl.Skeleton("BODY_34").set(body)
+
+        benches.append(("ogl Skeleton.set", build_skeletons))
+        benches.append(("ogl Simple3DObject.add_sphere", lambda: gl.Simple3DObject(True).add_sphere()))
+    except ImportError as e:
+        benches.append(("ogl Skeleton.set", e))
+        benches.append(("ogl Simple3DObject.add_sphere", e))
+
+    results = []
+    for name, fn in benches:
+        if isinstance(fn, Exception):
+            results.append({"name": name, "people": people, "skipped": "missing dependency: %s" % fn})
+            continue
+        result = {"name": name, "people": people}
+        result.update(measure(fn, min_time))
+        results.append(result)
+    return results
+
+
+def end_to_end(people, duration):
+    """
+    用 SyntheticSource 以最快速度驱动 capture / analysis / publish 三个阶段，
+    每帧的工作与 main() 相近 (平滑、状态、变化检测、二进制编码、UDP 发送到本机)，另外更新社交群体；不含表情识别和显示
+
+    返回值:
+    dict: people, seconds, captured, analyzed, published, fps, dropped
+    """
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sink.settimeout(0.1)
+    draining = threading.Event()
+    draining.set()
+
+    def drain():
+        while draining.is_set():
+            try:
+                sink.recv(65536)
+            except OSError:
+                pass
+
+    drain_thread = threading.Thread(target=drain, daemon=True)
+    drain_thread.start()
+    address = sink.getsockname()
+    publisher = UdpPublisher({"skeleton": address, "states": address})
+
+    source = SyntheticSource(people)
+    body_arrays = BodyArrays(source.keypoint_count)
+    smoother = KeypointSmoother(source.keypoint_count)
+    state_engine = BehaviorStateEngine()
+    groups = GroupTracker()
+    detectors = {"skeleton": ChangeDetector(0.01), "states": ChangeDetector(0.02)}
+    sequence = [0]
+
+    def capture():
+        if source.read(body_arrays, want_image=False) is None:
+            return None
+        smoother.apply(body_arrays)
+        sequence[0] += 1
+        return (sequence[0], body_arrays.copy())
+
+    def analyze(item):
+        frame_sequence, bodies = item
+        ids, keypoints = bodies.ids, bodies.keypoints
+        states = state_engine.compute(keypoints, ids)
+        groups.update_from_bodies(bodies)
+        packets = []
+        send, keyframe = detectors["states"].select(ids, states)
+        if send.any() or keyframe:
+            packets.append(("states", fc.encode_states(ids[send], states[send], bodies.timestamp_ns, frame_sequence, keyframe)))
+        send, keyframe = detectors["skeleton"].select(ids, keypoints)
+        if send.any() or keyframe:
+            packets.append(("skeleton", fc.encode_frame(ids[send], keypoints[send], bodies.timestamp_ns, frame_sequence, keyframe=keyframe)))
+        return packets
+
+    def publish(packets):
+        for channel, payload in packets:
+            publisher.send(channel, payload)
+        return None
+
+    analysis_inbox = LatestQueue(maxsize=1)
+    publish_inbox = LatestQueue(maxsize=4)
+    stages = [
+        Stage("capture", capture, outputs=[analysis_inbox]),
+        Stage("analysis", analyze, inbox=analysis_inbox, outputs=[publish_inbox]),
+        Stage("publish", publish, inbox=publish_inbox),
+    ]
+    pipeline = Pipeline(stages)
+    start = time.perf_counter()
+    pipeline.start()
+    time.sleep(duration)
+    pipeline.stop()
+    elapsed = time.perf_counter() - start
+    draining.clear()
+    drain_thread.join()
+    publisher.close()
+    sink.close()
+
+    captured, analyzed, published = (stage.stats.count for stage in stages)
+    return {
+        "people": people,
+        "seconds": elapsed,
+        "captured": captured,
+        "analyzed": analyzed,
+        "published": published,
+        "fps": analyzed / elapsed,
+        "capture_fps": captured / elapsed,
+        "dropped": analysis_inbox.dropped,
+        "udp": publisher.stats(),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(previous, current):
+    """
+    打印两次结果中同名项的耗时 / fps 比值 (>1 表示变快)
+    """
+    def index(results):
+        return {(item["name"], item["people"]): item for item in results.get("micro", []) if "mean_us" in item}
+
+    before, after = index(previous), index(current)
+    print("%-34s %6s %12s %12s %8s" % ("benchmark", "people", "before us", "after us", "speedup"))
+    for key in sorted(after, key=lambda k: (k[0], k[1])):
+        if key in before:
+            print("%-34s %6d %12.1f %12.1f %7.2fx" % (key[0], key[1], before[key]["p50_us"], after[key]["p50_us"],
+                                                     before[key]["p50_us"] / max(after[key]["p50_us"], 1e-9)))
+    before_e2e = {item["people"]: item for item in previous.get("end_to_end", [])}
+    for item in current.get("end_to_end", []):
+        if item["people"] in before_e2e:
+            old = before_e2e[item["people"]]["fps"]
+            print("%-34s %6d %10.1f fps %8.1f fps %6.2fx" % ("end_to_end", item["people"], old, item["fps"],
+                                                            item["fps"] / max(old, 1e-9)))
+
+
+def main():
+    results = {"environment": environment(), "micro": [], "end_to_end": []}
+    for people in opt.people:
+        if not opt.skip_micro:
+            print("micro benchmarks, %d people ..." % people, file=sys.stderr)
+            results["micro"].extend(micro_benchmarks(people, opt.min_time))
+        if not opt.skip_e2e:
+            print("end-to-end, %d people ..." % people, file=sys.stderr)
+            results["end_to_end"].append(end_to_end(people, opt.duration))
+
+    text = json.dumps(results, indent=2)
+    if opt.output:
+        with open(opt.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if opt.compare:
+        with open(opt.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--people', type=int, nargs='+', help='Number of synthetic people to benchmark with', default = [1, 5, 20, 50])
+    parser.add_argument('--min_time', type=float, help='Minimum seconds spent on each micro-benchmark', default = 0.2)
+    parser.add_argument('--duration', type=float, help='Seconds of each end-to-end run', default = 3.0)
+    parser.add_argument('--skip_micro', action='store_true', help='Only run the end-to-end benchmark')
+    parser.add_argument('--skip_e2e', action='store_true', help='Only run the micro-benchmarks')
+    parser.add_argument('--output', type=str, help='Write the JSON results to this file instead of stdout', default = '')
+    parser.add_argument('--compare', type=str, help='Previous JSON results to compare against', default = '')
+    opt = parser.parse_args()
+    main()
@@ -22,25 +22,30 @@
    This sample shows how to detect a human bodies and draw their 
    modelised skeleton in an OpenGL window
 """
-import cv2
-import sys
-import pyzed.sl as sl
-import ogl_viewer.viewer as gl
-import cv_viewer.tracking_viewer as cv_viewer
-import numpy as np
 import argparse
 import json
-import socket
+import queue
+import signal
 import time
 
-import modules.interaction_checker as ic
-import modules.posture_checker as pc
 import modules.emotion_recognition as er
+import modules.frame_codec as fc
+from modules.body_arrays import BodyArrays
+from modules.body_sources import open_source
+from modules.multi_camera import MultiCameraSource
+from modules.keypoint_filter import KeypointSmoother
+from modules.change_detector import ChangeDetector
+from modules.session_recorder import SessionRecorder
+from modules.metrics import MetricsRegistry, MetricsServer
+from modules.udp_publisher import UdpPublisher
+from modules.pipeline import DoubleBuffer, Frame, LatestQueue, Pipeline, Stage
+from modules.display import EVENT_PAUSE, EVENT_QUIT, DisplayThread
+from modules.emotion_cache import EmotionCache
+from modules.emotion_backends import create_backend
+from modules.behavior_state import BehaviorStateEngine
+from modules.social_groups import GroupTracker
 
-import os
 import threading
-from google.cloud import vision
-from google.oauth2 import service_account
 
 # Google Vision相关
 # os.environ['http_proxy'] = 'http://127.0.0.1:52031'
@@ -52,274 +57,318 @@ from google.oauth2 import service_account
 # )
 # client = vision.ImageAnnotatorClient(credentials=credentials)
 
-# Function to send keypoints over UDP
-def send_keypoints_over_udp(keypoints, host, port):
-    # Create a UDP socket
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    server_address = (host, port)
-
-    try:
-        # Convert keypoints to bytes
-        keypoints_bytes = keypoints.encode()
-
-        # Send keypoints over UDP
-        sock.sendto(keypoints_bytes, server_address)
-        # print("Keypoints sent successfully.")
-    except Exception as e:
-        print(f"Error sending data: {e}")
-    finally:
-        sock.close()
-
-def addIntoOutput(out, identifier, tab):
-    out[identifier] = []
-    for element in tab:
-        out[identifier].append(element)
-    return out
-
-def serializeBodyData(body_data):
-    """Serialize BodyData into a JSON like structure"""
-    out = {}
-    out["id"] = body_data.id
-    out["unique_object_id"] = str(body_data.unique_object_id)
-    out["tracking_state"] = str(body_data.tracking_state)
-    out["action_state"] = str(body_data.action_state)
-    addIntoOutput(out, "position", body_data.position)
-    addIntoOutput(out, "velocity", body_data.velocity)
-    addIntoOutput(out, "bounding_box_2d", body_data.bounding_box_2d)
-    out["confidence"] = body_data.confidence
-    addIntoOutput(out, "bounding_box", body_data.bounding_box)
-    addIntoOutput(out, "dimensions", body_data.dimensions)
-    addIntoOutput(out, "keypoint_2d", body_data.keypoint_2d)
-    addIntoOutput(out, "keypoint", body_data.keypoint)
-    addIntoOutput(out, "keypoint_cov", body_data.keypoints_covariance)
-    addIntoOutput(out, "head_bounding_box_2d", body_data.head_bounding_box_2d)
-    addIntoOutput(out, "head_bounding_box", body_data.head_bounding_box)
-    addIntoOutput(out, "head_position", body_data.head_position)
-    addIntoOutput(out, "keypoint_confidence", body_data.keypoint_confidence)
-    addIntoOutput(out, "local_position_per_joint", body_data.local_position_per_joint)
-    addIntoOutput(out, "local_orientation_per_joint", body_data.local_orientation_per_joint)
-    addIntoOutput(out, "global_root_orientation", body_data.global_root_orientation)
-    return out
-
-def serializeBodies(bodies):
-    """Serialize Bodies objects into a JSON like structure"""
-    out = {}
-    out["is_new"] = bodies.is_new
-    out["is_tracked"] = bodies.is_tracked
-    out["timestamp"] = bodies.timestamp.data_ns
-    out["body_list"] = []
-    for sk in bodies.body_list:
-        out["body_list"].append(serializeBodyData(sk))
-    return out
-
-def parse_args(init):
-    if len(opt.input_svo_file)>0 and opt.input_svo_file.endswith(".svo"):
-        init.set_from_svo_file(opt.input_svo_file)
-        print("[Sample] Using SVO File input: {0}".format(opt.input_svo_file))
-    elif len(opt.ip_address)>0 :
-        ip_str = opt.ip_address
-        if ip_str.replace(':','').replace('.','').isdigit() and len(ip_str.split('.'))==4 and len(ip_str.split(':'))==2:
-            init.set_from_stream(ip_str.split(':')[0],int(ip_str.split(':')[1]))
-            print("[Sample] Using Stream input, IP : ",ip_str)
-        elif ip_str.replace(':','').replace('.','').isdigit() and len(ip_str.split('.'))==4:
-            init.set_from_stream(ip_str)
-            print("[Sample] Using Stream input, IP : ",ip_str)
-        else :
-            print("Unvalid IP format. Using live stream")
-    if ("HD2K" in opt.resolution):
-        init.camera_resolution = sl.RESOLUTION.HD2K
-        print("[Sample] Using Camera in resolution HD2K")
-    elif ("HD1200" in opt.resolution):
-        init.camera_resolution = sl.RESOLUTION.HD1200
-        print("[Sample] Using Camera in resolution HD1200")
-    elif ("HD1080" in opt.resolution):
-        init.camera_resolution = sl.RESOLUTION.HD1080
-        print("[Sample] Using Camera in resolution HD1080")
-    elif ("HD720" in opt.resolution):
-        init.camera_resolution = sl.RESOLUTION.HD720
-        print("[Sample] Using Camera in resolution HD720")
-    elif ("SVGA" in opt.resolution):
-        init.camera_resolution = sl.RESOLUTION.SVGA
-        print("[Sample] Using Camera in resolution SVGA")
-    elif ("VGA" in opt.resolution):
-        init.camera_resolution = sl.RESOLUTION.VGA
-        print("[Sample] Using Camera in resolution VGA")
-    elif len(opt.resolution)>0: 
-        print("[Sample] No valid resolution entered. Using default")
-    else : 
-        print("[Sample] Using default resolution")
-
 def main():
     last_udp_send_time = time.time()
+    last_emotion_time = 0.0
     udp_send_interval = 0.5  # 发送间隔时间，单位为秒
-    print("Running Body Tracking sample ... Press 'q' to quit, or 'm' to pause or restart")
-
-    # Create a Camera object
-    zed = sl.Camera()
-
-    # Create a InitParameters object and set configuration parameters
-    init_params = sl.InitParameters()
-    init_params.camera_resolution = sl.RESOLUTION.HD1080  # Use HD1080 video mode
-    init_params.coordinate_units = sl.UNIT.METER          # Set coordinate units
-    init_params.depth_mode = sl.DEPTH_MODE.ULTRA
-    init_params.coordinate_system = sl.COORDINATE_SYSTEM.RIGHT_HANDED_Y_UP  # Set coordinate system
-    
-    parse_args(init_params)
-
-    # Open the camera
-    err = zed.open(init_params)
-    if err != sl.ERROR_CODE.SUCCESS:
-        exit(1)
-
-    # Enable Positional tracking (mandatory for object detection)
-    positional_tracking_parameters = sl.PositionalTrackingParameters()
-    # If the camera is static, uncomment the following line to have better performances
-    # positional_tracking_parameters.set_as_static = True
-    # Set the initial position of the Camera Frame at 1m80 above the World Frame
-    initial_position = sl.Transform()
-    initial_translation = sl.Translation()
-    # initial_translation.init_vector(0, 0, 1.8)  # 1.8 meters above the world frame
-    initial_position.set_translation(initial_translation)
-    positional_tracking_parameters.set_initial_world_transform(initial_position)
-    zed.enable_positional_tracking(positional_tracking_parameters)
-    camera_pose = sl.Pose()
-
-    body_param = sl.BodyTrackingParameters()
-    body_param.enable_tracking = True                # Track people across images flow
-    body_param.enable_body_fitting = False            # Smooth skeleton move
-    body_param.detection_model = sl.BODY_TRACKING_MODEL.HUMAN_BODY_FAST 
-    body_param.body_format = sl.BODY_FORMAT.BODY_34  # Choose the BODY_FORMAT you wish to use
-    zed.enable_body_tracking(body_param)
-
-    body_runtime_param = sl.BodyTrackingRuntimeParameters()
-    body_runtime_param.detection_confidence_threshold = 40
-
-    # Get ZED camera information
-    camera_info = zed.get_camera_information()
+    if opt.headless:
+        print("Running Body Tracking headless ... Send SIGINT / SIGTERM to quit")
+    else:
+        print("Running Body Tracking sample ... Press 'q' to quit, or 'm' to pause or restart")
+
+    # Ctrl+C / SIGTERM (systemd、docker stop) 都走正常的退出流程，保证录制和套接字被关闭
+    stop = threading.Event()
+    def request_stop(signum, _frame):
+        print("Exiting (signal %d)..." % signum)
+        stop.set()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    # 数据源：ZED 相机 / SVO / 录制的会话 / JSON，后面的分析、发送和显示都只依赖 BodySource
+    if opt.cameras:
+        # 多相机：每台相机一个进程，人体在世界坐标系中融合 (modules/multi_camera.py)
+        source = MultiCameraSource(opt.cameras, real_time=opt.replay_mode == 'realtime', loop=opt.replay_loop,
+                                   match_distance=opt.fusion_distance, fusion_rate=opt.fusion_rate).open()
+    else:
+        source = open_source(input_svo_file=opt.input_svo_file, ip_address=opt.ip_address, resolution=opt.resolution,
+                             replay=opt.replay, real_time=opt.replay_mode == 'realtime', loop=opt.replay_loop)
+
+    # 启动中任何一步失败 (例如缺少 PyOpenGL) 也要走下面的关闭流程，保证相机、工作线程和录制文件被关闭
+    emotion_service = publisher = recorder = display = pipeline = metrics_server = None
+    try:
+        # 各阶段的延迟直方图：每 5 秒打印一次 p50 / p99，--metrics_port 打开本机 HTTP 页面
+        metrics = MetricsRegistry()
+        source.metrics = metrics
 
-    # 2D viewer utilities
-    display_resolution = sl.Resolution(min(camera_info.camera_configuration.resolution.width, 1280), min(camera_info.camera_configuration.resolution.height, 720))
-    image_scale = [display_resolution.width / camera_info.camera_configuration.resolution.width
-                 , display_resolution.height / camera_info.camera_configuration.resolution.height]
+        # 2D viewer utilities
+        image_scale = source.image_scale
 
-    # Create OpenGL viewer
-    viewer = gl.GLViewer()
-    viewer.init(camera_info.camera_configuration.calibration_parameters.left_cam, body_param.enable_tracking,body_param.body_format)
-    
-    # Create ZED objects filled in the main loop
-    bodies = sl.Bodies()
-    image = sl.Mat()
-    
-    key_wait = 10 
-    expressions_list = []
-    expression_averages = {}
-    expression_on_headwearer = {}
-    last_api_call_time = time.time()
-    # Define the UDP server address and port
-    udp_server_host = '192.168.1.251'       #'100.78.20.208'   # Change this to the server IP address
-    # udp_server_port = 11111                 # Change this to the desired port number
+        # Filled in the capture stage
+        body_arrays = BodyArrays(keypoint_count=source.keypoint_count)
+        # body fitting 关闭时关键点抖动较大，平滑后下游的几何更新也更少
+        smoother = KeypointSmoother(keypoint_count=source.keypoint_count, min_cutoff=opt.smoothing_min_cutoff, beta=opt.smoothing_beta) if opt.smoothing == 'one_euro' else None
     
+        frame_sequence = 0
+        paused = threading.Event()
+        emotion_cache = EmotionCache(ttl=opt.emotion_ttl)
+        # 回放录制数据 / 多相机时没有图像，不需要表情识别后端 (也就不需要 google-cloud-vision 和凭据)
+        if source.has_images:
+            if opt.emotion_backend == 'local':
+                emotion_backend = create_backend('local', expression_model=opt.emotion_model, face_model=opt.face_model or None)
+            elif opt.emotion_backend == 'mock':
+                emotion_backend = create_backend('mock', url=opt.mock_emotion_url)
+            else:
+                emotion_backend = create_backend('google')
+            emotion_service = er.EmotionService(emotion_backend, workers=1, on_result=emotion_cache.update)
+        # Define the UDP server address and port
+        udp_server_host = '192.168.1.251'       #'100.78.20.208'   # Change this to the server IP address
+        # udp_server_port = 11111                 # Change this to the desired port number
+        publisher = UdpPublisher({"skeleton": (udp_server_host, 1111), "emotion": (udp_server_host, 3333),
+                                  "states": (udp_server_host, opt.state_port), "groups": (udp_server_host, opt.group_port)})
+        state_engine = BehaviorStateEngine()
+        group_tracker = GroupTracker()
+        recorder = SessionRecorder(opt.record_session, keypoint_count=source.keypoint_count) if opt.record_session else None
+        # 只发送变化超过阈值的人 / 状态，定期发送关键帧重新同步；--publish_mode all 时每次都发送完整数据
+        keyframe_interval = opt.keyframe_interval if opt.publish_mode == 'changes' else 0
+        change_detectors = {
+            "skeleton": ChangeDetector(opt.skeleton_dead_band, keyframe_interval),
+            "states": ChangeDetector(opt.state_dead_band, keyframe_interval),
+            "groups": ChangeDetector(0.5, keyframe_interval),      # 群体 id 为整数，任何变化都发送
+            "emotion": ChangeDetector(0.5, keyframe_interval),     # 表情为整数等级，任何变化都发送
+        }
+
+        # 无头模式下只有表情识别需要图像，按识别间隔取图，其余帧跳过 retrieve_image
+        last_image_time = 0.0
+
+        display_frames = DoubleBuffer() if not opt.headless else None
+
+        # 采集阶段：只做 grab / retrieve，速度只受相机和 SDK 限制
+        def capture():
+            nonlocal frame_sequence, last_image_time
+            if paused.is_set():
+                time.sleep(0.01)
+                return None
+            want_image = not opt.headless
+            if opt.headless and source.has_images and time.time() - last_image_time >= udp_send_interval:
+                want_image = True
+                last_image_time = time.time()
+            result = source.read(body_arrays, want_image=want_image)
+            if result is None:
+                return None
+            body_list, image, camera_pose = result
+            # 慢速的字典路径: body_arrays.body_dicts()
+            frame_sequence += 1
+            # 录制滤波前的原始数据，回放时可以用任意的滤波参数重新分析 (也不会被滤波两次)
+            raw = body_arrays.copy() if recorder is not None and smoother is not None else None
+            # 在采集阶段滤波，保证滤波器看到每一帧 (分析阶段可能丢帧)
+            if smoother is not None:
+                smoother.apply(body_arrays)
+            # body_arrays 下一帧会被覆盖，交给其他阶段的必须是副本
+            frame = Frame(frame_sequence, body_arrays.copy(), body_list, image, camera_pose)
+            if recorder is not None:
+                recorded = raw if raw is not None else frame.bodies
+                recorder.record(recorded, frame.sequence, emotion_cache.get(recorded.ids))
+            return frame
+
+        # 分析阶段：编码 UDP 数据、按时间间隔触发表情识别
+        def analyze(frame):
+            nonlocal last_udp_send_time, last_emotion_time
+            ids = frame.bodies.ids
+            keypoints = frame.bodies.keypoints
+            # 发送的关键点所在的坐标系 (--output_frame)，camera 时与 keypoints 是同一份数据
+            output_keypoints = frame.transforms.keypoints(opt.output_frame)
+
+            with metrics.timer("serialize"):
+                text_data = fc.encode_text(ids, output_keypoints) if opt.wire_format == 'text' else ""
+
+            # 五个归一化行为状态，每帧都发送 (每人 5 个 float)
+            expressions_by_id = emotion_cache.get(ids) if opt.emotion_input == 'heads' else {}
+            states = state_engine.compute(keypoints, ids, expressions_by_id)
+            packets = []
+            send, keyframe = change_detectors["states"].select(ids, states)
+            if send.any() or keyframe:
+                with metrics.timer("serialize"):
+                    packets.append(("states", fc.encode_states(ids[send], states[send], frame.timestamp_ns, frame.sequence, keyframe)))
+
+            # 对话群体 (F-formation)：每帧更新，滞回保证短暂转头时群体 id 不变，供 partitioning 状态使用
+            group_ids = group_tracker.update_from_bodies(frame.bodies)
+            send, keyframe = change_detectors["groups"].select(ids, group_ids)
+            if send.any() or keyframe:
+                with metrics.timer("serialize"):
+                    packets.append(("groups", fc.encode_groups(ids[send], group_ids[send], frame.timestamp_ns, frame.sequence, keyframe)))
 
-    while viewer.is_available():
-        loop_start_time = time.time()
-        # Grab an image
-        if zed.grab() == sl.ERROR_CODE.SUCCESS:
-            # Get the camera pose
-            zed.get_position(camera_pose, sl.REFERENCE_FRAME.WORLD)
-            # Retrieve left image
-            zed.retrieve_image(image, sl.VIEW.LEFT, sl.MEM.CPU, display_resolution)
-            # Retrieve bodies
-            zed.retrieve_bodies(bodies, body_runtime_param)
-            # Update GL view
-            viewer.update_view(image, bodies) 
-            # Update OCV view
-            image_left_ocv = image.get_data()
-            cv_viewer.render_2D(image_left_ocv,image_scale, bodies.body_list, body_param.enable_tracking, body_param.body_format)
-            
-            # skeleton_file_data = {}
-            # skeleton_file_data[str(bodies.timestamp.get_milliseconds())] = serializeBodies(bodies)
-
-
-            out = {}
-            out = serializeBodies(bodies)
-            list_x = out['body_list']
-
-            # print(type(bodies))
-            # print(type(list_x))
-
-            text_data = ""
-            text_data2 = ""
-            for entry in list_x:
-                person_id = entry['id']
-                keypoint_data = entry['keypoint']
-                keypoint_data = np.nan_to_num(keypoint_data, nan=0)
-                reshaped_array = keypoint_data.reshape(-1, 3)
-                person_data = f"Person {person_id}:\n"
-                for row in reshaped_array:
-                    person_data += " ".join([str(elem) for elem in row]) + "\n"
-                text_data += person_data + "\n"
-
-                # person_id, person_position, person_global_root_orientation, person_normal_vector, person_head_bounding_box, person_head_position, person_head_normal_vector = ic.extract_person_data(entry)
-                # person_data_str = (
-                #     f"ID:{person_id}\n"
-                #     f"Position:{' '.join(map(str, person_position))}\n"
-                #     f"Global Root Orientation:{' '.join(map(str, person_global_root_orientation))}\n"
-                #     # f"Normal Vector: {person_normal_vector}\n"
-                #     f"Head Position:{' '.join(map(str, person_head_position))}\n"  
-                #     f"Head Bounding Box:\n" + 
-                #     "\n".join([f"{' '.join(map(str, bbox_point))}" for bbox_point in person_head_bounding_box]) + "\n\n" 
-                # )
-                # text_data2 += person_data_str
+            current_time = time.time()
+            # 表情识别有自己的计时，只用带图像的帧 (无头模式下不是每帧都有图像)
+            if frame.image is not None and current_time - last_emotion_time >= udp_send_interval:
+                last_emotion_time = current_time
 
-            # if list_x:  
+                #########################表情####################
+                if emotion_service is None:
+                    pass    # 回放录制数据时没有图像
+                elif opt.emotion_input == 'heads':
+                    # 只把缓存缺失、过期或外观变化的人送去识别
+                    with metrics.timer("emotion_dispatch"):
+                        emotion_cache.evict(frame.bodies.ids)
+                        stale = emotion_cache.select_stale(frame.image, frame.bodies.ids, frame.bodies.head_bounding_box_2d, image_scale)
+                        if stale.any():
+                            heads = (frame.bodies.ids[stale], frame.bodies.head_bounding_box_2d[stale], image_scale)
+                            emotion_service.submit(frame.image, frame.capture_time, heads)
+                else:
+                    with metrics.timer("emotion_dispatch"):
+                        emotion_service.submit(frame.image, frame.capture_time)
 
-            current_time = time.time()
             if current_time - last_udp_send_time >= udp_send_interval: #返回结果时间间隔
                 last_udp_send_time = current_time
-                
-                text_emotion_to_udp = ""
-                
-                #########################表情####################
-                threading.Thread(target=er.async_detect_and_update, args=(image_left_ocv, expressions_list, expression_averages,expression_on_headwearer)).start()
-                print(expression_averages)
-                
-                for _, expressions in expressions_list:
-                    text_emotion_to_udp += '\n'.join([f"{key}:{value}" for key, value in expressions.items()]) + "\n\n"
-                send_keypoints_over_udp(text_data, udp_server_host, 1111)
-                
-                
-            if expressions_list:
-                for bounding_poly, expression_dict in expressions_list:
-                    er.draw_expression_on_frame(image_left_ocv, bounding_poly, expression_dict, True)
+                send, keyframe = change_detectors["skeleton"].select(ids, output_keypoints)
+                if opt.wire_format == 'text':
+                    # 文本格式没有关键帧标记，有变化时仍然发送所有人
+                    if send.any() or keyframe:
+                        packets.append(("skeleton", text_data))
+                elif send.any() or keyframe:
+                    with metrics.timer("serialize"):
+                        packets.append(("skeleton", fc.encode_frame(ids[send], output_keypoints[send], frame.timestamp_ns, frame.sequence, keyframe=keyframe)))
+
+            # 表情块中每张脸带上所属的人的 id；整帧识别时人脸没有对应到人，按检测顺序记为 -1, -2, ...
+            if opt.emotion_input == 'heads':
+                expressions = [(int(person_id), expressions_by_id[int(person_id)]) for person_id in ids if int(person_id) in expressions_by_id]
+            elif emotion_service is not None:
+                expressions = [(-1 - i, expression_dict) for i, (_, expression_dict) in enumerate(emotion_service.latest()[0])]
+            else:
+                expressions = []
+            # 按 id 比较，有人离开时其他人的历史不会错位；任何人的表情变化都发送整个表情块
+            send, keyframe = change_detectors["emotion"].select([person_id for person_id, _ in expressions], fc.expression_table(expressions))
+            if expressions and (send.any() or keyframe):
+                if opt.wire_format == 'text':
+                    text_emotion_to_udp = ""
+                    for _, expression_dict in expressions:
+                        text_emotion_to_udp += '\n'.join([f"{key}:{value}" for key, value in expression_dict.items()]) + "\n\n"
+                    packets.append(("emotion", "*\n".join([text_data, text_emotion_to_udp])))
+                else:
+                    with metrics.timer("serialize"):
+                        packets.append(("emotion", fc.encode_frame(ids, output_keypoints, frame.timestamp_ns, frame.sequence, expressions)))
             #########################表情####################
-                send_keypoints_over_udp("*\n".join([text_data, text_emotion_to_udp]), udp_server_host,3333)
-
-            cv2.imshow("ZED | 2D View", image_left_ocv)
-            key = cv2.waitKey(key_wait)
-            if key == 113: # for 'q' key
+            if display_frames is not None:
+                display_frames.write(frame)
+            if not packets:
+                return None
+            return frame.capture_time, packets
+
+        # 发送阶段
+        def publish(item):
+            capture_time, packets = item
+            for channel, payload in packets:
+                with metrics.timer("publish." + channel):
+                    publisher.send(channel, payload)
+            # 从取到这一帧到最后一个数据报交给内核
+            metrics.record("capture_to_send", time.time() - capture_time)
+            return None
+
+        # 显示线程按 --display_rate 从双缓冲中取分析完的最新帧，按键以事件的形式送回主线程
+        display = None
+        events = queue.Queue()
+        if not opt.headless:
+            def draw_expressions(image):
+                if emotion_service is None:
+                    return
+                for bounding_poly, expression_dict in emotion_service.latest()[0]:
+                    er.draw_expression_on_frame(image, bounding_poly, expression_dict, True)
+            display = DisplayThread(source, display_frames, rate=opt.display_rate, overlay=draw_expressions, metrics=metrics).start()
+            events = display.events
+
+        # 快速回放用于性能分析和回归测试，每一帧都要分析和发送，队列满时让采集等待而不是丢帧
+        lossless = bool(opt.replay) and opt.replay_mode == 'fast'
+        analysis_inbox = LatestQueue(maxsize=1, block=lossless)
+        publish_inbox = LatestQueue(maxsize=4, block=lossless)
+        pipeline = Pipeline([
+            Stage("capture", capture, outputs=[analysis_inbox]),
+            Stage("analysis", analyze, inbox=analysis_inbox, outputs=[publish_inbox]),
+            Stage("publish", publish, inbox=publish_inbox),
+        ])
+        pipeline.start()
+
+        # 发送、表情识别、缓存和变化检测的计数，每 5 秒打印一次并放进 /metrics.json
+        def runtime_stats():
+            return {
+                "publisher": publisher.stats(),
+                "emotion": emotion_service.stats() if emotion_service is not None else None,
+                "emotion_cache": emotion_cache.stats(),
+                "changes": {channel: detector.stats() for channel, detector in change_detectors.items()},
+            }
+
+        metrics_server = None
+        if opt.metrics_port > 0:
+            # 端口被占用 (例如同时运行第二个实例) 时只是没有指标页面，不影响追踪
+            try:
+                metrics_server = MetricsServer(metrics, opt.metrics_port,
+                                               extra=lambda: dict(pipeline=pipeline.report(), **runtime_stats())).start()
+                print("Metrics on http://%s:%d/" % metrics_server.address)
+            except OSError as e:
+                print("Metrics page disabled, cannot listen on port %d: %s" % (opt.metrics_port, e))
+        last_report_time = time.time()
+
+        # 主线程只处理退出信号、显示线程送来的按键事件和定期报告
+        while not stop.is_set() and not source.finished:
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                event = None
+            if event == EVENT_QUIT:
                 print("Exiting...")
                 break
-            if key == 109: # for 'm' key
-                if (key_wait>0):
+            if event == EVENT_PAUSE:
+                if not paused.is_set():
                     print("Pause")
-                    key_wait = 0 
+                    paused.set()
                 else : 
                     print("Restart")
-                    key_wait = 10 
-            
+                    paused.clear()
 
-    viewer.exit()
-    image.free(sl.MEM.CPU)
-    zed.disable_body_tracking()
-    zed.disable_positional_tracking()
-    zed.close()
-    cv2.destroyAllWindows()
+            if time.time() - last_report_time >= 5:
+                last_report_time = time.time()
+                print("[Pipeline]", pipeline.report())
+                print("[Latency]", metrics.log_line())
+                print("[Stats]", json.dumps(runtime_stats(), default=str))
+    finally:
+        # 仍在运行的阶段所用的资源不能在它脚下关闭 (线程是 daemon，进程退出时随之结束)
+        running = pipeline.stop() if pipeline is not None else []
+        if running:
+            print("Pipeline stages still running after stop, leaving their resources open:", ", ".join(running))
+        if metrics_server is not None:
+            metrics_server.stop()
+        if emotion_service is not None:
+            emotion_service.stop()
+        if display is not None:
+            display.stop()
+        if publisher is not None and "publish" not in running:
+            publisher.close()
+        if "capture" not in running:
+            if recorder is not None:
+                recorder.close()
+                print("Recorded session:", recorder.stats())
+            source.close()
     
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--input_svo_file', type=str, help='Path to an .svo file, if you want to replay it',default = '')
     parser.add_argument('--ip_address', type=str, help='IP Adress, in format a.b.c.d:port or a.b.c.d, if you have a streaming setup', default = '')
     parser.add_argument('--resolution', type=str, help='Resolution, can be either HD2K, HD1200, HD1080, HD720, SVGA or VGA', default = '')
+    parser.add_argument('--replay', type=str, help='Replay a recorded session directory (--record_session), a serializeBodies .json/.jsonl file or an .svo file instead of using a camera', default = '')
+    parser.add_argument('--replay_mode', type=str, choices=['realtime', 'fast'], help='Replay at the recorded frame rate or as fast as possible', default = 'realtime')
+    parser.add_argument('--replay_loop', action='store_true', help='Start the replay again when it reaches the end')
+    parser.add_argument('--cameras', type=str, nargs='+', help='Multi-camera mode, one source per camera: serial:<n>, a.b.c.d[:port], .svo, recording or synthetic[:people], optionally followed by @x,y,z[,yaw] (camera placement in the world frame, meters / degrees)', default = [])
+    parser.add_argument('--fusion_distance', type=float, help='Maximum distance (m) between the roots of the same person seen by two cameras', default = 0.5)
+    parser.add_argument('--fusion_rate', type=float, help='Rate (Hz) at which the cameras are fused in multi-camera mode; 0 fuses whenever a newer camera frame arrives', default = 30.0)
+    parser.add_argument('--emotion_input', type=str, choices=['heads', 'frame'], help='Send a mosaic of padded ZED head crops or the full left frame to the emotion API', default = 'heads')
+    parser.add_argument('--emotion_backend', type=str, choices=['google', 'local', 'mock'], help='Emotion recognizer: Google Vision, local OpenCV DNN / ONNX model, or the mock HTTP server (modules/mock_emotion_server.py)', default = 'google')
+    parser.add_argument('--emotion_model', type=str, help='ONNX expression model for the local backend (FER+ emotion-ferplus-8)', default = 'models/emotion-ferplus-8.onnx')
+    parser.add_argument('--face_model', type=str, help='Optional YuNet ONNX face detector for the local backend; Haar cascade is used otherwise', default = '')
+    parser.add_argument('--mock_emotion_url', type=str, help='URL of the mock emotion server', default = 'http://127.0.0.1:8089/detect')
+    parser.add_argument('--emotion_ttl', type=float, help='Seconds a cached per-person expression stays valid in heads mode', default = 10.0)
+    parser.add_argument('--state_port', type=int, help='UDP port for the normalized behavior state frames (see modules/behavior_state.py)', default = 5555)
+    parser.add_argument('--group_port', type=int, help='UDP port for the conversational group frames (see modules/social_groups.py)', default = 5556)
+    parser.add_argument('--smoothing', type=str, choices=['one_euro', 'none'], help='Per-person keypoint filter applied before analysis and publishing', default = 'one_euro')
+    parser.add_argument('--smoothing_min_cutoff', type=float, help='One-Euro cutoff frequency (Hz) when still; lower is smoother but lags more', default = 1.0)
+    parser.add_argument('--smoothing_beta', type=float, help='One-Euro speed coefficient; higher follows fast movements more closely', default = 0.5)
+    parser.add_argument('--publish_mode', type=str, choices=['changes', 'all'], help='Send only people / states that changed beyond the dead-band (plus periodic keyframes), or everything every time', default = 'changes')
+    parser.add_argument('--keyframe_interval', type=float, help='Seconds between full keyframes in changes mode', default = 2.0)
+    parser.add_argument('--skeleton_dead_band', type=float, help='Minimum keypoint movement (m) before a person is re-sent on the skeleton channel', default = 0.01)
+    parser.add_argument('--state_dead_band', type=float, help='Minimum change of a normalized state before a person is re-sent on the state channel', default = 0.02)
+    parser.add_argument('--record_session', type=str, help='Directory to record every frame into (columnar memory-mapped files, see modules/session_recorder.py)', default = '')
+    parser.add_argument('--headless', action='store_true', help='Run without the OpenGL / OpenCV windows (stop with SIGINT or SIGTERM); images are only retrieved for emotion recognition')
+    parser.add_argument('--display_rate', type=float, help='Maximum frame rate (Hz) of the OpenGL / OpenCV windows, which render on their own thread', default = 15.0)
+    parser.add_argument('--metrics_port', type=int, help='Serve per-stage latency histograms on http://127.0.0.1:<port>/ (0 disables)', default = 9108)
+    parser.add_argument('--output_frame', type=str, choices=['camera', 'world'], help='Coordinate frame of the published keypoints: camera, or world using the camera pose from positional tracking', default = 'camera')
+    parser.add_argument('--wire_format', type=str, choices=['binary', 'text'], help='UDP payload format: the per-float text parsed by the current Grasshopper definitions, or packed binary frames (see modules/frame_codec.py)', default = 'text')
     opt = parser.parse_args()
     if len(opt.input_svo_file)>0 and len(opt.ip_address)>0:
         print("Specify only input_svo_file or ip_address, or none to use wired camera, not both. Exit program")
@@ -2,7 +2,7 @@ import cv2
 import numpy as np
 
 from cv_viewer.utils import *
-import pyzed.sl as sl
+from modules.zed_compat import body_bones
 
 #----------------------------------------------------------------------
 #       2D VIEW
@@ -14,43 +14,57 @@ def cvt(pt, scale):
     out = [pt[0]*scale[0], pt[1]*scale[1]]
     return out
 
-def render_sk(left_display, img_scale, obj, color, BODY_BONES):
-    # Draw skeleton bones
-    for part in BODY_BONES:
-        kp_a = cvt(obj.keypoint_2d[part[0].value], img_scale)
-        kp_b = cvt(obj.keypoint_2d[part[1].value], img_scale)
-        # Check that the keypoints are inside the image
-        if(kp_a[0] < left_display.shape[1] and kp_a[1] < left_display.shape[0] 
-        and kp_b[0] < left_display.shape[1] and kp_b[1] < left_display.shape[0]
-        and kp_a[0] > 0 and kp_a[1] > 0 and kp_b[0] > 0 and kp_b[1] > 0 ):
-            cv2.line(left_display, (int(kp_a[0]), int(kp_a[1])), (int(kp_b[0]), int(kp_b[1])), color, 1, cv2.LINE_AA)
-
-    # Skeleton joints
-    for kp in obj.keypoint_2d:
-        cv_kp = cvt(kp, img_scale)
-        if(cv_kp[0] < left_display.shape[1] and cv_kp[1] < left_display.shape[0]):
-            cv2.circle(left_display, (int(cv_kp[0]), int(cv_kp[1])), 3, color, -1)
-
-
-def render_2D(left_display, img_scale, objects, is_tracking_on, body_format):
+def scale_keypoints(keypoints_2d, img_scale, shape):
+    '''
+    Scale all 2D keypoints at once and flag the ones that fall inside the image
+
+    Returns
+        points (np.array): (K, 2) int32 pixel coordinates
+        valid (np.array): (K,) bool
+    '''
+    points = np.asarray(keypoints_2d, dtype=np.float32)[:, :2] * np.asarray(img_scale[:2], dtype=np.float32)
+    valid = ((points > 0).all(axis=1) & (points[:, 0] < shape[1]) & (points[:, 1] < shape[0]))
+    return points.astype(np.int32), valid
+
+def render_sk(left_display, img_scale, obj, color, BODY_BONES, alpha=0.9):
+    points, valid = scale_keypoints(obj.keypoint_2d, img_scale, left_display.shape)
+    if not valid.any():
+        return
+    # 只在这个人所在的区域做半透明混合，不再复制整帧
+    blend = alpha < 1
+    if blend:
+        pad = 4
+        x0, y0 = np.maximum(points[valid].min(axis=0) - pad, 0)
+        x1, y1 = points[valid].max(axis=0) + pad + 1
+        roi = left_display[y0:y1, x0:x1]
+        original = roi.copy()
+
+    # Draw skeleton bones: 两端都在图像内的骨骼一次 polylines 画完
+    bones = BODY_BONES[valid[BODY_BONES].all(axis=1)]
+    if len(bones):
+        cv2.polylines(left_display, points[bones], False, color, 1, cv2.LINE_AA)
+
+    # Skeleton joints: 每个关键点一条零长度的折线，粗细 6 的圆头与半径 3 的实心圆逐像素相同，一次调用画完
+    cv2.polylines(left_display, points[valid][:, None, :], True, color, 6)
+
+    if blend:
+        cv2.addWeighted(roi, alpha, original, 1 - alpha, 0.0, roi)
+
+
+def render_2D(left_display, img_scale, objects, is_tracking_on, body_format, alpha=0.9):
     '''
     Parameters
         left_display (np.array): numpy array containing image data
         img_scale (list[float])
-        objects (list[sl.ObjectData]) 
+        objects (list[sl.BodyData] or list[BodyView]) 
+        body_format (sl.BODY_FORMAT or str)
+        alpha (float): opacity of the skeletons, 1 draws them opaque without blending
     '''
-    overlay = left_display.copy()
+    BODY_BONES = body_bones(body_format)
 
     # Render skeleton joints and bones
     for obj in objects:
         if render_object(obj, is_tracking_on):
             if len(obj.keypoint_2d) > 0:
                 color = generate_color_id_u(obj.id)
-                if body_format == sl.BODY_FORMAT.BODY_18:
-                    render_sk(left_display, img_scale, obj, color, sl.BODY_18_BONES)
-                elif body_format == sl.BODY_FORMAT.BODY_34:
-                    render_sk(left_display, img_scale, obj, color, sl.BODY_34_BONES)
-                elif body_format == sl.BODY_FORMAT.BODY_38:
-                    render_sk(left_display, img_scale, obj, color, sl.BODY_38_BONES) 
-
-    cv2.addWeighted(left_display, 0.9, overlay, 0.1, 0.0, left_display)
\ No newline at end of file
+                render_sk(left_display, img_scale, obj, color, BODY_BONES, alpha)
@@ -1,4 +1,4 @@
-import pyzed.sl as sl
+from modules.zed_compat import is_renderable
 
 
 ID_COLORS = [(232, 176,59)
@@ -9,10 +9,7 @@ ID_COLORS = [(232, 176,59)
 
 
 def render_object(object_data, is_tracking_on):
-    if is_tracking_on:
-        return (object_data.tracking_state == sl.OBJECT_TRACKING_STATE.OK)
-    else:
-        return ((object_data.tracking_state == sl.OBJECT_TRACKING_STATE.OK) or (object_data.tracking_state == sl.OBJECT_TRACKING_STATE.OFF))
+    return is_renderable(object_data, is_tracking_on)
         
 
 def generate_color_id_u(idx):
@@ -0,0 +1,159 @@
+import warnings
+import numpy as np
+
+from modules.posture_checker import joint_angles
+
+# BODY_34 关键点索引
+PELVIS, NECK = 0, 3
+LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST = 5, 6, 7
+RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST = 12, 13, 14
+LEFT_HIP, LEFT_KNEE, LEFT_ANKLE = 18, 19, 20
+RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE = 22, 23, 24
+NOSE, LEFT_EAR, RIGHT_EAR = 27, 29, 31
+
+STATE_NAMES = ("lower_body", "upper_limb", "social", "attentional", "emotional")
+
+# (a, b, c)：在 b 点处 a-b 与 c-b 的夹角
+LOWER_BODY_TRIPLETS = np.array([
+    (LEFT_SHOULDER, LEFT_HIP, LEFT_KNEE),       # 左髋
+    (RIGHT_SHOULDER, RIGHT_HIP, RIGHT_KNEE),    # 右髋
+    (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE),          # 左膝
+    (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE),       # 右膝
+])
+UPPER_LIMB_TRIPLETS = np.array([
+    (LEFT_ELBOW, LEFT_SHOULDER, LEFT_HIP),      # 左肩
+    (RIGHT_ELBOW, RIGHT_SHOULDER, RIGHT_HIP),   # 右肩
+    (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST),    # 左肘
+    (RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST), # 右肘
+])
+
+
+def min_max_normalize(values, lower, upper):
+    """
+    min–max 归一化并截断到 0–1
+    """
+    return np.clip((values - lower) / (upper - lower), 0.0, 1.0)
+
+
+def head_vectors(keypoints):
+    """
+    由鼻子和两耳中点计算单位头部朝向向量
+
+    参数:
+    keypoints (np.ndarray): (N, K, 3)
+
+    返回值:
+    np.ndarray: (N, 3)，关键点缺失时为 NaN
+    """
+    vectors = keypoints[:, NOSE] - 0.5 * (keypoints[:, LEFT_EAR] + keypoints[:, RIGHT_EAR])
+    norm = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return vectors / norm
+
+
+class BehaviorStateEngine:
+    """
+    对一帧中所有人同时计算五个多层级行为状态，均 min–max 归一化到 0–1 (与 Grasshopper 中的定义一致)：
+      lower_body   髋、膝角度 (坐 → 0，站 → 1)
+      upper_limb   肩、肘角度 (收拢 → 0，张开 → 1)
+      social       与最近的人相互朝向且距离较近的程度
+      attentional  头部朝向与注意方向 (默认朝下看工作台面) 的一致程度
+      emotional    表情的正负效价 (Sorrow/Anger → 0，Joy/Surprise → 1)
+    无法计算的状态为 NaN。
+    """
+    def __init__(self,
+                 lower_body_range=(90.0, 180.0),
+                 upper_limb_range=(10.0, 120.0),
+                 social_distance_range=(0.8, 3.0),
+                 attention_angle_range=(20.0, 90.0),
+                 focus_direction=(0.0, -1.0, 0.0),
+                 up_axis=1):
+        """
+        参数:
+        lower_body_range / upper_limb_range (tuple): 角度归一化的 (min, max)，单位度
+        social_distance_range (tuple): 距离小于 min 视为最近 (1)，大于 max 视为无社交 (0)，单位米
+        attention_angle_range (tuple): 头部朝向与注意方向的夹角，小于 min 为 1，大于 max 为 0
+        focus_direction (tuple): 注意方向 (默认 Y 轴向上的坐标系中朝下)
+        up_axis (int): 竖直轴，社交朝向在水平面内计算
+        """
+        self.lower_body_range = lower_body_range
+        self.upper_limb_range = upper_limb_range
+        self.social_distance_range = social_distance_range
+        self.attention_angle_range = attention_angle_range
+        focus = np.asarray(focus_direction, dtype=np.float64)
+        self.focus_direction = focus / np.linalg.norm(focus)
+        self.horizontal_axes = [axis for axis in range(3) if axis != up_axis]
+
+    def lower_body(self, keypoints):
+        angles = joint_angles(keypoints, LOWER_BODY_TRIPLETS)
+        return np.nanmean(min_max_normalize(angles, *self.lower_body_range), axis=1)
+
+    def upper_limb(self, keypoints):
+        angles = joint_angles(keypoints, UPPER_LIMB_TRIPLETS)
+        return np.nanmean(min_max_normalize(angles, *self.upper_limb_range), axis=1)
+
+    def social(self, keypoints, heads):
+        """
+        两两之间相互朝向程度 × 距离接近程度，取每个人与其他人的最大值
+        """
+        count = len(keypoints)
+        if count < 2:
+            return np.zeros(count)
+        positions = keypoints[:, NECK][:, self.horizontal_axes]
+        facing = heads[:, self.horizontal_axes]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            facing = facing / np.linalg.norm(facing, axis=-1, keepdims=True)
+            offsets = positions[None, :, :] - positions[:, None, :]       # i -> j
+            distances = np.linalg.norm(offsets, axis=-1)
+            directions = offsets / distances[..., None]
+            cos_ij = np.einsum('ik,ijk->ij', facing, directions)            # i 朝向 j 的程度
+        mutual = (cos_ij + 1) * 0.5 * (cos_ij.T + 1) * 0.5
+        near, far = self.social_distance_range
+        proximity = 1.0 - min_max_normalize(distances, near, far)
+        scores = np.nan_to_num(mutual * proximity, nan=0.0)
+        np.fill_diagonal(scores, 0.0)
+        return scores.max(axis=1)
+
+    def attentional(self, heads):
+        with np.errstate(invalid='ignore'):
+            angles = np.degrees(np.arccos(np.clip(heads @ self.focus_direction, -1.0, 1.0)))
+        return 1.0 - min_max_normalize(angles, *self.attention_angle_range)
+
+    def emotional(self, ids, expressions_by_id):
+        values = np.full(len(ids), np.nan)
+        for i, person_id in enumerate(ids):
+            expressions = expressions_by_id.get(int(person_id))
+            if expressions:
+                positive = (expressions["Joy"] + expressions["Surprise"]) / 2
+                negative = (expressions["Sorrow"] + expressions["Anger"]) / 2
+                values[i] = positive - negative
+        # 等级为 0–5 (UNKNOWN 为 0)，效价范围为 [-5, 5]
+        return min_max_normalize(values, -5.0, 5.0)
+
+    def compute(self, keypoints, ids=(), expressions_by_id=None):
+        """
+        计算一帧中所有人的状态向量
+
+        参数:
+        keypoints (np.ndarray): (N, 34, 3) BODY_34 关键点
+        ids (array-like): 每个人的 id，用于查找表情
+        expressions_by_id (dict): id -> 表情字典 (例如 EmotionCache.get 的结果)
+
+        返回值:
+        np.ndarray: (N, 5) float32，列顺序为 STATE_NAMES
+        """
+        keypoints = np.asarray(keypoints, dtype=np.float64)
+        states = np.full((len(keypoints), len(STATE_NAMES)), np.nan, dtype=np.float32)
+        if not len(keypoints):
+            return states
+        heads = head_vectors(keypoints)
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            # 某人所有角度都缺失时 nanmean 会警告，结果保持 NaN
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            states[:, 0] = self.lower_body(keypoints)
+            states[:, 1] = self.upper_limb(keypoints)
+        states[:, 2] = self.social(keypoints, heads)
+        states[:, 3] = self.attentional(heads)
+        if expressions_by_id:
+            states[:, 4] = self.emotional(ids, expressions_by_id)
+        return states
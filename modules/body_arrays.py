@@ -0,0 +1,184 @@
+import numpy as np
+
+from modules.zed_compat import TRACKING_OK, tracking_state_value
+
+# (字段名, sl.BodyData 属性名 (同时也是 serializeBodyData 中的键名), 每个人的形状 (K 表示关键点数), dtype, 缺失时的填充值)
+BODY_FIELDS = (
+    ("keypoints", "keypoint", ("K", 3), np.float32, np.nan),
+    ("keypoints_2d", "keypoint_2d", ("K", 2), np.float32, -1),
+    ("keypoint_confidence", "keypoint_confidence", ("K",), np.float32, np.nan),
+    ("positions", "position", (3,), np.float32, np.nan),
+    ("velocities", "velocity", (3,), np.float32, np.nan),
+    ("dimensions", "dimensions", (3,), np.float32, np.nan),
+    ("bounding_box_2d", "bounding_box_2d", (4, 2), np.float32, -1),
+    ("head_positions", "head_position", (3,), np.float32, np.nan),
+    ("head_bounding_box_2d", "head_bounding_box_2d", (4, 2), np.float32, -1),
+    ("head_bounding_box", "head_bounding_box", (8, 3), np.float32, np.nan),
+    ("global_root_orientation", "global_root_orientation", (4,), np.float32, np.nan),
+)
+
+# BodyArrays 中每人一行的所有数组名
+ARRAY_NAMES = ("ids", "confidences", "tracking_state") + tuple(field[0] for field in BODY_FIELDS)
+
+
+class BodyArrays:
+    """
+    每帧复用的预分配 NumPy 数组，按字段存放所有人的数据 (N×K×3 关键点、N×K 置信度、N×3 位置等)。
+    只有前 count 行有效；人数超过容量时按倍数扩容。
+    """
+    def __init__(self, keypoint_count=34, capacity=16):
+        self.keypoint_count = keypoint_count
+        self.count = 0
+        self.timestamp_ns = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.ids = np.full(capacity, -1, dtype=np.int32)
+        self.confidences = np.zeros(capacity, dtype=np.float32)
+        self.tracking_state = np.zeros(capacity, dtype=np.int8)
+        for name, _, shape, dtype, fill in BODY_FIELDS:
+            shape = tuple(self.keypoint_count if d == "K" else d for d in shape)
+            setattr(self, name, np.full((capacity,) + shape, fill, dtype=dtype))
+
+    def _reserve(self, count):
+        if count <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < count:
+            capacity *= 2
+        self._allocate(capacity)
+
+    def fill(self, bodies):
+        """
+        用 sl.Bodies 填充数组，每人每个字段只做一次整块赋值
+
+        参数:
+        bodies (sl.Bodies): retrieve_bodies 得到的结果
+
+        返回值:
+        int: 人数
+        """
+        body_list = bodies.body_list
+        self._reserve(len(body_list))
+        self.timestamp_ns = bodies.timestamp.data_ns
+        for i, body in enumerate(body_list):
+            self.ids[i] = body.id
+            self.confidences[i] = body.confidence
+            self.tracking_state[i] = body.tracking_state.value
+            for name, attribute, _, _, fill in BODY_FIELDS:
+                row = getattr(self, name)
+                value = getattr(body, attribute)
+                # 未跟踪或未启用 body fitting 时 SDK 会返回空数组
+                if len(value):
+                    row[i] = value
+                else:
+                    row[i] = fill
+        self.count = len(body_list)
+        return self.count
+
+    def __len__(self):
+        return self.count
+
+    def fill_dicts(self, body_dicts, timestamp_ns=0):
+        """
+        用 serializeBodyData / body_dicts 格式的字典列表填充 (例如读取 JSON 录制文件)。
+        形状与当前关键点格式不符的字段按缺失处理
+
+        参数:
+        body_dicts (list): 每个人一个字典
+        timestamp_ns (int): 帧时间戳 (ns)
+
+        返回值:
+        int: 人数
+        """
+        self._reserve(len(body_dicts))
+        self.timestamp_ns = int(timestamp_ns)
+        for i, body in enumerate(body_dicts):
+            self.ids[i] = body.get("id", -1)
+            self.confidences[i] = body.get("confidence", 0)
+            self.tracking_state[i] = tracking_state_value(body.get("tracking_state", TRACKING_OK))
+            for name, attribute, _, _, fill in BODY_FIELDS:
+                row = getattr(self, name)
+                value = np.asarray(body.get(attribute, ()), dtype=np.float64)
+                row[i] = value if value.shape == row.shape[1:] else fill
+        self.count = len(body_dicts)
+        return self.count
+
+    def body_views(self):
+        """
+        把有效的行包装成与 sl.BodyData 属性名相同的对象列表，供 cv_viewer / ogl_viewer 在没有 SDK 时渲染。
+        每个字段都是副本，渲染代码修改它们不会影响本对象
+
+        返回值:
+        list[BodyView]
+        """
+        return [BodyView(self, i) for i in range(self.count)]
+
+    def body_dicts(self):
+        """
+        慢速路径：把有效的行转换为与 serializeBodyData 相同键名的字典列表 (可直接 json.dumps)
+
+        返回值:
+        list: 每个人一个字典
+        """
+        out = []
+        for i in range(self.count):
+            body = {"id": int(self.ids[i]), "confidence": float(self.confidences[i])}
+            for name, attribute, _, _, _ in BODY_FIELDS:
+                body[attribute] = getattr(self, name)[i].tolist()
+            out.append(body)
+        return out
+
+    def copy(self):
+        """
+        复制有效的行，得到一个可以交给其他线程的独立快照
+
+        返回值:
+        BodyArrays: 容量等于当前人数的新对象
+        """
+        snapshot = BodyArrays.__new__(BodyArrays)
+        snapshot.keypoint_count = self.keypoint_count
+        snapshot.count = self.count
+        snapshot.capacity = self.count
+        snapshot.timestamp_ns = self.timestamp_ns
+        for name in ARRAY_NAMES:
+            setattr(snapshot, name, getattr(self, name)[:self.count].copy())
+        return snapshot
+
+    def assign(self, columns, count, timestamp_ns=0):
+        """
+        用按字段存放的数组填充 (例如录制文件中一帧的切片)，缺少的字段使用默认填充值
+
+        参数:
+        columns (dict): 字段名 (ARRAY_NAMES) -> 至少 count 行的数组
+        count (int): 人数
+        timestamp_ns (int): 帧时间戳 (ns)
+
+        返回值:
+        int: 人数
+        """
+        self._reserve(count)
+        self.timestamp_ns = int(timestamp_ns)
+        defaults = dict(ids=-1, confidences=0, tracking_state=0)
+        defaults.update((name, fill) for name, _, _, _, fill in BODY_FIELDS)
+        for name in ARRAY_NAMES:
+            target = getattr(self, name)
+            if name in columns:
+                target[:count] = columns[name][:count]
+            else:
+                target[:count] = defaults[name]
+        self.count = count
+        return count
+
+
+class BodyView:
+    """
+    BodyArrays 中一个人的数据，属性名与 sl.BodyData 相同 (id, tracking_state, keypoint, keypoint_2d, ...)
+    """
+    def __init__(self, body_arrays, index):
+        self.id = int(body_arrays.ids[index])
+        self.confidence = float(body_arrays.confidences[index])
+        self.tracking_state = int(body_arrays.tracking_state[index])
+        for name, attribute, _, _, _ in BODY_FIELDS:
+            setattr(self, attribute, getattr(body_arrays, name)[index].copy())
@@ -0,0 +1,502 @@
+import json
+import math
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from modules.metrics import timer
+from modules.session_recorder import META_FILE, SessionReader
+from modules.zed_compat import sl
+
+
+def default_calibration(width=1280, height=720, h_fov=100.0):
+    """
+    没有相机时给 GLViewer 用的左目参数 (接口与 sl.CameraParameters 相同的几个字段)，默认接近 ZED 2 的 HD720
+
+    返回值:
+    SimpleNamespace: h_fov, v_fov, cx, cy, image_size.width / height
+    """
+    fx = (width / 2) / math.tan(math.radians(h_fov) / 2)
+    return SimpleNamespace(h_fov=h_fov, v_fov=math.degrees(2 * math.atan((height / 2) / fx)),
+                           cx=width / 2, cy=height / 2,
+                           image_size=SimpleNamespace(width=width, height=height))
+
+
+class BodySource:
+    """
+    人体数据源接口。采集阶段每轮调用 read，把一帧的人体数据写进 BodyArrays。
+      read(body_arrays, want_image) -> (body_list, image, camera_pose)，这一轮没有新帧时返回 None；
+      数据读完时 finished 为 True。
+    body_list 交给 cv_viewer / ogl_viewer 渲染 (sl.BodyData 或 BodyView)，image 为 BGRA 图像或 None，
+    camera_pose 为 4×4 相机到世界坐标的变换矩阵。
+    metrics 设为 MetricsRegistry 时，read 内部的各步骤 (grab、retrieve_image、retrieve_bodies) 会分别计时。
+    """
+    keypoint_count = 34
+    body_format = "BODY_34"
+    is_tracking_on = True
+    # 是否有真实图像 (回放时只有黑色画布，没必要做表情识别)
+    has_images = False
+
+    def __init__(self):
+        self.finished = False
+        self.metrics = None
+        self.calibration = default_calibration()
+        self.camera_resolution = (1280, 720)
+        self.display_resolution = (1280, 720)
+
+    @property
+    def image_scale(self):
+        return [self.display_resolution[0] / self.camera_resolution[0],
+                self.display_resolution[1] / self.camera_resolution[1]]
+
+    def open(self):
+        return self
+
+    def read(self, body_arrays, want_image=True):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ZedSource(BodySource):
+    """
+    ZED 相机 (有线、网络流或 SVO 文件)
+    """
+    has_images = True
+
+    def __init__(self, input_svo_file='', ip_address='', resolution='', real_time=True, max_display=(1280, 720), serial_number=0):
+        BodySource.__init__(self)
+        if sl is None:
+            raise RuntimeError("the ZED SDK (pyzed) is required for camera / SVO input")
+        self.input_svo_file = input_svo_file
+        self.ip_address = ip_address
+        self.serial_number = serial_number
+        self.resolution = resolution
+        self.real_time = real_time
+        self.max_display = max_display
+        self.body_format = sl.BODY_FORMAT.BODY_34
+
+    def _apply_input(self, init):
+        if len(self.input_svo_file)>0 and self.input_svo_file.endswith((".svo", ".svo2")):
+            init.set_from_svo_file(self.input_svo_file)
+            init.svo_real_time_mode = self.real_time
+            print("[Sample] Using SVO File input: {0}".format(self.input_svo_file))
+        elif len(self.ip_address)>0 :
+            ip_str = self.ip_address
+            if ip_str.replace(':','').replace('.','').isdigit() and len(ip_str.split('.'))==4 and len(ip_str.split(':'))==2:
+                init.set_from_stream(ip_str.split(':')[0],int(ip_str.split(':')[1]))
+                print("[Sample] Using Stream input, IP : ",ip_str)
+            elif ip_str.replace(':','').replace('.','').isdigit() and len(ip_str.split('.'))==4:
+                init.set_from_stream(ip_str)
+                print("[Sample] Using Stream input, IP : ",ip_str)
+            else :
+                print("Unvalid IP format. Using live stream")
+        elif self.serial_number:
+            # 接了多台相机时按序列号选择
+            init.set_from_serial_number(self.serial_number)
+            print("[Sample] Using camera with serial number", self.serial_number)
+        for name in ("HD2K", "HD1200", "HD1080", "HD720", "SVGA", "VGA"):
+            if name in self.resolution:
+                init.camera_resolution = getattr(sl.RESOLUTION, name)
+                print("[Sample] Using Camera in resolution " + name)
+                break
+        else:
+            if len(self.resolution)>0:
+                print("[Sample] No valid resolution entered. Using default")
+            else :
+                print("[Sample] Using default resolution")
+
+    def open(self):
+        # Create a Camera object
+        self.zed = sl.Camera()
+
+        # Create a InitParameters object and set configuration parameters
+        init_params = sl.InitParameters()
+        init_params.camera_resolution = sl.RESOLUTION.HD1080  # Use HD1080 video mode
+        init_params.coordinate_units = sl.UNIT.METER          # Set coordinate units
+        init_params.depth_mode = sl.DEPTH_MODE.ULTRA
+        init_params.coordinate_system = sl.COORDINATE_SYSTEM.RIGHT_HANDED_Y_UP  # Set coordinate system
+        self._apply_input(init_params)
+
+        # Open the camera
+        err = self.zed.open(init_params)
+        if err != sl.ERROR_CODE.SUCCESS:
+            raise RuntimeError("could not open the ZED camera: %s" % err)
+
+        # Enable Positional tracking (mandatory for object detection)
+        positional_tracking_parameters = sl.PositionalTrackingParameters()
+        # If the camera is static, uncomment the following line to have better performances
+        # positional_tracking_parameters.set_as_static = True
+        # Set the initial position of the Camera Frame at 1m80 above the World Frame
+        initial_position = sl.Transform()
+        initial_translation = sl.Translation()
+        # initial_translation.init_vector(0, 0, 1.8)  # 1.8 meters above the world frame
+        initial_position.set_translation(initial_translation)
+        positional_tracking_parameters.set_initial_world_transform(initial_position)
+        self.zed.enable_positional_tracking(positional_tracking_parameters)
+        self.camera_pose = sl.Pose()
+        self.pose_transform = sl.Transform()
+
+        body_param = sl.BodyTrackingParameters()
+        body_param.enable_tracking = True                # Track people across images flow
+        body_param.enable_body_fitting = False            # Smooth skeleton move
+        body_param.detection_model = sl.BODY_TRACKING_MODEL.HUMAN_BODY_FAST
+        body_param.body_format = self.body_format  # Choose the BODY_FORMAT you wish to use
+        self.zed.enable_body_tracking(body_param)
+        self.is_tracking_on = body_param.enable_tracking
+
+        self.body_runtime_param = sl.BodyTrackingRuntimeParameters()
+        self.body_runtime_param.detection_confidence_threshold = 40
+
+        # Get ZED camera information
+        camera_info = self.zed.get_camera_information()
+        self.calibration = camera_info.camera_configuration.calibration_parameters.left_cam
+        camera_resolution = camera_info.camera_configuration.resolution
+        self.camera_resolution = (camera_resolution.width, camera_resolution.height)
+        self.sl_display_resolution = sl.Resolution(min(camera_resolution.width, self.max_display[0]),
+                                                   min(camera_resolution.height, self.max_display[1]))
+        self.display_resolution = (self.sl_display_resolution.width, self.sl_display_resolution.height)
+
+        self.bodies = sl.Bodies()
+        self.image = sl.Mat()
+        return self
+
+    def read(self, body_arrays, want_image=True):
+        with timer(self.metrics, "grab"):
+            err = self.zed.grab()
+        if err == sl.ERROR_CODE.END_OF_SVOFILE_REACHED:
+            self.finished = True
+            return None
+        if err != sl.ERROR_CODE.SUCCESS:
+            return None
+        # Get the camera pose
+        self.zed.get_position(self.camera_pose, sl.REFERENCE_FRAME.WORLD)
+        camera_pose = np.array(self.camera_pose.pose_data(self.pose_transform).m, dtype=np.float64)
+        image = None
+        if want_image:
+            # Retrieve left image
+            with timer(self.metrics, "retrieve_image"):
+                self.zed.retrieve_image(self.image, sl.VIEW.LEFT, sl.MEM.CPU, self.sl_display_resolution)
+                # image 下一帧会被覆盖，交给其他阶段的必须是副本
+                image = np.copy(self.image.get_data())
+        # Retrieve bodies
+        with timer(self.metrics, "retrieve_bodies"):
+            self.zed.retrieve_bodies(self.bodies, self.body_runtime_param)
+            body_arrays.fill(self.bodies)
+        return self.bodies.body_list, image, camera_pose
+
+    def close(self):
+        self.image.free(sl.MEM.CPU)
+        self.zed.disable_body_tracking()
+        self.zed.disable_positional_tracking()
+        self.zed.close()
+
+
+class SvoSource(ZedSource):
+    """
+    SVO 录像回放。real_time 为 False 时 SDK 以最快速度解码
+    """
+    def __init__(self, path, real_time=True, max_display=(1280, 720)):
+        ZedSource.__init__(self, input_svo_file=path, real_time=real_time, max_display=max_display)
+
+
+class _Pacer:
+    """
+    按帧时间戳控制回放速度；real_time 为 False 时不等待
+    """
+    def __init__(self, real_time):
+        self.real_time = real_time
+        self.origin = None
+
+    def reset(self):
+        self.origin = None
+
+    def wait(self, timestamp_ns):
+        if not self.real_time:
+            return
+        now = time.perf_counter()
+        if self.origin is None:
+            self.origin = (now, timestamp_ns)
+            return
+        delay = self.origin[0] + (timestamp_ns - self.origin[1]) * 1e-9 - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _ReplaySource(BodySource):
+    """
+    回放录制数据的公共部分：按时间戳控制速度、循环播放 (时间戳继续递增)、生成黑色画布
+    """
+    def __init__(self, real_time=True, loop=False, calibration=None):
+        BodySource.__init__(self)
+        self.pacer = _Pacer(real_time)
+        self.loop = loop
+        if calibration is not None:
+            self.calibration = calibration
+        self.camera_resolution = (self.calibration.image_size.width, self.calibration.image_size.height)
+        self.display_resolution = self.camera_resolution
+        self.index = 0
+        self.time_offset = 0
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def _timestamp(self, index):
+        raise NotImplementedError
+
+    def _load(self, index, body_arrays):
+        """
+        返回值:
+        list: 该帧的 body_list
+        """
+        raise NotImplementedError
+
+    def read(self, body_arrays, want_image=True):
+        if self.index >= len(self):
+            if not self.loop or len(self) == 0:
+                self.finished = True
+                return None
+            # 循环时时间戳接着上一轮递增，保证下游的滤波 / 变化检测看到的时间是单调的
+            self.time_offset += self._timestamp(len(self) - 1) - self._timestamp(0) + self._frame_interval()
+            self.index = 0
+        timestamp_ns = self._timestamp(self.index) + self.time_offset
+        self.pacer.wait(timestamp_ns)
+        with timer(self.metrics, "retrieve_bodies"):
+            body_list = self._load(self.index, body_arrays)
+        body_arrays.timestamp_ns = timestamp_ns
+        self.index += 1
+        image = None
+        if want_image:
+            image = np.zeros((self.display_resolution[1], self.display_resolution[0], 4), dtype=np.uint8)
+        return body_list, image, np.eye(4)
+
+    def _frame_interval(self):
+        if len(self) < 2:
+            return int(1e9 / 30)
+        return max((self._timestamp(len(self) - 1) - self._timestamp(0)) // (len(self) - 1), 1)
+
+
+class SessionSource(_ReplaySource):
+    """
+    回放 SessionRecorder 录制的会话 (见 modules/session_recorder.py)
+    """
+    def __init__(self, path, real_time=True, loop=False, calibration=None):
+        self.reader = SessionReader(path)
+        _ReplaySource.__init__(self, real_time, loop, calibration)
+        self.keypoint_count = self.reader.keypoint_count
+
+    def __len__(self):
+        return len(self.reader)
+
+    def _timestamp(self, index):
+        return int(self.reader.timestamps[index])
+
+    def _load(self, index, body_arrays):
+        self.reader.body_arrays(index, out=body_arrays)
+        return body_arrays.body_views()
+
+
+def _is_json(text):
+    try:
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+
+class JsonSource(_ReplaySource):
+    """
+    回放 serializeBodies 格式的 JSON 数据 (与 sample json.json 中的结构相同)。文件可以是
+    单个帧对象、帧对象的列表，或每行一个帧对象 (JSON Lines)。
+    时间戳不递增时 (例如手写的样例) 按 fps 生成时间戳
+    """
+    def __init__(self, path, real_time=True, loop=False, calibration=None, fps=30.0):
+        with open(path) as f:
+            text = f.read()
+        lines = [line for line in text.splitlines() if line.strip()]
+        try:
+            if path.endswith(".jsonl") or (len(lines) > 1 and _is_json(lines[0])):
+                frames = [json.loads(line) for line in lines]
+            else:
+                data = json.loads(text)
+                frames = data if isinstance(data, list) else [data]
+        except ValueError as e:
+            raise ValueError("%s is not a serializeBodies JSON / JSON Lines file: %s" % (path, e))
+        self.frames = [frame.get("body_list", []) for frame in frames]
+        timestamps = np.array([int(frame.get("timestamp", 0)) for frame in frames], dtype=np.int64)
+        if len(timestamps) > 1 and not np.all(np.diff(timestamps) > 0):
+            timestamps = (np.arange(len(timestamps)) * (1e9 / fps)).astype(np.int64)
+        self.timestamps = timestamps
+        _ReplaySource.__init__(self, real_time, loop, calibration)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _timestamp(self, index):
+        return int(self.timestamps[index])
+
+    def _load(self, index, body_arrays):
+        body_arrays.fill_dicts(self.frames[index])
+        return body_arrays.body_views()
+
+
+# BODY_34 站立姿势模板 (米，Y 轴向上，人朝向 +Z，原点在两脚之间)
+_STANDING_POSE = np.array([
+    (0.0, 1.00, 0.0), (0.0, 1.12, 0.0), (0.0, 1.30, 0.0), (0.0, 1.50, 0.0),                 # 骨盆 - 颈
+    (0.08, 1.45, 0.0), (0.18, 1.44, 0.0), (0.21, 1.18, 0.02), (0.23, 0.94, 0.05),            # 左臂
+    (0.23, 0.88, 0.06), (0.23, 0.82, 0.07), (0.20, 0.90, 0.09),
+    (-0.08, 1.45, 0.0), (-0.18, 1.44, 0.0), (-0.21, 1.18, 0.02), (-0.23, 0.94, 0.05),        # 右臂
+    (-0.23, 0.88, 0.06), (-0.23, 0.82, 0.07), (-0.20, 0.90, 0.09),
+    (0.10, 0.95, 0.0), (0.11, 0.52, 0.02), (0.11, 0.08, 0.0), (0.11, 0.0, 0.12),             # 左腿
+    (-0.10, 0.95, 0.0), (-0.11, 0.52, 0.02), (-0.11, 0.08, 0.0), (-0.11, 0.0, 0.12),         # 右腿
+    (0.0, 1.66, 0.0), (0.0, 1.63, 0.10), (0.03, 1.66, 0.08), (0.07, 1.63, 0.0),              # 头、鼻、左眼、左耳
+    (-0.03, 1.66, 0.08), (-0.07, 1.63, 0.0), (0.11, 0.03, -0.05), (-0.11, 0.03, -0.05),      # 右眼、右耳、脚跟
+], dtype=np.float64)
+
+# 头部 3D 框：前四个角在鼻子一侧 (与 interaction_checker.head_vectors_from_bboxes 的约定一致)
+_HEAD_BOX = np.array([
+    (-0.09, 1.76, 0.11), (0.09, 1.76, 0.11), (0.09, 1.54, 0.11), (-0.09, 1.54, 0.11),
+    (-0.09, 1.76, -0.11), (0.09, 1.76, -0.11), (0.09, 1.54, -0.11), (-0.09, 1.54, -0.11),
+], dtype=np.float64)
+
+
+def _box_corners_2d(points):
+    """
+    (N, M, 2) 点集的外接矩形，按左上、右上、右下、左下返回 (N, 4, 2)，与 SDK 的 bounding_box_2d 顺序一致
+    """
+    low, high = points.min(axis=1), points.max(axis=1)
+    return np.stack([low, np.stack([high[:, 0], low[:, 1]], axis=-1),
+                     high, np.stack([low[:, 0], high[:, 1]], axis=-1)], axis=1)
+
+
+class SyntheticSource(BodySource):
+    """
+    生成 count 个站在相机前方、缓慢转身和摆动的人，用于基准测试和没有录制数据时的联调。
+    相机在原点、高 1.2 米、朝 -Z 方向看
+    """
+    def __init__(self, count=5, frames=None, fps=30.0, real_time=False, seed=0, calibration=None):
+        BodySource.__init__(self)
+        if calibration is not None:
+            self.calibration = calibration
+        self.camera_resolution = (self.calibration.image_size.width, self.calibration.image_size.height)
+        self.display_resolution = self.camera_resolution
+        self.count = count
+        self.frames = frames
+        self.frame_interval_ns = int(1e9 / fps)
+        self.pacer = _Pacer(real_time)
+        self.index = 0
+
+        rng = np.random.default_rng(seed)
+        columns = int(math.ceil(math.sqrt(count)))
+        self.anchors = np.array([((i % columns - (columns - 1) / 2) * 1.2, 0.0, -2.0 - (i // columns) * 1.2)
+                                 for i in range(count)], dtype=np.float64)
+        self.base_yaw = rng.uniform(-math.pi, math.pi, count)
+        self.phase = rng.uniform(0, 2 * math.pi, count)
+        self.ids = np.arange(count, dtype=np.int32)
+        fx = (self.camera_resolution[0] / 2) / math.tan(math.radians(self.calibration.h_fov) / 2)
+        self.intrinsics = (fx, self.camera_resolution[0] / 2, self.camera_resolution[1] / 2)
+
+    def _project(self, points):
+        fx, cx, cy = self.intrinsics
+        depth = np.maximum(-points[..., 2], 1e-3)
+        u = cx + fx * points[..., 0] / depth
+        v = cy - fx * (points[..., 1] - 1.2) / depth
+        return np.stack([u, v], axis=-1)
+
+    def read(self, body_arrays, want_image=True):
+        if self.frames is not None and self.index >= self.frames:
+            self.finished = True
+            return None
+        timestamp_ns = self.index * self.frame_interval_ns
+        self.pacer.wait(timestamp_ns)
+        t = timestamp_ns * 1e-9
+        self.index += 1
+
+        yaw = self.base_yaw + 0.4 * np.sin(0.5 * t + self.phase)
+        cos, sin = np.cos(yaw), np.sin(yaw)
+        # 绕 Y 轴旋转：(N, 3, 3)
+        rotation = np.zeros((self.count, 3, 3))
+        rotation[:, 0, 0], rotation[:, 0, 2] = cos, sin
+        rotation[:, 1, 1] = 1.0
+        rotation[:, 2, 0], rotation[:, 2, 2] = -sin, cos
+        sway = 0.03 * np.sin(2.0 * t + self.phase)[:, None]
+        keypoints = np.einsum('nij,kj->nki', rotation, _STANDING_POSE) + self.anchors[:, None, :]
+        keypoints[:, :, 0] += sway
+        head_box = np.einsum('nij,kj->nki', rotation, _HEAD_BOX) + self.anchors[:, None, :]
+        head_box[:, :, 0] += sway
+
+        keypoints_2d = self._project(keypoints)
+        head_2d = self._project(head_box)
+        columns = {
+            "ids": self.ids,
+            "confidences": np.full(self.count, 90.0),
+            "tracking_state": np.ones(self.count),
+            "keypoints": keypoints,
+            "keypoints_2d": keypoints_2d,
+            "keypoint_confidence": np.full((self.count, len(_STANDING_POSE)), 80.0),
+            "positions": keypoints[:, 0],
+            "velocities": np.zeros((self.count, 3)),
+            "dimensions": np.tile([0.5, 1.75, 0.3], (self.count, 1)),
+            "bounding_box_2d": _box_corners_2d(keypoints_2d),
+            "head_positions": head_box.mean(axis=1),
+            "head_bounding_box_2d": _box_corners_2d(head_2d),
+            "head_bounding_box": head_box,
+            "global_root_orientation": np.stack([np.zeros(self.count), np.sin(yaw / 2), np.zeros(self.count), np.cos(yaw / 2)], axis=1),
+        }
+        body_arrays.assign(columns, self.count, timestamp_ns)
+        image = None
+        if want_image:
+            image = np.zeros((self.display_resolution[1], self.display_resolution[0], 4), dtype=np.uint8)
+        return body_arrays.body_views(), image, np.eye(4)
+
+
+def open_source(input_svo_file='', ip_address='', resolution='', replay='', real_time=True, loop=False):
+    """
+    按参数选择数据源：replay 为会话目录或 .json / .jsonl 文件时回放录制数据，
+    否则为 SVO 文件、网络流或有线 ZED 相机
+
+    返回值:
+    BodySource: 已经 open 的数据源
+    """
+    if replay:
+        if os.path.isdir(replay) and os.path.exists(os.path.join(replay, META_FILE)):
+            source = SessionSource(replay, real_time, loop)
+        elif replay.endswith((".json", ".jsonl")):
+            source = JsonSource(replay, real_time, loop)
+        elif replay.endswith((".svo", ".svo2")):
+            source = SvoSource(replay, real_time)
+        else:
+            raise ValueError("cannot replay %r: expected a recorded session directory, .json/.jsonl or .svo file" % replay)
+    elif input_svo_file:
+        source = SvoSource(input_svo_file, real_time)
+    else:
+        source = ZedSource(ip_address=ip_address, resolution=resolution)
+    return source.open()
+
+
+def open_source_spec(spec, real_time=True, loop=False):
+    """
+    按一个字符串打开数据源，用于多相机模式下每个相机的 --cameras 参数:
+      serial:<序列号>        有线 ZED 相机
+      a.b.c.d[:port]         网络流
+      <文件>.svo / .svo2     SVO 录像
+      <目录> / .json / .jsonl  录制的数据
+      synthetic[:人数]        合成数据
+      空字符串                默认的有线相机
+
+    返回值:
+    BodySource: 已经 open 的数据源
+    """
+    if spec.startswith("serial:"):
+        return ZedSource(serial_number=int(spec.split(":", 1)[1])).open()
+    if spec.startswith("synthetic"):
+        count = int(spec.split(":", 1)[1]) if ":" in spec else 5
+        return SyntheticSource(count, real_time=real_time).open()
+    if spec.replace(':', '').replace('.', '').isdigit() and len(spec.split('.')) == 4:
+        return open_source(ip_address=spec)
+    if spec:
+        return open_source(replay=spec, real_time=real_time, loop=loop)
+    return open_source()
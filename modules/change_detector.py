@@ -0,0 +1,74 @@
+import time
+import numpy as np
+
+
+class ChangeDetector:
+    """
+    一个 UDP 通道的变化检测：记住每个 id 最近一次发送的值，只有变化超过 dead_band 的人才需要再发送。
+    每隔 keyframe_interval 秒，或者有人离开画面时，发送一次完整的关键帧，接收端据此重新同步 (并删除离开的人)。
+    """
+    def __init__(self, dead_band, keyframe_interval=2.0):
+        """
+        参数:
+        dead_band (float): 任一分量变化的绝对值超过该值才视为变化 (关键点单位为米，状态为 0–1)
+        keyframe_interval (float): 关键帧间隔 (秒)，<= 0 表示每次都发送完整数据
+        """
+        self.dead_band = dead_band
+        self.keyframe_interval = keyframe_interval
+        self.last_sent = {}
+        self.last_keyframe_time = None
+        self.rows_seen = 0
+        self.rows_sent = 0
+        self.keyframes = 0
+
+    def select(self, ids, values, now=None):
+        """
+        参数:
+        ids (array-like): 每个人的 id，长度 N
+        values (np.ndarray): (N, ...) 每个人要发送的值
+        now (float): 当前时间，默认为 time.time()
+
+        返回值:
+        tuple: (mask, keyframe)
+            mask (np.ndarray): (N,) bool，需要发送的人
+            keyframe (bool): 为 True 时 mask 全为 True，应作为完整帧发送
+        """
+        now = time.time() if now is None else now
+        ids = [int(person_id) for person_id in ids]
+        values = np.asarray(values, dtype=np.float32)
+        # 不用 -1：没有人时 (0, ...) 也要能展平
+        values = values.reshape(len(ids), int(np.prod(values.shape[1:], dtype=np.int64)))
+
+        keyframe = (self.last_keyframe_time is None
+                    or now - self.last_keyframe_time >= self.keyframe_interval
+                    or not set(self.last_sent).issubset(ids))
+        if keyframe:
+            mask = np.ones(len(ids), dtype=bool)
+            self.last_keyframe_time = now
+            self.last_sent = {}
+            self.keyframes += 1
+        else:
+            mask = np.zeros(len(ids), dtype=bool)
+            for i, person_id in enumerate(ids):
+                previous = self.last_sent.get(person_id)
+                if previous is None or previous.shape != values[i].shape:
+                    mask[i] = True
+                    continue
+                current = values[i]
+                with np.errstate(invalid='ignore'):
+                    moved = np.abs(current - previous) > self.dead_band
+                # 由缺失变为有效 (或相反) 也算变化
+                mask[i] = bool(moved.any() or (np.isnan(current) != np.isnan(previous)).any())
+
+        for i in np.flatnonzero(mask):
+            self.last_sent[ids[i]] = values[i].copy()
+        self.rows_seen += len(ids)
+        self.rows_sent += int(mask.sum())
+        return mask, keyframe
+
+    def stats(self):
+        return {
+            "rows_seen": self.rows_seen,
+            "rows_sent": self.rows_sent,
+            "keyframes": self.keyframes,
+        }
@@ -0,0 +1,142 @@
+import numpy as np
+
+# 坐标系变换都用 4×4 齐次矩阵表示，对 (..., 3) 的点数组做一次矩阵乘法；缺失的关键点 (NaN) 变换后仍是 NaN。
+# 相机以 RIGHT_HANDED_Y_UP 输出，各坐标系:
+#   camera   SDK 原始输出 (相机坐标系)，GLViewer 直接渲染这个坐标系
+#   world    乘以 zed.get_position(WORLD) 得到的相机位姿
+# 原来的 convert_to_right_handed_y_up 交换 Y / Z 时写进的是 body.keypoint 返回的临时数组，
+# 从来没有影响过渲染，所以 GL 视图不需要单独的坐标系。
+
+COORDINATE_FRAMES = ("camera", "world")
+
+# BodyArrays 中表示三维点 (会随位姿平移) 的字段
+POINT_FIELDS = ("keypoints", "positions", "head_positions", "head_bounding_box")
+
+
+def transform_points(points, matrix):
+    """
+    参数:
+    points (np.ndarray): (..., 3) 点
+    matrix (np.ndarray): 4×4 齐次变换
+
+    返回值:
+    np.ndarray: 与 points 形状相同的 float32 新数组 (不修改输入)
+    """
+    points = np.asarray(points, dtype=np.float32)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def frame_matrix(name, camera_pose=None):
+    """
+    返回值:
+    np.ndarray: 从相机坐标系到 name 坐标系的 4×4 矩阵；没有位姿时 world 与 camera 相同
+    """
+    pose = np.eye(4) if camera_pose is None else np.asarray(camera_pose, dtype=np.float64)
+    if name == "camera":
+        return np.eye(4)
+    if name == "world":
+        return pose
+    raise ValueError("unknown coordinate frame %r, expected one of %s" % (name, ", ".join(COORDINATE_FRAMES)))
+
+
+class FrameTransforms:
+    """
+    一帧的坐标变换缓存。同一字段、同一坐标系只计算一次，各阶段 (分析、发送、显示) 共享同一份只读结果，
+    原始的 BodyArrays 和 SDK 对象都不会被修改。
+    """
+    def __init__(self, bodies, camera_pose=None):
+        """
+        参数:
+        bodies (BodyArrays): 这一帧的快照
+        camera_pose (np.ndarray): 4×4 相机到世界坐标的变换，可选
+        """
+        self.bodies = bodies
+        self.camera_pose = camera_pose
+        self.cache = {}
+
+    def points(self, field="keypoints", frame="world"):
+        """
+        参数:
+        field (str): POINT_FIELDS 中的字段
+        frame (str): COORDINATE_FRAMES 中的坐标系
+
+        返回值:
+        np.ndarray: (count, ...) 变换后的点 (只读)；camera 坐标系直接返回原数组的视图
+        """
+        key = (field, frame)
+        result = self.cache.get(key)
+        if result is None:
+            if field not in POINT_FIELDS:
+                raise ValueError("%s is not a point field" % field)
+            source = getattr(self.bodies, field)[:self.bodies.count]
+            if frame == "camera":
+                result = source.view()
+            else:
+                result = transform_points(source, frame_matrix(frame, self.camera_pose))
+            result.flags.writeable = False
+            self.cache[key] = result
+        return result
+
+    def keypoints(self, frame="world"):
+        return self.points("keypoints", frame)
+
+
+def rotation_to_quaternion(matrix):
+    """
+    返回值:
+    np.ndarray: 4×4 (或 3×3) 矩阵旋转部分对应的单位四元数 [x, y, z, w]
+    """
+    m = np.asarray(matrix, dtype=np.float64)[:3, :3]
+    trace = m[0, 0] + m[1, 1] + m[2, 2]
+    if trace > 0:
+        s = 2.0 * np.sqrt(trace + 1.0)
+        q = [(m[2, 1] - m[1, 2]) / s, (m[0, 2] - m[2, 0]) / s, (m[1, 0] - m[0, 1]) / s, 0.25 * s]
+    elif m[0, 0] > m[1, 1] and m[0, 0] > m[2, 2]:
+        s = 2.0 * np.sqrt(1.0 + m[0, 0] - m[1, 1] - m[2, 2])
+        q = [0.25 * s, (m[0, 1] + m[1, 0]) / s, (m[0, 2] + m[2, 0]) / s, (m[2, 1] - m[1, 2]) / s]
+    elif m[1, 1] > m[2, 2]:
+        s = 2.0 * np.sqrt(1.0 + m[1, 1] - m[0, 0] - m[2, 2])
+        q = [(m[0, 1] + m[1, 0]) / s, 0.25 * s, (m[1, 2] + m[2, 1]) / s, (m[0, 2] - m[2, 0]) / s]
+    else:
+        s = 2.0 * np.sqrt(1.0 + m[2, 2] - m[0, 0] - m[1, 1])
+        q = [(m[0, 2] + m[2, 0]) / s, (m[1, 2] + m[2, 1]) / s, 0.25 * s, (m[1, 0] - m[0, 1]) / s]
+    return np.array(q)
+
+
+def quaternion_multiply(a, b):
+    """
+    参数:
+    a, b (np.ndarray): (..., 4) 四元数 [x, y, z, w]
+
+    返回值:
+    np.ndarray: a * b (先旋转 b 再旋转 a)
+    """
+    ax, ay, az, aw = np.moveaxis(np.asarray(a, dtype=np.float64), -1, 0)
+    bx, by, bz, bw = np.moveaxis(np.asarray(b, dtype=np.float64), -1, 0)
+    return np.stack([aw * bx + ax * bw + ay * bz - az * by,
+                     aw * by - ax * bz + ay * bw + az * bx,
+                     aw * bz + ax * by - ay * bx + az * bw,
+                     aw * bw - ax * bx - ay * by - az * bz], axis=-1)
+
+
+def transform_bodies(bodies, matrix):
+    """
+    把 BodyArrays 的所有三维字段原地变换到另一个坐标系 (点、速度和根节点朝向)，
+    用于多相机融合前把每个相机自己的副本转换到世界坐标系
+
+    参数:
+    bodies (BodyArrays): 会被修改
+    matrix (np.ndarray): 4×4 齐次变换
+    """
+    count = bodies.count
+    if not count:
+        return bodies
+    for field in POINT_FIELDS:
+        values = getattr(bodies, field)
+        values[:count] = transform_points(values[:count], matrix)
+    rotation = np.asarray(matrix, dtype=np.float32)[:3, :3]
+    bodies.velocities[:count] = bodies.velocities[:count] @ rotation.T
+    bodies.global_root_orientation[:count] = quaternion_multiply(rotation_to_quaternion(matrix),
+                                                                 bodies.global_root_orientation[:count])
+    return bodies
@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from modules.metrics import timer
+
+# DisplayThread 放进 events 的事件
+EVENT_QUIT = "quit"
+EVENT_PAUSE = "pause"
+
+_KEY_EVENTS = {113: EVENT_QUIT, 109: EVENT_PAUSE}     # 'q', 'm'
+
+
+class DisplayThread:
+    """
+    在独立线程中运行 OpenGL 和 OpenCV 两个窗口，按固定的最高帧率从 DoubleBuffer 取最新的帧渲染，
+    显示再慢也不会拖慢采集和分析。按键和窗口关闭转成事件放进 events，由主线程处理。
+    窗口在这个线程中创建，所有 GLUT / HighGUI 调用也都在这个线程中。
+    """
+    def __init__(self, source, frames, rate=15.0, overlay=None, metrics=None, window_name="ZED | 2D View"):
+        """
+        参数:
+        source (BodySource): 提供标定参数、显示分辨率和人体格式
+        frames (DoubleBuffer): 分析阶段写入的最新帧 (pipeline.Frame)
+        rate (float): 最高渲染帧率 (Hz)
+        overlay (callable): overlay(image)，在 2D 视图上额外绘制 (例如表情)，可选
+        metrics (MetricsRegistry): 记录 viewer_update / render_2d 的耗时，可选
+        """
+        self.source = source
+        self.frames = frames
+        self.period = 1.0 / rate if rate > 0 else 0.0
+        self.overlay = overlay
+        self.metrics = metrics
+        self.window_name = window_name
+        self.events = queue.Queue()
+        self.rendered = 0
+        self.running = False
+        self.ready = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="display", daemon=True)
+        # 两块轮流使用的画布：2D 视图画在副本上，不修改分析阶段仍在使用的 frame.image
+        self.canvases = [None, None]
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread.is_alive():
+            self.thread.join()
+
+    def _canvas(self, image):
+        index = self.rendered % 2
+        canvas = self.canvases[index]
+        if canvas is None or canvas.shape != image.shape:
+            canvas = self.canvases[index] = np.empty_like(image)
+        np.copyto(canvas, image)
+        return canvas
+
+    def _run(self):
+        # 只在需要显示时导入，无头部署的机器可以不装 PyOpenGL
+        try:
+            import ogl_viewer.viewer as gl
+            import cv_viewer.tracking_viewer as cv_viewer
+            viewer = gl.GLViewer()
+            viewer.init(self.source.calibration, self.source.is_tracking_on, self.source.body_format)
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.ready.set()
+
+        image_scale = self.source.image_scale
+        next_time = time.perf_counter()
+        while self.running:
+            frame = self.frames.read()
+            if frame is not None:
+                with timer(self.metrics, "viewer_update"):
+                    viewer.update_view(frame.image, frame)
+                if frame.image is not None:
+                    image_left_ocv = self._canvas(frame.image)
+                    with timer(self.metrics, "render_2d"):
+                        cv_viewer.render_2D(image_left_ocv, image_scale, frame.body_list, self.source.is_tracking_on, self.source.body_format)
+                    if self.overlay is not None:
+                        self.overlay(image_left_ocv)
+                    cv2.imshow(self.window_name, image_left_ocv)
+                self.rendered += 1
+
+            # waitKey 同时处理 HighGUI 的窗口事件，is_available 处理 GLUT 事件并重绘
+            key = cv2.waitKey(1)
+            if key in _KEY_EVENTS:
+                self.events.put(_KEY_EVENTS[key])
+            if not viewer.is_available():
+                self.events.put(EVENT_QUIT)
+                break
+
+            next_time += self.period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # 渲染跟不上时不补帧
+                next_time = time.perf_counter()
+
+        viewer.exit()
+        cv2.destroyAllWindows()
@@ -0,0 +1,216 @@
+import json
+import os
+import urllib.request
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+# 人脸框，接口与 Vision 的 bounding_poly 一致 (vertices[i].x / .y)
+Vertex = namedtuple("Vertex", "x y")
+BoundingPoly = namedtuple("BoundingPoly", "vertices")
+
+
+def box_to_poly(x0, y0, x1, y1):
+    return BoundingPoly([Vertex(int(x0), int(y0)), Vertex(int(x1), int(y0)),
+                         Vertex(int(x1), int(y1)), Vertex(int(x0), int(y1))])
+
+
+def probability_to_likelihood(p):
+    """
+    把 0–1 的概率映射到 Vision 的 1–5 可能性等级 (VERY_UNLIKELY … VERY_LIKELY)
+    """
+    return 1 + int(np.searchsorted((0.1, 0.3, 0.5, 0.75), p, side="right"))
+
+
+class EmotionBackend:
+    """
+    表情识别后端接口。detect 返回 [(bounding_poly, expressions, detection_confidence), ...]，
+    expressions 的键为 Joy / Sorrow / Anger / Surprise / Headwear，取值为与 Vision 相同的 0–5 等级 (0 表示未知)。
+    image 为头部拼图时 tile_size 是每个格子的边长，整帧时为 None。
+    """
+    name = "base"
+
+    def detect(self, image, tile_size=None):
+        raise NotImplementedError
+
+
+class GoogleVisionBackend(EmotionBackend):
+    """
+    Google Cloud Vision face_detection。凭据和代理在构造时才加载，导入模块不会有副作用。
+    """
+    name = "google"
+
+    def __init__(self, credentials_path='./linear-arcadia-428108-u4-77ca8a070ab6.json', proxy='http://127.0.0.1:52031'):
+        from google.cloud import vision
+        from google.oauth2 import service_account
+
+        # 配置代理（如果需要）
+        if proxy:
+            os.environ['http_proxy'] = proxy
+            os.environ['https_proxy'] = proxy
+
+        # Google Cloud Vision API 配置
+        credentials = service_account.Credentials.from_service_account_file(
+            credentials_path,
+            scopes=['https://www.googleapis.com/auth/cloud-platform']
+        )
+        self.vision = vision
+        self.client = vision.ImageAnnotatorClient(credentials=credentials)
+        self.likelihood_to_number = {
+            vision.Likelihood.UNKNOWN: 0,
+            vision.Likelihood.VERY_UNLIKELY: 1,
+            vision.Likelihood.UNLIKELY: 2,
+            vision.Likelihood.POSSIBLE: 3,
+            vision.Likelihood.LIKELY: 4,
+            vision.Likelihood.VERY_LIKELY: 5
+        }
+
+    def detect(self, image, tile_size=None):
+        _, encoded_image = cv2.imencode('.jpg', image)
+        response = self.client.face_detection(image=self.vision.Image(content=encoded_image.tobytes()))
+        faces = []
+        for face in response.face_annotations:
+            expressions = {
+                "Joy": self.likelihood_to_number[face.joy_likelihood],
+                "Sorrow": self.likelihood_to_number[face.sorrow_likelihood],
+                "Anger": self.likelihood_to_number[face.anger_likelihood],
+                "Surprise": self.likelihood_to_number[face.surprise_likelihood],
+                "Headwear": self.likelihood_to_number[face.headwear_likelihood]
+            }
+            faces.append((face.bounding_poly, expressions, face.detection_confidence))
+        return faces
+
+
+class LocalCpuBackend(EmotionBackend):
+    """
+    本地 CPU 推理：OpenCV 人脸检测 + ONNX 表情分类模型 (FER+ emotion-ferplus-8.onnx，64×64 灰度输入)。
+    face_model 为 YuNet ONNX 模型路径，不提供时退回 OpenCV 自带的 Haar 级联检测器。
+    模型文件不随仓库提供，需要自行下载。
+    """
+    name = "local"
+
+    # FER+ 输出顺序
+    FERPLUS_CLASSES = ("neutral", "happiness", "surprise", "sadness", "anger", "disgust", "fear", "contempt")
+
+    def __init__(self, expression_model='models/emotion-ferplus-8.onnx', face_model=None, score_threshold=0.7):
+        self.expression_net = cv2.dnn.readNetFromONNX(expression_model)
+        # 公开的 FER+ 模型声明的 batch 固定为 1：加载时试一次 batch 为 2 的推理，不支持时逐张推理
+        self.batched = self._supports_batch()
+        self.score_threshold = score_threshold
+        if face_model:
+            self.face_detector = cv2.FaceDetectorYN.create(face_model, "", (320, 320), score_threshold)
+            self.cascade = None
+        else:
+            self.face_detector = None
+            self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def _supports_batch(self):
+        self.expression_net.setInput(np.zeros((2, 1, 64, 64), dtype=np.float32))
+        try:
+            return self.expression_net.forward().shape[0] == 2
+        except cv2.error:
+            return False
+
+    def _classify(self, crops):
+        """
+        返回值:
+        np.ndarray: (len(crops), 类别数) logits
+        """
+        blob = np.stack(crops).astype(np.float32)[:, None, :, :]
+        if self.batched:
+            # 所有人脸一次前向推理
+            self.expression_net.setInput(blob)
+            return self.expression_net.forward().reshape(len(crops), -1)
+        rows = []
+        for i in range(len(crops)):
+            self.expression_net.setInput(blob[i:i + 1])
+            rows.append(self.expression_net.forward().reshape(-1))
+        return np.stack(rows)
+
+    def _detect_boxes(self, image):
+        """
+        返回值:
+        list: [(x, y, w, h, confidence), ...]
+        """
+        if self.face_detector is not None:
+            self.face_detector.setInputSize((image.shape[1], image.shape[0]))
+            _, detections = self.face_detector.detect(image)
+            if detections is None:
+                return []
+            return [(d[0], d[1], d[2], d[3], float(d[-1])) for d in detections]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        return [(x, y, w, h, 1.0) for x, y, w, h in self.cascade.detectMultiScale(gray, 1.1, 5, minSize=(24, 24))]
+
+    def detect(self, image, tile_size=None):
+        image = image[:, :, :3]
+        boxes = self._detect_boxes(np.ascontiguousarray(image))
+        if not boxes:
+            return []
+
+        height, width = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        rects = []
+        crops = []
+        for x, y, w, h, confidence in boxes:
+            x0, y0 = max(int(x), 0), max(int(y), 0)
+            x1, y1 = min(int(x + w), width), min(int(y + h), height)
+            if x1 - x0 < 8 or y1 - y0 < 8:
+                continue
+            rects.append((x0, y0, x1, y1, confidence))
+            crops.append(cv2.resize(gray[y0:y1, x0:x1], (64, 64), interpolation=cv2.INTER_AREA))
+        if not crops:
+            return []
+
+        logits = self._classify(crops)
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        classes = {name: i for i, name in enumerate(self.FERPLUS_CLASSES)}
+
+        faces = []
+        for (x0, y0, x1, y1, confidence), p in zip(rects, probabilities):
+            expressions = {
+                "Joy": probability_to_likelihood(p[classes["happiness"]]),
+                "Sorrow": probability_to_likelihood(p[classes["sadness"]]),
+                "Anger": probability_to_likelihood(p[classes["anger"]] + p[classes["disgust"]]),
+                "Surprise": probability_to_likelihood(p[classes["surprise"]]),
+                "Headwear": 0,    # 本地模型不判断头饰，记为 UNKNOWN
+            }
+            faces.append((box_to_poly(x0, y0, x1, y1), expressions, confidence))
+        return faces
+
+
+class MockHttpBackend(EmotionBackend):
+    """
+    本地 HTTP 替身服务 (见 modules/mock_emotion_server.py) 的客户端，用于在没有网络 / 凭据时测延迟和离线运行
+    """
+    name = "mock"
+
+    def __init__(self, url='http://127.0.0.1:8089/detect', timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def detect(self, image, tile_size=None):
+        _, encoded_image = cv2.imencode('.jpg', image[:, :, :3])
+        # 只有头部拼图才告诉替身服务格子大小，整帧时服务只返回一张假的人脸
+        url = self.url if tile_size is None else "%s?tile=%d" % (self.url, tile_size)
+        request = urllib.request.Request(url, data=encoded_image.tobytes(),
+                                         headers={"Content-Type": "image/jpeg"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = json.loads(response.read())
+        return [(box_to_poly(*face["box"]), face["expressions"], face["confidence"]) for face in body["faces"]]
+
+
+def create_backend(name, **kwargs):
+    """
+    按名字创建后端: "google" / "local" / "mock"
+    """
+    backends = {
+        GoogleVisionBackend.name: GoogleVisionBackend,
+        LocalCpuBackend.name: LocalCpuBackend,
+        MockHttpBackend.name: MockHttpBackend,
+    }
+    if name not in backends:
+        raise ValueError("unknown emotion backend %r, expected one of %s" % (name, ", ".join(backends)))
+    return backends[name](**kwargs)
@@ -0,0 +1,146 @@
+import threading
+import time
+import numpy as np
+import cv2
+
+from modules.emotion_recognition import head_crop_rects
+
+
+def appearance_hash(crop, hash_size=8):
+    """
+    计算头部裁剪图的差值哈希 (dHash)：灰度缩小到 (hash_size+1)×hash_size，比较相邻像素
+
+    参数:
+    crop (np.ndarray): BGR(A) 图像块
+    hash_size (int): 哈希边长，结果共 hash_size² 位
+
+    返回值:
+    int: 哈希值
+    """
+    if crop.ndim == 3:
+        crop = cv2.cvtColor(crop, cv2.COLOR_BGRA2GRAY if crop.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(crop, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class EmotionCache:
+    """
+    按 ZED 人的 id 缓存最近一次的表情结果。
+    条目在 ttl 秒后过期；头部外观哈希变化超过 hash_threshold 位时提前失效。只有过期的人才需要重新识别。
+    """
+    def __init__(self, ttl=10.0, hash_threshold=12, hash_size=8, pending_timeout=5.0):
+        self.ttl = ttl
+        self.pending_timeout = pending_timeout
+        self.hash_threshold = hash_threshold
+        self.hash_size = hash_size
+        self.lock = threading.Lock()
+        # id -> {"expressions": dict, "hash": int, "time": float}
+        self.entries = {}
+        # 已提交但还没返回结果的 id -> (提交时的外观哈希, 提交时间)
+        # 请求可能在信箱里被新帧覆盖而永远不会返回，所以 pending 也会超时
+        self.pending = {}
+
+        self.hits = 0
+        self.expired = 0
+        self.invalidated = 0
+        self.misses = 0
+
+    def select_stale(self, frame, ids, head_boxes_2d, scale=(1.0, 1.0), now=None):
+        """
+        找出需要重新识别的人
+
+        参数:
+        frame (np.ndarray): BGR(A) 图像
+        ids (array-like): 每个人的 id，长度 N
+        head_boxes_2d (np.ndarray): (N, 4, 2) 头部 2D 框
+        scale (list[float]): 相机分辨率到 frame 分辨率的缩放
+        now (float): 当前时间，默认为 time.time()
+
+        返回值:
+        np.ndarray: (N,) bool，True 表示该人的缓存缺失、过期或外观已变化
+        """
+        now = time.time() if now is None else now
+        rects, valid = head_crop_rects(head_boxes_2d, frame.shape, scale)
+        stale = np.zeros(len(rects), dtype=bool)
+        with self.lock:
+            for i in np.flatnonzero(valid):
+                person_id = int(ids[i])
+                if person_id in self.pending and now - self.pending[person_id][1] < self.pending_timeout:
+                    continue
+                x0, y0, x1, y1 = rects[i]
+                signature = appearance_hash(frame[y0:y1, x0:x1], self.hash_size)
+                entry = self.entries.get(person_id)
+                if entry is None:
+                    self.misses += 1
+                elif now - entry["time"] > self.ttl:
+                    self.expired += 1
+                elif hamming_distance(signature, entry["hash"]) > self.hash_threshold:
+                    self.invalidated += 1
+                else:
+                    self.hits += 1
+                    continue
+                stale[i] = True
+                self.pending[person_id] = (signature, now)
+        return stale
+
+    def update(self, ids, expressions_by_id, now=None):
+        """
+        写入一次识别的结果。提交了但没检测到人脸的 id 也记为空结果，直到过期前不会重复请求
+
+        参数:
+        ids (array-like): 这次提交识别的 id
+        expressions_by_id (dict): id -> 表情字典
+        now (float): 结果时间，默认为 time.time()
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            for person_id in ids:
+                person_id = int(person_id)
+                signature, _ = self.pending.pop(person_id, (0, now))
+                self.entries[person_id] = {
+                    "expressions": expressions_by_id.get(person_id, {}),
+                    "hash": signature,
+                    "time": now,
+                }
+
+    def get(self, ids):
+        """
+        返回值:
+        dict: id -> 表情字典，只包含有缓存且检测到人脸的人
+        """
+        with self.lock:
+            out = {}
+            for person_id in ids:
+                entry = self.entries.get(int(person_id))
+                if entry is not None and entry["expressions"]:
+                    out[int(person_id)] = entry["expressions"]
+            return out
+
+    def evict(self, active_ids):
+        """
+        删除已经离开画面的人的缓存
+        """
+        active = set(int(person_id) for person_id in active_ids)
+        with self.lock:
+            for person_id in list(self.entries):
+                if person_id not in active:
+                    del self.entries[person_id]
+            for person_id in list(self.pending):
+                if person_id not in active:
+                    del self.pending[person_id]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "pending": len(self.pending),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "invalidated": self.invalidated,
+            }
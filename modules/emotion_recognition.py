@@ -1,85 +1,284 @@
 import time
 import numpy as np
 import cv2
-import os
 import threading
-from google.cloud import vision
-from google.oauth2 import service_account
-
-import pyzed.sl as sl
 from collections import deque
-import socket
-
-# 配置代理（如果需要）
-os.environ['http_proxy'] = 'http://127.0.0.1:52031'
-os.environ['https_proxy'] = 'http://127.0.0.1:52031'
-
-# Google Cloud Vision API 配置
-credentials = service_account.Credentials.from_service_account_file(
-    './linear-arcadia-428108-u4-77ca8a070ab6.json',
-    scopes=['https://www.googleapis.com/auth/cloud-platform']
-)
-client = vision.ImageAnnotatorClient(credentials=credentials)
-
-def likelihood_to_number(likelihood):
-    return {
-        vision.Likelihood.UNKNOWN: 0,
-        vision.Likelihood.VERY_UNLIKELY: 1,
-        vision.Likelihood.UNLIKELY: 2,
-        vision.Likelihood.POSSIBLE: 3,
-        vision.Likelihood.LIKELY: 4,
-        vision.Likelihood.VERY_LIKELY: 5
-    }[likelihood]
-
-def detect_face_expressions_from_frame(frame, callback):
-    _, encoded_image = cv2.imencode('.jpg', frame)
-    content = encoded_image.tobytes()
-    vision_image = vision.Image(content=content)
-    response = client.face_detection(image=vision_image)
-    faces = response.face_annotations
-    results = []
+
+from modules.pipeline import LatestQueue
+from modules.emotion_backends import BoundingPoly, Vertex, create_backend
+
+def summarize_expressions(results):
+    """
+    计算所有人脸的平均表情，以及戴头饰可能性最大的人的表情
+
+    参数:
+    results (list): [(bounding_poly, expressions), ...]
+
+    返回值:
+    tuple: (expression_averages, expression_on_headwearer)
+    """
     expression_sums = {"Joy": 0, "Sorrow": 0, "Anger": 0, "Surprise": 0}
     max_headwear_likelihood = 0
     expression_on_headwearer = {}
 
-    for face in faces:
-        expressions = {
-            "Joy": likelihood_to_number(face.joy_likelihood),
-            "Sorrow": likelihood_to_number(face.sorrow_likelihood),
-            "Anger": likelihood_to_number(face.anger_likelihood),
-            "Surprise": likelihood_to_number(face.surprise_likelihood),
-            "Headwear": likelihood_to_number(face.headwear_likelihood)
-                }
-        results.append((face.bounding_poly, expressions))
+    for _, expressions in results:
         for key in expression_sums:
             expression_sums[key] += expressions[key]
-        
+
         # 找到 headwearLikelihood 最大且大于 2 的人
-        if face.headwear_likelihood > max_headwear_likelihood and face.headwear_likelihood >= 2:
-            max_headwear_likelihood = face.headwear_likelihood
+        if expressions["Headwear"] > max_headwear_likelihood and expressions["Headwear"] >= 2:
+            max_headwear_likelihood = expressions["Headwear"]
             expression_on_headwearer = expressions
 
-    if faces:
-        expression_averages = {key: (value / len(faces)) for key, value in expression_sums.items()}
+    if results:
+        expression_averages = {key: (value / len(results)) for key, value in expression_sums.items()}
     else:
         expression_averages = {key: 1 for key in expression_sums} #revised
-    
+    return expression_averages, expression_on_headwearer
+
+def detect_face_expressions_from_frame(frame, callback, backend):
+    results = [(bounding_poly, expressions) for bounding_poly, expressions, _ in backend.detect(frame)]
+    expression_averages, expression_on_headwearer = summarize_expressions(results)
     callback(results, expression_averages, expression_on_headwearer)
 
-def async_detect_and_update(frame, expressions_list, expression_averages, expression_on_headwearer):
-    def callback(results, averages, headwearer_expression):
-        expressions_list.clear()
-        expressions_list.extend(results)
-        
-        expression_averages.clear()
-        expression_averages.update(averages)
-        
-        expression_on_headwearer.clear()
-        expression_on_headwearer.update(headwearer_expression)
-        # print("Averages: ", expression_averages)
-        # print("Headwearer Expressions: ", expression_on_headwearer)
-
-    detect_face_expressions_from_frame(frame, callback)
+def head_crop_rects(head_boxes_2d, image_shape, scale=(1.0, 1.0), padding=0.3):
+    """
+    由 ZED 的 head_bounding_box_2d 计算加边距后的头部裁剪区域
+
+    参数:
+    head_boxes_2d (np.ndarray): (N, 4, 2)，相机分辨率下的像素坐标，无效时为 -1 或 NaN
+    image_shape (tuple): 待裁剪图像的形状
+    scale (list[float]): 相机分辨率到图像分辨率的缩放 (即 image_scale)
+    padding (float): 每边外扩的比例
+
+    返回值:
+    tuple: (rects (N, 4) int32 [x0, y0, x1, y1], valid (N,) bool)
+    """
+    boxes = np.asarray(head_boxes_2d, dtype=np.float32).reshape(-1, 4, 2)
+    valid = np.isfinite(boxes).all(axis=(1, 2)) & (boxes >= 0).all(axis=(1, 2))
+    boxes = np.where(valid[:, None, None], boxes, 0) * np.asarray(scale, dtype=np.float32)
+
+    mins = boxes.min(axis=1)
+    maxs = boxes.max(axis=1)
+    pad = (maxs - mins) * padding
+    height, width = image_shape[:2]
+    mins = np.clip(mins - pad, 0, [width, height])
+    maxs = np.clip(maxs + pad, 0, [width, height])
+    rects = np.concatenate([mins, maxs], axis=1).astype(np.int32)
+    # 太小的头部 (被截断或很远) 识别不出表情，直接跳过
+    valid &= (rects[:, 2] - rects[:, 0] >= 8) & (rects[:, 3] - rects[:, 1] >= 8)
+    return rects, valid
+
+def build_head_mosaic(frame, rects, tile_size=160):
+    """
+    把多个头部区域缩放到 tile_size 大小后拼成一张紧凑的网格图
+
+    参数:
+    frame (np.ndarray): BGR(A) 图像
+    rects (np.ndarray): (M, 4) 裁剪区域
+    tile_size (int): 每个格子的边长
+
+    返回值:
+    tuple: (mosaic (np.ndarray, BGR), tiles [(x_offset, y_offset, scale), ...])
+    """
+    cols = int(np.ceil(np.sqrt(len(rects))))
+    rows = int(np.ceil(len(rects) / cols))
+    mosaic = np.zeros((rows * tile_size, cols * tile_size, 3), dtype=np.uint8)
+    tiles = []
+    for i, (x0, y0, x1, y1) in enumerate(rects):
+        factor = tile_size / float(max(x1 - x0, y1 - y0))
+        tile_w = min(tile_size, max(1, int(round((x1 - x0) * factor))))
+        tile_h = min(tile_size, max(1, int(round((y1 - y0) * factor))))
+        interpolation = cv2.INTER_AREA if factor < 1 else cv2.INTER_LINEAR
+        crop = cv2.resize(frame[y0:y1, x0:x1, :3], (tile_w, tile_h), interpolation=interpolation)
+        row, col = divmod(i, cols)
+        mosaic[row * tile_size:row * tile_size + tile_h, col * tile_size:col * tile_size + tile_w] = crop
+        tiles.append((col * tile_size, row * tile_size, factor))
+    return mosaic, tiles
+
+def detect_face_expressions_from_heads(frame, ids, head_boxes_2d, callback, backend, scale=(1.0, 1.0), tile_size=160):
+    """
+    只把各人的头部区域拼成一张小图上传，再把识别到的人脸对应回人的 id
+
+    参数:
+    frame (np.ndarray): BGR(A) 图像
+    ids (array-like): 每个人的 id，长度 N
+    head_boxes_2d (np.ndarray): (N, 4, 2) 头部 2D 框
+    callback (function): callback(results, expression_averages, expression_on_headwearer, expressions_by_id)
+    backend (EmotionBackend): 表情识别后端
+    scale (list[float]): 相机分辨率到 frame 分辨率的缩放
+    tile_size (int): 拼图中每个格子的边长
+    """
+    rects, valid = head_crop_rects(head_boxes_2d, frame.shape, scale)
+    ids = np.asarray(ids)[valid]
+    rects = rects[valid]
+    if not len(rects):
+        expression_averages, expression_on_headwearer = summarize_expressions([])
+        callback([], expression_averages, expression_on_headwearer, {})
+        return
+
+    mosaic, tiles = build_head_mosaic(frame, rects, tile_size)
+    faces = backend.detect(mosaic, tile_size)
+
+    cols = mosaic.shape[1] // tile_size
+    results = []
+    expressions_by_id = {}
+    best_confidence = {}
+    for face_poly, expressions, confidence in faces:
+        xs = [vertex.x for vertex in face_poly.vertices]
+        ys = [vertex.y for vertex in face_poly.vertices]
+        # 人脸中心落在哪个格子，就属于哪个人
+        index = int(np.mean(ys) // tile_size) * cols + int(np.mean(xs) // tile_size)
+        if index >= len(tiles):
+            continue
+        x_offset, y_offset, factor = tiles[index]
+        x0, y0 = rects[index][:2]
+        bounding_poly = BoundingPoly([Vertex(int(x0 + (x - x_offset) / factor), int(y0 + (y - y_offset) / factor))
+                                      for x, y in zip(xs, ys)])
+        results.append((bounding_poly, expressions))
+
+        # 同一个头部区域里检测到多张脸时，保留检测置信度最高的
+        body_id = int(ids[index])
+        if confidence > best_confidence.get(body_id, -1):
+            best_confidence[body_id] = confidence
+            expressions_by_id[body_id] = expressions
+
+    expression_averages, expression_on_headwearer = summarize_expressions(results)
+    callback(results, expression_averages, expression_on_headwearer, expressions_by_id)
+
+class EmotionService:
+    """
+    固定数量的表情识别工作线程 + 单槽 "最新帧" 信箱。
+    识别较慢时新帧直接覆盖信箱里还没处理的旧帧；每个结果带有帧时间戳，比当前结果更旧的响应会被丢弃。
+    """
+    def __init__(self, backend=None, workers=1, on_result=None):
+        """
+        参数:
+        backend (EmotionBackend): 表情识别后端，默认为 Google Vision
+        workers (int): 工作线程数
+        on_result (function): 可选，头部裁剪模式下每次识别完成时调用 on_result(ids, expressions_by_id)，
+                              即使结果因为乱序被丢弃也会调用 (例如用来更新 EmotionCache)
+        """
+        self.backend = backend if backend is not None else create_backend("google")
+        self.on_result = on_result
+        self.mailbox = LatestQueue(maxsize=1)
+        self.lock = threading.Lock()
+        self.running = True
+
+        self.expressions_list = []
+        self.expression_averages = {}
+        self.expression_on_headwearer = {}
+        self.expressions_by_id = {}
+        self.result_timestamp = 0.0
+
+        self.submitted = 0
+        self.completed = 0
+        self.stale = 0
+        self.errors = 0
+        self.last_error = None
+        self.latencies = deque(maxlen=100)
+        self.in_flight = 0
+
+        self.threads = [threading.Thread(target=self._worker, name="emotion-%d" % i, daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, frame, timestamp=None, heads=None):
+        """
+        把一帧放进信箱，立即返回
+
+        参数:
+        frame (np.ndarray): BGR(A) 图像
+        timestamp (float): 帧的采集时间，默认为当前时间
+        heads (tuple): 可选，(ids, head_bounding_box_2d, image_scale)；给出时只上传头部裁剪拼图
+        """
+        with self.lock:
+            self.submitted += 1
+        self.mailbox.put((time.time() if timestamp is None else timestamp, frame, heads))
+
+    def _worker(self):
+        while self.running:
+            item = self.mailbox.get(timeout=0.1)
+            if item is None:
+                continue
+            timestamp, frame, heads = item
+            with self.lock:
+                self.in_flight += 1
+            start = time.time()
+
+            def callback(results, averages, headwearer_expression, expressions_by_id=None):
+                if self.on_result is not None and heads is not None:
+                    self.on_result(heads[0], expressions_by_id or {})
+                with self.lock:
+                    self.completed += 1
+                    self.latencies.append(time.time() - start)
+                    # 多个 worker 时响应可能乱序返回，旧帧的结果不能覆盖新帧的结果
+                    if timestamp <= self.result_timestamp:
+                        self.stale += 1
+                        return
+                    self.result_timestamp = timestamp
+                    self.expressions_list = results
+                    self.expression_averages = averages
+                    self.expression_on_headwearer = headwearer_expression
+                    self.expressions_by_id = expressions_by_id or {}
+
+            try:
+                if heads is None:
+                    detect_face_expressions_from_frame(frame, callback, self.backend)
+                else:
+                    ids, head_boxes_2d, scale = heads
+                    detect_face_expressions_from_heads(frame, ids, head_boxes_2d, callback, self.backend, scale)
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                    self.last_error = repr(e)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+
+    def latest(self):
+        """
+        返回值:
+        tuple: (expressions_list, expression_averages, expression_on_headwearer, 结果对应的帧时间戳)
+        """
+        with self.lock:
+            return self.expressions_list, self.expression_averages, self.expression_on_headwearer, self.result_timestamp
+
+    def latest_by_id(self):
+        """
+        返回值:
+        dict: 人的 id -> 表情字典 (只有头部裁剪模式下才有)
+        """
+        with self.lock:
+            return self.expressions_by_id
+
+    def stats(self):
+        """
+        返回值:
+        dict: 信箱深度、正在处理数、提交 / 完成 / 被覆盖 / 过期 / 出错次数，以及延迟 (秒)
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                "queue_depth": len(self.mailbox),
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "coalesced": self.mailbox.dropped,
+                "completed": self.completed,
+                "stale": self.stale,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "latency_last": self.latencies[-1] if latencies else None,
+                "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+                "latency_max": latencies[-1] if latencies else None,
+            }
+
+    def stop(self, timeout=2.0):
+        self.running = False
+        self.mailbox.close()
+        for thread in self.threads:
+            thread.join(timeout)
 
 def draw_expression_on_frame(frame, bounding_poly, expression_dict, show_labels):
     vertices = [(vertex.x, vertex.y) for vertex in bounding_poly.vertices]
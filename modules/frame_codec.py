@@ -0,0 +1,350 @@
+import struct
+import numpy as np
+
+# 骨骼帧二进制格式 (little-endian)，替代逐个 float 转字符串的文本格式
+#
+#   头部 (24 bytes):
+#     magic          4s   b'MBMR'
+#     version        B    FRAME_VERSION
+#     flags          B    bit0 = 带表情数据块，bit1 = 关键帧 (包含画面中所有人；
+#                         否则只包含变化超过阈值的人，接收端应按 id 合并到上一帧)
+#     body_count     H    人数 N
+#     keypoint_count H    每人关键点数 K (BODY_34 为 34)
+#     reserved       H
+#     sequence       I    帧序号，用于在接收端发现丢包 / 乱序
+#     timestamp_ns   Q    ZED 时间戳 (ns)
+#
+#   ids            int32[N]
+#   keypoints      float32[N, K, 3]   (NaN 已替换为 0，与原文本格式一致)
+#
+#   表情块 (flags & FLAG_EXPRESSIONS):
+#     face_count     H
+#     reserved       H
+#     face_ids       int32[face_count]   表情所属的人的 id；整帧识别时人脸没有对应到人，
+#                                        按检测顺序记为 -1, -2, ...
+#     expressions    float32[face_count, len(EXPRESSION_KEYS)]
+#
+# 行为状态帧 (magic b'MBST') 使用相同的头部，keypoint_count 字段为状态数 S，
+# 数据块为 ids int32[N] + states float32[N, S] (列顺序见 behavior_state.STATE_NAMES，NaN 表示无法计算)
+#
+# 群体帧 (magic b'MBGP') 也使用相同的头部，keypoint_count 字段为 1，
+# 数据块为 ids int32[N] + group_ids int32[N] (social_groups.GroupTracker 的稳定群体 id，不属于任何群体时为 -1)
+
+FRAME_MAGIC = b'MBMR'
+STATE_MAGIC = b'MBST'
+GROUP_MAGIC = b'MBGP'
+FRAME_VERSION = 2
+FLAG_EXPRESSIONS = 0x01
+FLAG_KEYFRAME = 0x02
+
+EXPRESSION_KEYS = ("Joy", "Sorrow", "Anger", "Surprise", "Headwear")
+
+_HEADER = struct.Struct('<4sBBHHHIQ')
+_FACE_COUNT = struct.Struct('<HH')
+HEADER_SIZE = _HEADER.size
+
+
+def encode_frame(ids, keypoints, timestamp_ns, sequence, expressions=None, keyframe=True):
+    """
+    将一帧骨骼数据编码为二进制帧
+
+    参数:
+    ids (array-like): 每个人的 id，长度 N
+    keypoints (np.ndarray): 关键点数组，形状 (N, K, 3)
+    timestamp_ns (int): 帧时间戳 (ns)
+    sequence (int): 帧序号
+    expressions (list): 可选，[(person_id, expression_dict), ...]
+    keyframe (bool): 是否包含画面中的所有人
+
+    返回值:
+    bytes: 编码后的数据帧
+    """
+    ids = np.asarray(ids, dtype='<i4')
+    keypoints = np.asarray(keypoints, dtype='<f4')
+    if keypoints.ndim != 3 or keypoints.shape[2] != 3:
+        keypoints = keypoints.reshape(len(ids), -1, 3)
+    body_count, keypoint_count = keypoints.shape[0], keypoints.shape[1]
+    if body_count != len(ids):
+        raise ValueError("ids and keypoints disagree on body count: %d != %d" % (len(ids), body_count))
+
+    flags = FLAG_EXPRESSIONS if expressions is not None else 0
+    if keyframe:
+        flags |= FLAG_KEYFRAME
+    parts = [
+        _HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, body_count, keypoint_count, 0,
+                     sequence & 0xFFFFFFFF, int(timestamp_ns)),
+        ids.tobytes(),
+        np.nan_to_num(keypoints, nan=0.0).tobytes(),
+    ]
+    if expressions is not None:
+        face_ids = np.array([person_id for person_id, _ in expressions], dtype='<i4')
+        table = expression_table(expressions).astype('<f4')
+        parts.append(_FACE_COUNT.pack(len(expressions), 0))
+        parts.append(face_ids.tobytes())
+        parts.append(table.tobytes())
+    return b''.join(parts)
+
+
+def expression_table(expressions):
+    """
+    参数:
+    expressions (list): [(person_id, expression_dict), ...]
+
+    返回值:
+    np.ndarray: (F, len(EXPRESSION_KEYS)) float32，列顺序为 EXPRESSION_KEYS，缺少的表情记为 0
+    """
+    return np.array([[expression_dict.get(key, 0) for key in EXPRESSION_KEYS]
+                     for _, expression_dict in expressions], dtype=np.float32).reshape(-1, len(EXPRESSION_KEYS))
+
+
+def encode_text(ids, keypoints):
+    """
+    旧的文本格式 ("Person <id>:" 后每行一个关键点的 x y z)，供还在解析文本的 Grasshopper 定义使用
+
+    参数:
+    ids (array-like): 每个人的 id，长度 N
+    keypoints (np.ndarray): (N, K, 3)
+
+    返回值:
+    str: 文本数据
+    """
+    text_data = ""
+    for person_id, keypoint_data in zip(ids, keypoints):
+        reshaped_array = np.nan_to_num(keypoint_data, nan=0)
+        person_data = f"Person {person_id}:\n"
+        for row in reshaped_array:
+            person_data += " ".join([str(elem) for elem in row]) + "\n"
+        text_data += person_data + "\n"
+    return text_data
+
+
+# sl.Bodies -> JSON 结构 (--replay 读取的 .json / .jsonl 和 sample json.json 都是这种格式)。
+# 逐个属性复制，很慢；实时路径用 BodyArrays.body_dicts()，这里留作格式参考和基准对比
+def addIntoOutput(out, identifier, tab):
+    out[identifier] = []
+    for element in tab:
+        out[identifier].append(element)
+    return out
+
+
+def serializeBodyData(body_data):
+    """Serialize BodyData into a JSON like structure"""
+    out = {}
+    out["id"] = body_data.id
+    out["unique_object_id"] = str(body_data.unique_object_id)
+    out["tracking_state"] = str(body_data.tracking_state)
+    out["action_state"] = str(body_data.action_state)
+    addIntoOutput(out, "position", body_data.position)
+    addIntoOutput(out, "velocity", body_data.velocity)
+    addIntoOutput(out, "bounding_box_2d", body_data.bounding_box_2d)
+    out["confidence"] = body_data.confidence
+    addIntoOutput(out, "bounding_box", body_data.bounding_box)
+    addIntoOutput(out, "dimensions", body_data.dimensions)
+    addIntoOutput(out, "keypoint_2d", body_data.keypoint_2d)
+    addIntoOutput(out, "keypoint", body_data.keypoint)
+    addIntoOutput(out, "keypoint_cov", body_data.keypoints_covariance)
+    addIntoOutput(out, "head_bounding_box_2d", body_data.head_bounding_box_2d)
+    addIntoOutput(out, "head_bounding_box", body_data.head_bounding_box)
+    addIntoOutput(out, "head_position", body_data.head_position)
+    addIntoOutput(out, "keypoint_confidence", body_data.keypoint_confidence)
+    addIntoOutput(out, "local_position_per_joint", body_data.local_position_per_joint)
+    addIntoOutput(out, "local_orientation_per_joint", body_data.local_orientation_per_joint)
+    addIntoOutput(out, "global_root_orientation", body_data.global_root_orientation)
+    return out
+
+
+def serializeBodies(bodies):
+    """Serialize Bodies objects into a JSON like structure"""
+    out = {}
+    out["is_new"] = bodies.is_new
+    out["is_tracked"] = bodies.is_tracked
+    out["timestamp"] = bodies.timestamp.data_ns
+    out["body_list"] = []
+    for sk in bodies.body_list:
+        out["body_list"].append(serializeBodyData(sk))
+    return out
+
+
+def encode_states(ids, states, timestamp_ns, sequence, keyframe=True):
+    """
+    将一帧的行为状态向量编码为二进制帧
+
+    参数:
+    ids (array-like): 每个人的 id，长度 N
+    states (np.ndarray): (N, S) 状态，取值 0–1
+    timestamp_ns (int): 帧时间戳 (ns)
+    sequence (int): 帧序号
+    keyframe (bool): 是否包含画面中的所有人
+
+    返回值:
+    bytes: 编码后的数据帧
+    """
+    ids = np.asarray(ids, dtype='<i4')
+    states = np.asarray(states, dtype='<f4').reshape(len(ids), -1)
+    return b''.join([
+        _HEADER.pack(STATE_MAGIC, FRAME_VERSION, FLAG_KEYFRAME if keyframe else 0, states.shape[0], states.shape[1], 0,
+                     sequence & 0xFFFFFFFF, int(timestamp_ns)),
+        ids.tobytes(),
+        states.tobytes(),
+    ])
+
+
+def encode_groups(ids, group_ids, timestamp_ns, sequence, keyframe=True):
+    """
+    将一帧的对话群体编码为二进制帧
+
+    参数:
+    ids (array-like): 每个人的 id，长度 N
+    group_ids (array-like): 每个人所属的群体 id，-1 表示不属于任何群体
+    timestamp_ns (int): 帧时间戳 (ns)
+    sequence (int): 帧序号
+    keyframe (bool): 是否包含画面中的所有人
+
+    返回值:
+    bytes: 编码后的数据帧
+    """
+    ids = np.asarray(ids, dtype='<i4')
+    group_ids = np.asarray(group_ids, dtype='<i4').reshape(len(ids))
+    return b''.join([
+        _HEADER.pack(GROUP_MAGIC, FRAME_VERSION, FLAG_KEYFRAME if keyframe else 0, len(ids), 1, 0,
+                     sequence & 0xFFFFFFFF, int(timestamp_ns)),
+        ids.tobytes(),
+        group_ids.tobytes(),
+    ])
+
+
+def decode_frame(data):
+    """
+    解码二进制帧 (NumPy 版本)
+
+    参数:
+    data (bytes): 收到的 UDP 数据
+
+    返回值:
+    dict: version, sequence, timestamp_ns, keyframe, ids (N,)，
+          骨骼帧为 keypoints (N, K, 3)、expressions (F, 5) 和 face_ids (F,) (没有表情块时为 None)，
+          状态帧为 states (N, S)，群体帧为 group_ids (N,)
+    """
+    magic, version, flags, body_count, keypoint_count, _, sequence, timestamp_ns = _HEADER.unpack_from(data, 0)
+    if magic not in (FRAME_MAGIC, STATE_MAGIC, GROUP_MAGIC):
+        raise ValueError("not a skeleton frame (bad magic %r)" % magic)
+    if version != FRAME_VERSION:
+        raise ValueError("unsupported frame version %d" % version)
+
+    offset = HEADER_SIZE
+    ids = np.frombuffer(data, dtype='<i4', count=body_count, offset=offset)
+    offset += ids.nbytes
+    if magic == STATE_MAGIC:
+        states = np.frombuffer(data, dtype='<f4', count=body_count * keypoint_count, offset=offset)
+        return {
+            "version": version,
+            "sequence": sequence,
+            "timestamp_ns": timestamp_ns,
+            "keyframe": bool(flags & FLAG_KEYFRAME),
+            "ids": ids,
+            "states": states.reshape(body_count, keypoint_count),
+        }
+    if magic == GROUP_MAGIC:
+        return {
+            "version": version,
+            "sequence": sequence,
+            "timestamp_ns": timestamp_ns,
+            "keyframe": bool(flags & FLAG_KEYFRAME),
+            "ids": ids,
+            "group_ids": np.frombuffer(data, dtype='<i4', count=body_count, offset=offset),
+        }
+    keypoints = np.frombuffer(data, dtype='<f4', count=body_count * keypoint_count * 3, offset=offset)
+    keypoints = keypoints.reshape(body_count, keypoint_count, 3)
+    offset += keypoints.nbytes
+
+    expressions = face_ids = None
+    if flags & FLAG_EXPRESSIONS:
+        face_count, _ = _FACE_COUNT.unpack_from(data, offset)
+        offset += _FACE_COUNT.size
+        face_ids = np.frombuffer(data, dtype='<i4', count=face_count, offset=offset)
+        offset += face_ids.nbytes
+        expressions = np.frombuffer(data, dtype='<f4', count=face_count * len(EXPRESSION_KEYS), offset=offset)
+        expressions = expressions.reshape(face_count, len(EXPRESSION_KEYS))
+
+    return {
+        "version": version,
+        "sequence": sequence,
+        "timestamp_ns": timestamp_ns,
+        "keyframe": bool(flags & FLAG_KEYFRAME),
+        "ids": ids,
+        "keypoints": keypoints,
+        "expressions": expressions,
+        "face_ids": face_ids,
+    }
+
+
+def decode_frame_py(data):
+    """
+    解码二进制帧 (纯 struct 版本，不依赖 NumPy，可直接放进 Grasshopper 的 GhPython 组件)
+
+    参数:
+    data (bytes): 收到的 UDP 数据
+
+    返回值:
+    dict: 与 decode_frame 相同的键，keypoints 为 {id: [[x, y, z], ...]}，
+          expressions 为 {face_id: {"Joy": .., ...}} 或 None，states 为 {id: [s0, s1, ...]}，
+          group_ids 为 {id: group_id}
+    """
+    magic, version, flags, body_count, keypoint_count, _, sequence, timestamp_ns = _HEADER.unpack_from(data, 0)
+    if magic not in (FRAME_MAGIC, STATE_MAGIC, GROUP_MAGIC) or version != FRAME_VERSION:
+        raise ValueError("not a version %d skeleton frame" % FRAME_VERSION)
+
+    offset = HEADER_SIZE
+    ids = struct.unpack_from('<%di' % body_count, data, offset)
+    offset += 4 * body_count
+    if magic == STATE_MAGIC:
+        states = {}
+        for person_id in ids:
+            states[person_id] = list(struct.unpack_from('<%df' % keypoint_count, data, offset))
+            offset += 4 * keypoint_count
+        return {
+            "version": version,
+            "sequence": sequence,
+            "timestamp_ns": timestamp_ns,
+            "keyframe": bool(flags & FLAG_KEYFRAME),
+            "ids": list(ids),
+            "states": states,
+        }
+    if magic == GROUP_MAGIC:
+        return {
+            "version": version,
+            "sequence": sequence,
+            "timestamp_ns": timestamp_ns,
+            "keyframe": bool(flags & FLAG_KEYFRAME),
+            "ids": list(ids),
+            "group_ids": dict(zip(ids, struct.unpack_from('<%di' % body_count, data, offset))),
+        }
+    values_per_body = keypoint_count * 3
+    keypoints = {}
+    for person_id in ids:
+        values = struct.unpack_from('<%df' % values_per_body, data, offset)
+        offset += 4 * values_per_body
+        keypoints[person_id] = [list(values[i:i + 3]) for i in range(0, values_per_body, 3)]
+
+    expressions = face_ids = None
+    if flags & FLAG_EXPRESSIONS:
+        face_count, _ = _FACE_COUNT.unpack_from(data, offset)
+        offset += _FACE_COUNT.size
+        face_ids = struct.unpack_from('<%di' % face_count, data, offset)
+        offset += 4 * face_count
+        expressions = {}
+        for face_id in face_ids:
+            values = struct.unpack_from('<%df' % len(EXPRESSION_KEYS), data, offset)
+            offset += 4 * len(EXPRESSION_KEYS)
+            expressions[face_id] = dict(zip(EXPRESSION_KEYS, values))
+
+    return {
+        "version": version,
+        "sequence": sequence,
+        "timestamp_ns": timestamp_ns,
+        "keyframe": bool(flags & FLAG_KEYFRAME),
+        "ids": list(ids),
+        "keypoints": keypoints,
+        "expressions": expressions,
+        "face_ids": list(face_ids) if face_ids is not None else None,
+    }
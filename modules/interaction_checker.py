@@ -60,74 +60,146 @@ def extract_person_data(person):
 
     return person_id, person_position, person_global_root_orientation, person_normal_vector, person_head_bounding_box, person_head_position, person_head_normal_vector
 
+def quaternions_to_axes(quaternions):
+    """
+    批量从四元数中提取旋转轴（法向量）
+
+    参数:
+    quaternions (np.ndarray): (N, 4) 四元数 [x, y, z, w]
+
+    返回值:
+    np.ndarray: (N, 3) 单位旋转轴，四元数虚部为 0 时为 [0, 0, 0]
+    """
+    xyz = np.asarray(quaternions, dtype=np.float64).reshape(-1, 4)[:, :3]
+    norm = np.linalg.norm(xyz, axis=1, keepdims=True)
+    return np.divide(xyz, norm, out=np.zeros_like(xyz), where=norm > 0)
+
+def head_vectors_from_bboxes(head_bounding_boxes):
+    """
+    批量从头部 bounding box 计算单位头部向量 (前四个角的中心 - 后四个角的中心)
+
+    参数:
+    head_bounding_boxes (np.ndarray): (N, 8, 3)
+
+    返回值:
+    np.ndarray: (N, 3)，bounding box 无效时为 NaN
+    """
+    boxes = np.asarray(head_bounding_boxes, dtype=np.float64).reshape(-1, 8, 3)
+    vectors = boxes[:, :4].mean(axis=1) - boxes[:, 4:].mean(axis=1)
+    norm = np.linalg.norm(vectors, axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return vectors / norm
+
+def pairwise_distances(points):
+    """
+    参数:
+    points (np.ndarray): (N, 3)
+
+    返回值:
+    np.ndarray: (N, N) 两两之间的欧氏距离
+    """
+    points = np.asarray(points, dtype=np.float64)
+    return np.linalg.norm(points[:, None, :] - points[None, :, :], axis=-1)
+
+def pairwise_angles(unit_vectors):
+    """
+    参数:
+    unit_vectors (np.ndarray): (N, 3) 单位向量
+
+    返回值:
+    np.ndarray: (N, N) 两两之间的夹角 (度)，向量无效 (NaN 或零向量) 时为 NaN
+    """
+    unit_vectors = np.asarray(unit_vectors, dtype=np.float64)
+    dot = unit_vectors @ unit_vectors.T
+    valid = np.linalg.norm(unit_vectors, axis=1) > 0
+    dot[~(valid[:, None] & valid[None, :])] = np.nan
+    return np.degrees(np.arccos(np.clip(dot, -1.0, 1.0)))
+
+def interaction_matrices(positions, global_root_orientations, head_positions, head_bounding_boxes,
+                         angle_threshold=120, distance_threshold=1):
+    """
+    一次性计算所有人两两之间的距离、朝向夹角和交互判断
+
+    参数:
+    positions (np.ndarray): (N, 3) 人的位置
+    global_root_orientations (np.ndarray): (N, 4) 根节点四元数
+    head_positions (np.ndarray): (N, 3) 头部位置
+    head_bounding_boxes (np.ndarray): (N, 8, 3) 头部 3D bounding box
+    angle_threshold (float): 夹角大于等于该值 (大致面对面) 视为交互
+    distance_threshold (float): 头部距离小于等于该值 (米) 视为交互
+
+    返回值:
+    dict: 各项均为 (N, N) 矩阵，对角线无意义 (交互项为 0)
+        distance / head_distance: 根节点 / 头部距离
+        root_angle / head_angle: 根节点法向量 / 头部向量的夹角 (度)
+        root_interaction: 与 check_interaction 相同的规则 (夹角 >= angle_threshold)
+        head_interaction: 与 check_interaction_using_head 相同的规则 (夹角 >= angle_threshold 或距离 <= distance_threshold)
+        score: 两种判断的平均值，0–1
+    """
+    distance = pairwise_distances(positions)
+    head_distance = pairwise_distances(head_positions)
+    root_angle = pairwise_angles(quaternions_to_axes(global_root_orientations))
+    head_angle = pairwise_angles(head_vectors_from_bboxes(head_bounding_boxes))
+
+    # NaN (朝向未知) 的比较结果为 False，即不视为交互
+    with np.errstate(invalid='ignore'):
+        root_interaction = (root_angle >= angle_threshold).astype(np.int8)
+        head_interaction = ((head_angle >= angle_threshold) | (head_distance <= distance_threshold)).astype(np.int8)
+    np.fill_diagonal(root_interaction, 0)
+    np.fill_diagonal(head_interaction, 0)
+
+    return {
+        "distance": distance,
+        "head_distance": head_distance,
+        "root_angle": root_angle,
+        "head_angle": head_angle,
+        "root_interaction": root_interaction,
+        "head_interaction": head_interaction,
+        "score": (root_interaction + head_interaction) / 2.0,
+    }
+
+def interaction_matrices_from_bodies(body_arrays, **kwargs):
+    """
+    对 BodyArrays 中的有效行计算 interaction_matrices
+    """
+    count = body_arrays.count
+    return interaction_matrices(body_arrays.positions[:count], body_arrays.global_root_orientation[:count],
+                                body_arrays.head_positions[:count], body_arrays.head_bounding_box[:count], **kwargs)
+
+def _matrices_from_person_dicts(list_x):
+    return interaction_matrices(
+        np.array([person['position'] for person in list_x], dtype=np.float64),
+        np.array([person['global_root_orientation'] for person in list_x], dtype=np.float64),
+        np.array([person['head_position'] for person in list_x], dtype=np.float64),
+        np.array([person['head_bounding_box'] for person in list_x], dtype=np.float64),
+    )
+
 def check_interaction(list_x):
-    interaction_result = None
+    """
+    根据根节点朝向判断场景中是否有人在交互
+
+    参数:
+    list_x (list): serializeBodies 的 body_list (或 BodyArrays.body_dicts())
 
-    # 检查人数
+    返回值:
+    int: 任意两人满足交互条件时为 1，否则为 0 (一个人或没有人时为 0)
+    """
     if len(list_x) <= 1:
-        interaction_result = 0
-    elif len(list_x) > 2:
-        interaction_result = 1
-    elif len(list_x) == 2:
-        # 提取第一个人的数据
-        person1_id, person1_position, person1_normal_vector, person1_global_root_orientation, person1_head_bounding_box, person1_head_position, person1_head_normal_vector = extract_person_data(list_x[0])
-        
-        # 提取第二个人的数据
-        person2_id, person2_position, person2_normal_vector, person2_global_root_orientation, person2_head_bounding_box, person2_head_position, person2_head_normal_vector = extract_person_data(list_x[1])
-        
-        # 计算距离
-        distance = np.linalg.norm(person1_position - person2_position)
-        # distance = np.linalg.norm(person1_head_position - person2_head_position)
-        
-        # 计算法向量夹角
-        dot_product = np.dot(person1_normal_vector / np.linalg.norm(person1_normal_vector), 
-                            person2_normal_vector / np.linalg.norm(person2_normal_vector))
-        angle = np.degrees(np.arccos(np.clip(dot_product, -1.0, 1.0)))
-
-        # dot_product = np.dot(person1_head_normal_vector / np.linalg.norm(person1_head_normal_vector), 
-        #                     person2_head_normal_vector / np.linalg.norm(person2_head_normal_vector))
-        # angle = np.degrees(np.arccos(np.clip(dot_product, -1.0, 1.0)))
-        print('distance:',distance,'angle:',angle)
-        # 判断条件
-        if angle < 120 : #and distance > 1:
-            interaction_result = 0
-        else:
-            interaction_result = 1
-
-    return interaction_result
+        return 0
+    matrices = _matrices_from_person_dicts(list_x)
+    return int(matrices["root_interaction"].any())
 
 def check_interaction_using_head(list_x):
-    interaction_result = None
+    """
+    根据头部向量和头部距离判断场景中是否有人在交互
+
+    参数:
+    list_x (list): serializeBodies 的 body_list (或 BodyArrays.body_dicts())
 
-    # 检查人数
+    返回值:
+    int: 任意两人满足交互条件时为 1，否则为 0 (一个人或没有人时为 0)
+    """
     if len(list_x) <= 1:
-        interaction_result = 0
-    elif len(list_x) > 2:
-        interaction_result = 1
-    elif len(list_x) == 2:
-        # 提取第一个人的数据
-        person1_id, person1_position, person1_normal_vector, person1_head_bounding_box, person1_head_position, person1_head_normal_vector = extract_person_data(list_x[0])
-        
-        # 提取第二个人的数据
-        person2_id, person2_position, person2_normal_vector, person2_head_bounding_box, person2_head_position, person2_head_normal_vector = extract_person_data(list_x[1])
-        
-        # 计算距离
-        # distance = np.linalg.norm(person1_position - person2_position)
-        distance = np.linalg.norm(person1_head_position - person2_head_position)
-        
-        # 计算法向量夹角
-        # dot_product = np.dot(person1_normal_vector / np.linalg.norm(person1_normal_vector), 
-        #                     person2_normal_vector / np.linalg.norm(person2_normal_vector))
-        # angle = np.degrees(np.arccos(np.clip(dot_product, -1.0, 1.0)))
-
-        dot_product = np.dot(person1_head_normal_vector / np.linalg.norm(person1_head_normal_vector), 
-                            person2_head_normal_vector / np.linalg.norm(person2_head_normal_vector))
-        angle = np.degrees(np.arccos(np.clip(dot_product, -1.0, 1.0)))
-        
-        # 判断条件
-        if angle < 120 and distance > 1:
-            interaction_result = 0
-        else:
-            interaction_result = 1
-
-    return interaction_result
\ No newline at end of file
+        return 0
+    matrices = _matrices_from_person_dicts(list_x)
+    return int(matrices["head_interaction"].any())
@@ -0,0 +1,154 @@
+import numpy as np
+
+
+def smoothing_factor(dt, cutoff):
+    """
+    一阶低通滤波的系数 alpha = 1 / (1 + tau / dt)，tau = 1 / (2π·cutoff)
+    """
+    tau = 1.0 / (2 * np.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class KeypointSmoother:
+    """
+    按 ZED 人的 id 对关键点做 One-Euro 滤波，所有人所有关节一次向量化计算。
+    每个 id 占用预分配数组中的一行 (滤波状态 + 固定长度的环形历史缓冲)，人离开画面后立即回收。
+    缺失的关节 (NaN) 保持 NaN，不会更新该关节的滤波状态。
+    """
+    def __init__(self, keypoint_count=34, min_cutoff=1.0, beta=0.5, d_cutoff=1.0, history=30, capacity=16):
+        """
+        参数:
+        keypoint_count (int): 每人关键点数
+        min_cutoff (float): 静止时的截止频率 (Hz)，越小越平滑、延迟越大
+        beta (float): 截止频率随速度 (m/s) 增大的系数，越大快速动作越跟手
+        d_cutoff (float): 速度估计的截止频率 (Hz)
+        history (int): 每人保留的滤波结果帧数
+        capacity (int): 初始可跟踪人数，超出时按倍数扩容
+        """
+        self.keypoint_count = keypoint_count
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.history_length = history
+        self.slots = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        shape = (capacity, self.keypoint_count, 3)
+        self.value = np.full(shape, np.nan, dtype=np.float64)
+        self.derivative = np.zeros(shape, dtype=np.float64)
+        self.last_time = np.full(capacity, np.nan, dtype=np.float64)
+        self.history = np.full((capacity, self.history_length, self.keypoint_count, 3), np.nan, dtype=np.float32)
+        self.history_head = np.zeros(capacity, dtype=np.intp)
+        self.history_count = np.zeros(capacity, dtype=np.intp)
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def _reserve(self, count):
+        if count <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < count:
+            capacity *= 2
+        old = (self.value, self.derivative, self.last_time, self.history, self.history_head, self.history_count)
+        used = self.capacity
+        self._allocate(capacity)
+        for new, previous in zip((self.value, self.derivative, self.last_time, self.history,
+                                  self.history_head, self.history_count), old):
+            new[:used] = previous
+        taken = set(self.slots.values())
+        self.free_slots = [slot for slot in range(capacity - 1, -1, -1) if slot not in taken]
+
+    def _reset(self, slot):
+        self.value[slot] = np.nan
+        self.derivative[slot] = 0
+        self.last_time[slot] = np.nan
+        self.history[slot] = np.nan
+        self.history_head[slot] = 0
+        self.history_count[slot] = 0
+
+    def evict(self, active_ids):
+        """
+        回收已经离开画面的人的缓冲
+        """
+        active = set(int(person_id) for person_id in active_ids)
+        for person_id in [person_id for person_id in self.slots if person_id not in active]:
+            slot = self.slots.pop(person_id)
+            self._reset(slot)
+            self.free_slots.append(slot)
+
+    def filter(self, ids, keypoints, timestamp):
+        """
+        对一帧所有人的关键点滤波
+
+        参数:
+        ids (array-like): 每个人的 id，长度 N
+        keypoints (np.ndarray): (N, K, 3) 原始关键点
+        timestamp (float): 帧时间 (秒)
+
+        返回值:
+        np.ndarray: (N, K, 3) float32 滤波后的关键点
+        """
+        ids = [int(person_id) for person_id in ids]
+        self.evict(ids)
+        self._reserve(len(ids))
+        for person_id in ids:
+            if person_id not in self.slots:
+                self.slots[person_id] = self.free_slots.pop()
+        if not ids:
+            return np.zeros((0, self.keypoint_count, 3), dtype=np.float32)
+
+        slots = np.array([self.slots[person_id] for person_id in ids], dtype=np.intp)
+        x = np.asarray(keypoints, dtype=np.float64)
+        previous = self.value[slots]
+        dx_previous = self.derivative[slots]
+
+        # 新出现的人 / 时间戳没有前进时，直接采用原始值
+        dt = timestamp - self.last_time[slots]
+        fresh = ~(dt > 0)
+        dt = np.where(fresh, 1.0, dt)[:, None, None]
+
+        with np.errstate(invalid='ignore'):
+            dx = (x - previous) / dt
+            alpha_d = smoothing_factor(dt, self.d_cutoff)
+            dx_hat = alpha_d * dx + (1 - alpha_d) * dx_previous
+            speed = np.linalg.norm(dx_hat, axis=-1, keepdims=True)
+            alpha = smoothing_factor(dt, self.min_cutoff + self.beta * speed)
+            x_hat = alpha * x + (1 - alpha) * previous
+
+        observed = ~np.isnan(x).any(axis=-1, keepdims=True)
+        restart = fresh[:, None, None] | np.isnan(previous).any(axis=-1, keepdims=True)
+        x_hat = np.where(restart, x, x_hat)
+        dx_hat = np.where(restart, 0.0, dx_hat)
+
+        # 缺失的关节不更新状态，输出 NaN
+        self.value[slots] = np.where(observed, x_hat, previous)
+        self.derivative[slots] = np.where(observed, dx_hat, dx_previous)
+        self.last_time[slots] = timestamp
+        out = np.where(observed, x_hat, np.nan).astype(np.float32)
+
+        heads = self.history_head[slots]
+        self.history[slots, heads] = out
+        self.history_head[slots] = (heads + 1) % self.history_length
+        self.history_count[slots] = np.minimum(self.history_count[slots] + 1, self.history_length)
+        return out
+
+    def apply(self, body_arrays):
+        """
+        就地平滑 BodyArrays 有效行的关键点，时间取 body_arrays.timestamp_ns
+        """
+        count = body_arrays.count
+        body_arrays.keypoints[:count] = self.filter(body_arrays.ids[:count], body_arrays.keypoints[:count],
+                                                    body_arrays.timestamp_ns * 1e-9)
+
+    def recent(self, person_id):
+        """
+        返回值:
+        np.ndarray: (M, K, 3) 该人最近 M 帧的滤波结果，按时间从旧到新；没有记录时为空数组
+        """
+        slot = self.slots.get(int(person_id))
+        if slot is None:
+            return np.zeros((0, self.keypoint_count, 3), dtype=np.float32)
+        count, head = self.history_count[slot], self.history_head[slot]
+        order = (np.arange(head - count, head)) % self.history_length
+        return self.history[slot, order].copy()
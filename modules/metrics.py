@@ -0,0 +1,207 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# 轻量的延迟统计：每个阶段一个 HDR 风格的直方图 (按 2 的幂分段、段内线性，相对误差 < 1%)，
+# 计数数组大小固定，记录一次只是几次整数运算加一次数组自增。
+# MetricsServer 在本机提供 HTTP 页面: /  (文本表格)、/metrics.json
+
+
+class LatencyHistogram:
+    """
+    以微秒为单位的延迟直方图。小于 2^sub_bucket_bits 微秒的值精确记录，
+    更大的值按 2 的幂分段，每段再均分为 2^(sub_bucket_bits-1) 个桶
+    """
+    def __init__(self, highest_seconds=60.0, sub_bucket_bits=7):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count // 2
+        self.highest = int(highest_seconds * 1e6)
+        self.counts = np.zeros(self._index(self.highest) + 1, dtype=np.int64)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+        self.lock = threading.Lock()
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return shift * self.half_count + (value >> shift)
+
+    def _value_at(self, index):
+        """
+        返回值:
+        float: 第 index 个桶的中点 (微秒)
+        """
+        if index < self.sub_bucket_count:
+            return float(index)
+        shift = (index - self.half_count) // self.half_count
+        mantissa = index - shift * self.half_count
+        return ((mantissa << shift) + ((mantissa + 1) << shift) - 1) / 2.0
+
+    def record(self, seconds):
+        value = min(max(int(seconds * 1e6), 0), self.highest)
+        index = self._index(value)
+        with self.lock:
+            self.counts[index] += 1
+            self.total += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentiles(self, percents=(50, 90, 99)):
+        """
+        返回值:
+        list[float]: 各百分位的延迟 (毫秒)，没有数据时为 None
+        """
+        with self.lock:
+            if not self.total:
+                return [None for _ in percents]
+            cumulative = np.cumsum(self.counts)
+            total = self.total
+        out = []
+        for percent in percents:
+            rank = max(int(np.ceil(percent / 100.0 * total)), 1)
+            index = int(np.searchsorted(cumulative, rank))
+            out.append(self._value_at(index) / 1000.0)
+        return out
+
+    def summary(self):
+        """
+        返回值:
+        dict: count, mean_ms, p50_ms, p90_ms, p99_ms, max_ms
+        """
+        p50, p90, p99 = self.percentiles((50, 90, 99))
+        with self.lock:
+            total, value_sum, value_max = self.total, self.sum, self.max
+        return {
+            "count": total,
+            "mean_ms": value_sum / total / 1000.0 if total else None,
+            "p50_ms": p50,
+            "p90_ms": p90,
+            "p99_ms": p99,
+            "max_ms": value_max / 1000.0 if total else None,
+        }
+
+    def reset(self):
+        with self.lock:
+            self.counts[:] = 0
+            self.total = self.sum = self.max = 0
+
+
+class MetricsRegistry:
+    """
+    按名字管理直方图。名字第一次出现时自动创建，顺序即显示顺序
+    """
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record(self, name, seconds):
+        self.histogram(name).record(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).record(time.perf_counter() - start)
+
+    def summary(self):
+        """
+        返回值:
+        dict: 名字 -> LatencyHistogram.summary()
+        """
+        return {name: histogram.summary() for name, histogram in list(self.histograms.items())}
+
+    def log_line(self, names=None):
+        """
+        返回值:
+        str: 例如 "grab p50 12.1 p99 20.3 ms | retrieve_bodies p50 3.0 p99 4.2 ms"
+        """
+        parts = []
+        for name, item in self.summary().items():
+            if (names is None or name in names) and item["count"]:
+                parts.append("%s p50 %.1f p99 %.1f ms" % (name, item["p50_ms"], item["p99_ms"]))
+        return " | ".join(parts)
+
+    def render_text(self):
+        lines = ["%-28s %8s %9s %9s %9s %9s %9s" % ("stage", "count", "mean ms", "p50 ms", "p90 ms", "p99 ms", "max ms")]
+        for name, item in self.summary().items():
+            if not item["count"]:
+                continue
+            lines.append("%-28s %8d %9.2f %9.2f %9.2f %9.2f %9.2f" % (
+                name, item["count"], item["mean_ms"], item["p50_ms"], item["p90_ms"], item["p99_ms"], item["max_ms"]))
+        lines.append("")
+        lines.append("uptime %.0f s" % (time.time() - self.started))
+        return "\n".join(lines) + "\n"
+
+
+def timer(metrics, name):
+    """
+    metrics 为 None 时返回空的上下文管理器，方便在可选的地方计时
+    """
+    return metrics.timer(name) if metrics is not None else nullcontext()
+
+
+class MetricsServer:
+    """
+    在后台线程中提供本机 HTTP 指标页面。extra 为可选的回调，返回的字典会并入 /metrics.json
+    """
+    def __init__(self, registry, port=9108, host='127.0.0.1', extra=None):
+        self.registry = registry
+        self.extra = extra
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/":
+                    body = server.registry.render_text().encode()
+                    content_type = "text/plain; charset=utf-8"
+                elif self.path == "/metrics.json":
+                    data = {"latency": server.registry.summary()}
+                    if server.extra is not None:
+                        data.update(server.extra())
+                    body = json.dumps(data, default=str).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-server", daemon=True)
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
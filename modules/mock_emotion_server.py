@@ -0,0 +1,78 @@
+"""
+   本地表情识别替身服务：接收 JPEG，按可配置的延迟返回假的人脸和表情。
+   用法: python -m modules.mock_emotion_server --port 8089 --latency 0.15 --jitter 0.05
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import cv2
+
+
+def fake_faces(image, tile):
+    """
+    在每个 tile×tile 格子 (头部拼图的一个格子) 的中心放一张假的人脸
+    """
+    height, width = image.shape[:2]
+    tile = min(tile, height, width)
+    faces = []
+    for row in range(height // tile):
+        for col in range(width // tile):
+            cell = image[row * tile:(row + 1) * tile, col * tile:(col + 1) * tile]
+            if not cell.any():
+                continue    # 拼图中的空格子
+            x0, y0 = col * tile + tile // 4, row * tile + tile // 4
+            faces.append({
+                "box": [x0, y0, x0 + tile // 2, y0 + tile // 2],
+                "confidence": 0.9,
+                "expressions": {"Joy": random.randint(1, 5), "Sorrow": 1, "Anger": 1,
+                                "Surprise": random.randint(1, 3), "Headwear": 1},
+            })
+    return faces
+
+
+def make_handler(latency, jitter):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            url = urlparse(self.path)
+            if url.path != "/detect":
+                self.send_error(404)
+                return
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                self.send_error(400, "body is not an image")
+                return
+            tile = int(parse_qs(url.query).get("tile", [min(image.shape[:2])])[0])
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+            body = json.dumps({"faces": fake_faces(image, tile)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8089, latency=0.15, jitter=0.0):
+    server = ThreadingHTTPServer((host, port), make_handler(latency, jitter))
+    print("[Mock emotion] listening on http://%s:%d/detect, latency %.3f s ± %.3f s" % (host, port, latency, jitter))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, help='Seconds to wait before answering each request', default=0.15)
+    parser.add_argument('--jitter', type=float, help='Uniform random +/- added to the latency', default=0.0)
+    opt = parser.parse_args()
+    serve(opt.host, opt.port, opt.latency, opt.jitter)
@@ -0,0 +1,344 @@
+import math
+import multiprocessing
+import signal
+import time
+import warnings
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from modules.body_arrays import ARRAY_NAMES, BodyArrays
+from modules.body_sources import BodySource, open_source_spec
+from modules.coordinates import transform_bodies
+
+# 多相机模式：每台相机一个进程 (grab / retrieve_bodies 不再被同一个 GIL 串行化)，
+# 提取出的 BodyArrays 通过共享内存交给主进程，主进程按各相机的位姿转换到世界坐标系，
+# 再用最近邻匹配合并被多台相机同时看到的人。
+
+# 共享内存槽的状态
+SLOT_RUNNING, SLOT_FINISHED, SLOT_FAILED = 0, 1, 2
+
+# 头部: sequence, count, timestamp_ns, state (int64) + 4×4 相机位姿 (float64)
+_HEADER_INTS = 4
+_HEADER_BYTES = _HEADER_INTS * 8 + 16 * 8
+
+
+def parse_camera_spec(spec):
+    """
+    解析 "<数据源>[@x,y,z[,yaw]]"：@ 后面是相机在世界坐标系中的初始位置 (米) 和绕 Y 轴的朝向 (度)，
+    与位置跟踪给出的相对位姿相乘后得到世界坐标
+
+    返回值:
+    tuple: (数据源字符串, 4×4 相机外参)
+    """
+    source, _, placement = spec.partition("@")
+    extrinsic = np.eye(4)
+    if placement:
+        values = [float(v) for v in placement.split(",")]
+        if len(values) not in (3, 4):
+            raise ValueError("camera placement must be x,y,z or x,y,z,yaw: %r" % spec)
+        yaw = math.radians(values[3]) if len(values) == 4 else 0.0
+        extrinsic[:3, :3] = [[math.cos(yaw), 0, math.sin(yaw)],
+                             [0, 1, 0],
+                             [-math.sin(yaw), 0, math.cos(yaw)]]
+        extrinsic[:3, 3] = values[:3]
+    return source, extrinsic
+
+
+class SharedBodySlot:
+    """
+    一台相机的共享内存槽：头部加上 BodyArrays 各字段的定长数组 (最多 capacity 人)。
+    单写者 / 单读者，用序列锁 (seqlock) 保证读到的是完整的一帧：写者写之前把 sequence 变为奇数，
+    写完再变为偶数；读者读前读后 sequence 相同且为偶数才算成功。
+    """
+    def __init__(self, capacity=32, keypoint_count=34, name=None):
+        """
+        参数:
+        capacity (int): 每帧最多的人数，超出的人被丢弃
+        keypoint_count (int): 每人关键点数
+        name (str): 为 None 时新建共享内存，否则连接到已有的 (工作进程中)
+        """
+        self.capacity = capacity
+        self.keypoint_count = keypoint_count
+        template = BodyArrays(keypoint_count, capacity)
+        layout = []
+        offset = _HEADER_BYTES
+        for field in ARRAY_NAMES:
+            array = getattr(template, field)
+            layout.append((field, array.dtype, array.shape, offset))
+            offset += -(-array.nbytes // 8) * 8     # 8 字节对齐
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=offset)
+        self.name = self.shm.name
+        buffer = self.shm.buf
+        self.header = np.ndarray((_HEADER_INTS,), dtype=np.int64, buffer=buffer)
+        self.pose = np.ndarray((4, 4), dtype=np.float64, buffer=buffer, offset=_HEADER_INTS * 8)
+        self.columns = {field: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=field_offset)
+                        for field, dtype, shape, field_offset in layout}
+        if self.owner:
+            self.header[:] = 0
+            self.pose[:] = np.eye(4)
+        self.last_sequence = 0
+
+    def write(self, body_arrays, camera_pose):
+        count = min(body_arrays.count, self.capacity)
+        self.header[0] += 1
+        for field, column in self.columns.items():
+            column[:count] = getattr(body_arrays, field)[:count]
+        self.pose[:] = camera_pose
+        self.header[1] = count
+        self.header[2] = body_arrays.timestamp_ns
+        self.header[0] += 1
+
+    def read(self, out, retries=5):
+        """
+        把最新的一帧复制到 out
+
+        返回值:
+        np.ndarray or None: 这一帧的相机位姿；没有新帧或多次重试都与写者冲突时为 None
+        """
+        for _ in range(retries):
+            sequence = int(self.header[0])
+            if sequence == self.last_sequence:
+                return None
+            if sequence % 2:
+                time.sleep(0)
+                continue
+            count = int(self.header[1])
+            out.assign(self.columns, count, int(self.header[2]))
+            pose = self.pose.copy()
+            if int(self.header[0]) == sequence:
+                self.last_sequence = sequence
+                return pose
+        return None
+
+    @property
+    def state(self):
+        return int(self.header[3])
+
+    def set_state(self, state):
+        self.header[3] = state
+
+    def close(self):
+        # 先释放 numpy 视图，否则 SharedMemory.close 会因为还有导出的缓冲而失败
+        self.header = self.pose = self.columns = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def camera_worker(spec, extrinsic, slot_name, capacity, keypoint_count, real_time, loop, stop):
+    """
+    工作进程：打开一台相机，循环读取人体数据写入共享内存槽 (不取图像)
+    """
+    # Ctrl+C 会发给整个进程组，退出统一由主进程通过 stop 控制，保证相机被正常关闭
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    slot = SharedBodySlot(capacity, keypoint_count, name=slot_name)
+    try:
+        source = open_source_spec(spec, real_time, loop)
+        body_arrays = BodyArrays(keypoint_count, capacity)
+        while not stop.is_set() and not source.finished:
+            result = source.read(body_arrays, want_image=False)
+            if result is None:
+                time.sleep(0.001)
+                continue
+            slot.write(body_arrays, extrinsic @ result[2])
+        source.close()
+        slot.set_state(SLOT_FINISHED)
+    except Exception as e:
+        print("Camera %r failed: %s" % (spec, e))
+        slot.set_state(SLOT_FAILED)
+    finally:
+        slot.close()
+
+
+def _root_positions(bodies):
+    """
+    返回值:
+    np.ndarray: (count, 3) 每人的位置，position 缺失时用有效关键点的均值
+    """
+    count = bodies.count
+    positions = bodies.positions[:count].astype(np.float64)
+    missing = ~np.isfinite(positions).all(axis=1)
+    if missing.any():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)     # 整个人都没有有效关键点时为 NaN
+            positions[missing] = np.nanmean(bodies.keypoints[:count][missing], axis=1)
+    return positions
+
+
+class BodyFusion:
+    """
+    合并多台相机在世界坐标系中的人体：按相机顺序，用根节点位置做贪心最近邻匹配 (一对一，距离小于 match_distance)。
+    合并后的关键点按关键点置信度加权平均，其他字段取置信度最高的那台相机。
+    融合后的 id 在帧间保持稳定：记住 (相机, 相机内 id) -> 融合 id
+    """
+    def __init__(self, match_distance=0.5):
+        self.match_distance = match_distance
+        self.global_ids = {}
+        self.next_id = 0
+
+    def _group(self, cameras):
+        """
+        返回值:
+        list: 每个融合后的人一个列表，元素为 (相机序号, 行号)
+        """
+        groups = []
+        centers = np.zeros((0, 3))
+        for camera_index, bodies in cameras:
+            positions = _root_positions(bodies)
+            unmatched = set(range(bodies.count))
+            if len(groups) and bodies.count:
+                distances = np.linalg.norm(positions[:, None, :] - centers[None, :, :], axis=2)
+                distances[~np.isfinite(distances)] = np.inf
+                for row, group in zip(*np.unravel_index(np.argsort(distances, axis=None), distances.shape)):
+                    if distances[row, group] > self.match_distance:
+                        break
+                    if row in unmatched and all(member[0] != camera_index for member in groups[group]):
+                        groups[group].append((camera_index, row))
+                        unmatched.discard(row)
+            for row in sorted(unmatched):
+                groups.append([(camera_index, row)])
+            if unmatched:
+                centers = np.vstack([centers, positions[sorted(unmatched)]])
+        return groups
+
+    def fuse(self, cameras, out):
+        """
+        参数:
+        cameras (list): [(相机序号, 已经在世界坐标系中的 BodyArrays), ...]
+        out (BodyArrays): 融合结果
+
+        返回值:
+        int: 融合后的人数
+        """
+        by_camera = dict(cameras)
+        groups = self._group(cameras)
+        columns = {field: [] for field in ARRAY_NAMES}
+        seen = {}
+        used = set()
+        for group in groups:
+            keys = [(camera_index, int(by_camera[camera_index].ids[row])) for camera_index, row in group]
+            known = sorted(self.global_ids[key] for key in keys if key in self.global_ids)
+            global_id = next((candidate for candidate in known if candidate not in used), None)
+            if global_id is None:
+                global_id = self.next_id
+                self.next_id += 1
+            used.add(global_id)
+            for key in keys:
+                seen[key] = global_id
+
+            confidences = [by_camera[camera_index].confidences[row] for camera_index, row in group]
+            primary_camera, primary_row = group[int(np.argmax(confidences))]
+            primary = by_camera[primary_camera]
+            for field in ARRAY_NAMES:
+                columns[field].append(getattr(primary, field)[primary_row])
+            columns["ids"][-1] = global_id
+            if len(group) > 1:
+                keypoints = np.stack([by_camera[c].keypoints[r] for c, r in group])
+                weights = np.stack([by_camera[c].keypoint_confidence[r] for c, r in group]).astype(np.float64)
+                weights = np.where(np.isfinite(keypoints).all(axis=2) & np.isfinite(weights), np.maximum(weights, 1e-3), 0.0)
+                total = weights.sum(axis=0)
+                merged = np.einsum('mk,mkd->kd', weights, np.nan_to_num(keypoints)) / np.where(total > 0, total, 1)[:, None]
+                merged[total == 0] = np.nan
+                columns["keypoints"][-1] = merged
+                columns["keypoint_confidence"][-1] = np.stack([by_camera[c].keypoint_confidence[r] for c, r in group]).max(axis=0)
+        # 只保留这一帧还能看到的人的 id 映射
+        self.global_ids = seen
+        count = len(groups)
+        timestamp_ns = max((bodies.timestamp_ns for _, bodies in cameras), default=0)
+        if count:
+            out.assign({field: np.stack(values) for field, values in columns.items()}, count, timestamp_ns)
+        else:
+            out.count = 0
+            out.timestamp_ns = timestamp_ns
+        return count
+
+
+class MultiCameraSource(BodySource):
+    """
+    多台相机组成的数据源。每台相机在自己的进程中采集，read 把各相机最新的一帧转换到世界坐标系后融合；
+    没有图像 (表情识别会被跳过)，返回的 camera_pose 为单位矩阵 (已经是世界坐标)。
+    融合按固定的节拍进行，而不是任意一台相机更新就融合一次：否则两台 30 fps 的相机会产生约 60 fps 的融合帧，
+    一半用的是另一台相机的旧数据，时间戳还可能重复 (平滑滤波器看到 dt = 0)
+    """
+    def __init__(self, specs, real_time=True, loop=False, capacity=32, match_distance=0.5, max_skew=0.2, fusion_rate=30.0):
+        """
+        参数:
+        specs (list): 每台相机一个 parse_camera_spec 格式的字符串
+        capacity (int): 每台相机每帧最多的人数
+        match_distance (float): 同一个人在不同相机中根节点的最大距离 (米)
+        max_skew (float): 比最新一帧早这么多秒以上的相机数据不参与融合
+        fusion_rate (float): 最高融合帧率 (Hz)，<= 0 时只要最新的时间戳前进就融合
+        """
+        BodySource.__init__(self)
+        self.specs = [parse_camera_spec(spec) for spec in specs]
+        self.real_time = real_time
+        self.loop = loop
+        self.capacity = capacity
+        self.max_skew_ns = int(max_skew * 1e9)
+        self.fusion = BodyFusion(match_distance)
+        self.latest = [BodyArrays(self.keypoint_count, capacity) for _ in self.specs]
+        self.has_data = [False for _ in self.specs]
+        self.period = 1.0 / fusion_rate if fusion_rate > 0 else 0.0
+        self.next_fusion_time = 0.0
+        self.last_timestamp_ns = -1
+        self.slots = []
+        self.processes = []
+
+    def open(self):
+        # spawn：子进程不继承父进程的 SDK / GL 状态
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        for spec, extrinsic in self.specs:
+            slot = SharedBodySlot(self.capacity, self.keypoint_count)
+            process = context.Process(target=camera_worker, name="camera %s" % spec, daemon=True,
+                                      args=(spec, extrinsic, slot.name, self.capacity, self.keypoint_count,
+                                            self.real_time, self.loop, self.stop_event))
+            process.start()
+            self.slots.append(slot)
+            self.processes.append(process)
+        return self
+
+    def read(self, body_arrays, want_image=False):
+        updated = False
+        for i, slot in enumerate(self.slots):
+            pose = slot.read(self.latest[i])
+            if pose is not None:
+                transform_bodies(self.latest[i], pose)
+                self.has_data[i] = True
+                updated = True
+
+        # 没有比上一个融合帧更新的数据时不输出，保证时间戳严格递增
+        newest = max((self.latest[i].timestamp_ns for i in range(len(self.slots)) if self.has_data[i]), default=-1)
+        if newest <= self.last_timestamp_ns:
+            if not updated and all(slot.state != SLOT_RUNNING or not process.is_alive()
+                                   for slot, process in zip(self.slots, self.processes)):
+                self.finished = True
+            else:
+                time.sleep(0.002)
+            return None
+        now = time.perf_counter()
+        if now < self.next_fusion_time:
+            time.sleep(min(self.next_fusion_time - now, 0.002))
+            return None
+        # 跟不上节拍时不补帧
+        self.next_fusion_time = max(self.next_fusion_time + self.period, now)
+        self.last_timestamp_ns = newest
+
+        cameras = [(i, self.latest[i]) for i in range(len(self.slots))
+                   if self.has_data[i] and newest - self.latest[i].timestamp_ns <= self.max_skew_ns]
+        self.fusion.fuse(cameras, body_arrays)
+        image = None
+        if want_image:
+            image = np.zeros((self.display_resolution[1], self.display_resolution[0], 4), dtype=np.uint8)
+        return body_arrays.body_views(), image, np.eye(4)
+
+    def close(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for slot in self.slots:
+            slot.close()
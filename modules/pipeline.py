@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import deque
+
+from modules.coordinates import FrameTransforms
+
+
+class LatestQueue:
+    """
+    有界队列，满了以后丢弃最旧的元素 (latest-frame-wins)，生产者永远不会被消费者阻塞。
+    block 为 True 时改为反压：put 等到有空位 (或队列关闭) 为止，一个元素都不丢，用于快速回放
+    """
+    def __init__(self, maxsize=1, block=False):
+        self.maxsize = maxsize
+        self.block = block
+        self.items = []
+        self.dropped = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def put(self, item):
+        with self.cond:
+            if self.block:
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.cond.wait(0.1)
+                if self.closed:
+                    return
+            elif len(self.items) >= self.maxsize:
+                self.items.pop(0)
+                self.dropped += 1
+            self.items.append(item)
+            # 生产者和消费者等待同一个条件变量，要唤醒所有等待者
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        返回值:
+        最旧的元素；超时或队列已关闭时返回 None
+        """
+        with self.cond:
+            if not self.items and not self.closed:
+                self.cond.wait(timeout)
+            if not self.items:
+                return None
+            item = self.items.pop(0)
+            if self.block:
+                self.cond.notify_all()
+            return item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class DoubleBuffer:
+    """
+    单写者、单读者的双缓冲：写者写进后台槽后交换前后台，读者只拿前台槽的最新值，双方都不会等待对方。
+    同一个值只会被读到一次，没有新值时 read 返回 None。
+    """
+    def __init__(self):
+        self.slots = [None, None]
+        self.front = 0
+        self.written = 0
+        self.read_count = 0
+        self.lock = threading.Lock()
+
+    def write(self, item):
+        back = 1 - self.front
+        self.slots[back] = item
+        with self.lock:
+            self.front = back
+            self.written += 1
+
+    def read(self):
+        with self.lock:
+            if self.read_count == self.written:
+                return None
+            self.read_count = self.written
+            return self.slots[self.front]
+
+
+class StageStats:
+    """
+    单个阶段的吞吐统计：总处理数、繁忙时间，以及最近 window 秒内的速率。
+    rate 不修改任何状态，5 秒一次的日志和 /metrics.json 同时读取也互不影响
+    """
+    def __init__(self, name, window=5.0):
+        self.name = name
+        self.count = 0
+        self.busy_time = 0.0
+        self.window = window
+        self.started = time.time()
+        self.recent = deque()       # 最近 window 秒内每个元素的完成时间
+        self.lock = threading.Lock()
+
+    def record(self, elapsed):
+        now = time.time()
+        with self.lock:
+            self.count += 1
+            self.busy_time += elapsed
+            self.recent.append(now)
+            while self.recent[0] < now - self.window:
+                self.recent.popleft()
+
+    def rate(self):
+        """
+        返回值:
+        float: 最近 window 秒内 (启动不足 window 秒时为启动以来) 每秒处理的元素数
+        """
+        now = time.time()
+        with self.lock:
+            count = sum(1 for finished in self.recent if finished >= now - self.window)
+        return count / max(min(self.window, now - self.started), 1e-6)
+
+
+class Stage:
+    """
+    流水线中的一个阶段：workers 个线程从 inbox 取元素，调用 fn，再把非 None 的结果放进所有 outputs。
+    fn 返回 None 表示没有需要往下游传递的结果。
+    inbox 为 None 时 fn 不带参数地被反复调用 (作为数据源，例如相机采集)。
+    """
+    def __init__(self, name, fn, inbox=None, outputs=(), workers=1):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outputs = list(outputs)
+        self.stats = StageStats(name)
+        self.running = threading.Event()
+        self.threads = [threading.Thread(target=self._run, name="%s-%d" % (name, i), daemon=True)
+                        for i in range(workers)]
+
+    def _run(self):
+        while self.running.is_set():
+            if self.inbox is None:
+                item = None
+            else:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    continue
+            start = time.perf_counter()
+            result = self.fn() if self.inbox is None else self.fn(item)
+            # 数据源返回 None 表示这一轮没有产生帧 (例如 grab 失败)，不计入吞吐
+            if result is None and self.inbox is None:
+                continue
+            self.stats.record(time.perf_counter() - start)
+            if result is not None:
+                for queue in self.outputs:
+                    queue.put(result)
+
+    def start(self):
+        self.running.set()
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout=2.0):
+        """
+        通知各线程退出并等待最多 timeout 秒
+
+        返回值:
+        bool: 所有线程都已退出时为 True；为 False 时线程仍在 fn 中 (例如卡在 source.read)，
+              它使用的资源不能关闭
+        """
+        self.running.clear()
+        if self.inbox is not None:
+            self.inbox.close()
+        deadline = time.time() + timeout
+        for thread in self.threads:
+            thread.join(max(deadline - time.time(), 0))
+        return not any(thread.is_alive() for thread in self.threads)
+
+
+class Pipeline:
+    """
+    按顺序启动 / 停止各阶段，并汇总吞吐量
+    """
+    def __init__(self, stages):
+        self.stages = stages
+
+    def start(self):
+        # 从下游往上游启动，保证数据源产生第一帧时消费者已就绪
+        for stage in reversed(self.stages):
+            stage.start()
+
+    def stop(self):
+        """
+        先停数据源，再停下游
+
+        返回值:
+        list: 超时后仍未退出的阶段名
+        """
+        return [stage.name for stage in self.stages if not stage.stop()]
+
+    def report(self):
+        """
+        返回值:
+        str: 例如 "capture 29.9 fps | analysis 29.7 fps (dropped 2) | publish 2.0 fps"
+        """
+        parts = []
+        for stage in self.stages:
+            text = "%s %.1f fps" % (stage.name, stage.stats.rate())
+            if stage.inbox is not None and stage.inbox.dropped:
+                text += " (dropped %d)" % stage.inbox.dropped
+            parts.append(text)
+        return " | ".join(parts)
+
+
+class Frame:
+    """
+    在各阶段之间传递的一帧数据。带有 body_list，可以像 sl.Bodies 一样交给 GLViewer.update_view。
+    """
+    def __init__(self, sequence, bodies, body_list, image=None, camera_pose=None):
+        self.sequence = sequence
+        self.bodies = bodies            # BodyArrays 快照
+        self.body_list = body_list      # sl.BodyData 列表，供 GL / OpenCV 渲染
+        self.image = image              # 左目图像 (np.ndarray)，不需要时为 None
+        self.camera_pose = camera_pose
+        self.timestamp_ns = bodies.timestamp_ns
+        self.capture_time = time.time()
+        # 各坐标系下的点，按需计算并在各阶段之间共享
+        self.transforms = FrameTransforms(bodies, camera_pose)
@@ -1,9 +1,36 @@
-import math
 import numpy as np
 
+# 肩膀夹角 (肘-肩-髋) 的关键点三元组
+# 左: hip 22, shoulder 12, elbow 13；右: hip 18, shoulder 5, elbow 6
+SHOULDER_TRIPLETS = np.array([
+    (13, 12, 22),   # 左肩
+    (6, 5, 18),     # 右肩
+])
+
+def joint_angles(keypoints, triplets):
+    """
+    批量计算三维关节角度。
+
+    参数:
+        keypoints: 关键点数组，形状 (..., K, 3)，例如 (N, 34, 3) 或 (T, N, 34, 3)。
+        triplets: 关键点索引表，形状 (J, 3)，每行 (a, b, c) 表示 b 点处 a-b 与 c-b 的夹角。
+
+    返回值:
+        angles: 形状 (..., J) 的角度 (度，0–180)，任一关键点为 NaN 或向量长度为 0 时为 NaN。
+    """
+    keypoints = np.asarray(keypoints, dtype=np.float64)
+    triplets = np.asarray(triplets)
+    a = keypoints[..., triplets[:, 0], :] - keypoints[..., triplets[:, 1], :]
+    c = keypoints[..., triplets[:, 2], :] - keypoints[..., triplets[:, 1], :]
+    norms = np.linalg.norm(a, axis=-1) * np.linalg.norm(c, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos = np.einsum('...k,...k->...', a, c) / norms
+    cos[norms == 0] = np.nan
+    return np.degrees(np.arccos(np.clip(cos, -1.0, 1.0)))
+
 def calculate_angle(landmark1, landmark2, landmark3):
     """
-    计算三个标志点之间的角度。
+    计算三个标志点之间的角度 (三维)。
     
     参数:
         landmark1: 第一个标志点，包含 x, y, z 坐标。
@@ -13,15 +40,23 @@ def calculate_angle(landmark1, landmark2, landmark3):
     返回值:
         angle: 三个标志点之间的角度。
     """
-    x1, y1, _ = landmark1
-    x2, y2, _ = landmark2
-    x3, y3, _ = landmark3
+    return float(joint_angles(np.array([landmark1, landmark2, landmark3]), [(0, 1, 2)])[0])
 
-    angle = math.degrees(math.atan2(y3 - y2, x3 - x2) - math.atan2(y1 - y2, x1 - x2))
+def classify_postures(keypoints):
+    """
+    批量判断所有人 (以及所有时间帧) 的姿势。
     
-    angle = abs(angle)
+    参数:
+        keypoints: 关键点数组，形状 (N, 34, 3) 或 (T, N, 34, 3)。
     
-    return angle
+    返回值:
+        result: 形状 (N,) 或 (T, N) 的 int8 数组，拘谨（1）或灵活（0），关键点有 NaN 时为 -1。
+    """
+    angles = joint_angles(keypoints, SHOULDER_TRIPLETS)
+    valid = ~np.isnan(angles).any(axis=-1)
+    with np.errstate(invalid='ignore'):
+        restrained = (angles < 30).all(axis=-1)
+    return np.where(valid, restrained.astype(np.int8), np.int8(-1)).astype(np.int8)
 
 def classify_posture(landmarks):
     """
@@ -33,26 +68,10 @@ def classify_posture(landmarks):
     返回值:
         result: 拘谨（1）或灵活（0），如果关键点有 NaN 则返回 None。
     """
-    # 定义肩膀和肘部的索引
-    left_hip_index, left_shoulder_index, left_elbow_index,  =  22, 12, 13
-    right_hip_index, right_shoulder_index, right_elbow_index,  = 18, 5, 6
-
-    # 检查关键点是否有 NaN 值
-    key_indices = [left_shoulder_index, left_elbow_index, left_hip_index,
-                   right_shoulder_index, right_elbow_index, right_hip_index]
-    for index in key_indices:
-        if np.any(np.isnan(landmarks[index])):
-            return None  # 如果有 NaN，返回 None 表示跳过该人的判断
-
-    # 计算肩膀夹角
-    left_shoulder_angle = calculate_angle(landmarks[left_elbow_index],landmarks[left_shoulder_index], landmarks[left_hip_index])
-    right_shoulder_angle = calculate_angle(landmarks[right_elbow_index], landmarks[right_shoulder_index], landmarks[right_hip_index])
-
-    # 判断拘谨或灵活
-    if left_shoulder_angle < 30 and right_shoulder_angle < 30:
-        return 1  # 拘谨
-    else:
-        return 0  # 灵活
+    result = classify_postures(np.asarray(landmarks, dtype=np.float64)[None])[0]
+    if result < 0:
+        return None  # 如果有 NaN，返回 None 表示跳过该人的判断
+    return int(result)
     
 # def classify_all_person_postures(list_x):
 #     """
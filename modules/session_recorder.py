@@ -0,0 +1,267 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from modules.body_arrays import ARRAY_NAMES, BODY_FIELDS, BodyArrays
+from modules.frame_codec import EXPRESSION_KEYS
+
+# 会话目录结构 (列式存储，每列一个原始二进制文件，可直接 np.memmap)：
+#   meta.json                 列的 dtype / 形状、帧数、人数行数
+#   frame.<列名>.bin           每帧一行: timestamp_ns, sequence, body_offset, body_count
+#   body.<列名>.bin            每人每帧一行: BodyArrays 的所有数组 + expressions (表情等级，未知为 NaN)
+# 帧 i 的人在 body 表中的行为 [body_offset[i], body_offset[i] + body_count[i])；
+# timestamp_ns 单调递增，本身就是时间索引 (np.searchsorted)。
+
+SESSION_VERSION = 1
+META_FILE = "meta.json"
+
+
+def _body_columns(keypoint_count):
+    """
+    返回值:
+    list: [(列名, dtype, 每行形状), ...]
+    """
+    columns = [("ids", np.int32, ()), ("confidences", np.float32, ()), ("tracking_state", np.int8, ())]
+    for name, _, shape, dtype, _ in BODY_FIELDS:
+        columns.append((name, dtype, tuple(keypoint_count if d == "K" else d for d in shape)))
+    columns.append(("expressions", np.float32, (len(EXPRESSION_KEYS),)))
+    return columns
+
+
+FRAME_COLUMNS = [
+    ("timestamp_ns", np.int64, ()),
+    ("sequence", np.int64, ()),
+    ("body_offset", np.int64, ()),
+    ("body_count", np.int32, ()),
+]
+
+
+class _Column:
+    """
+    只追加的内存映射列，容量不够时按 chunk_rows 整块扩展文件再重新映射
+    """
+    def __init__(self, path, dtype, shape, chunk_rows):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.chunk_rows = chunk_rows
+        self.row_bytes = self.dtype.itemsize * int(np.prod(self.shape, dtype=np.int64))
+        self.count = 0
+        self.capacity = 0
+        self.array = None
+        open(path, "wb").close()
+
+    def _grow(self, rows):
+        if self.array is not None:
+            self.array.flush()
+            self.array = None
+        chunks = -(-(self.count + rows) // self.chunk_rows)
+        self.capacity = chunks * self.chunk_rows
+        with open(self.path, "r+b") as f:
+            f.truncate(self.capacity * self.row_bytes)
+        self.array = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(self.capacity,) + self.shape)
+
+    def append(self, values):
+        rows = len(values)
+        if rows == 0:
+            return
+        if self.count + rows > self.capacity:
+            self._grow(rows)
+        self.array[self.count:self.count + rows] = values
+        self.count += rows
+
+    def close(self):
+        if self.array is not None:
+            self.array.flush()
+            self.array = None
+        # 去掉预分配但没有用到的部分
+        with open(self.path, "r+b") as f:
+            f.truncate(self.count * self.row_bytes)
+
+
+class SessionRecorder:
+    """
+    把每一帧的 BodyArrays 和表情结果追加到列式内存映射文件。
+    record 只把快照放进队列，写文件在后台线程完成，不会拖慢采集；队列满时丢弃并计数。
+    """
+    def __init__(self, path, keypoint_count=34, frame_chunk=4096, body_chunk=16384, queue_size=256):
+        """
+        参数:
+        path (str): 会话目录，不存在时创建
+        keypoint_count (int): 每人关键点数
+        frame_chunk / body_chunk (int): 帧表 / 人表每次扩展的行数
+        queue_size (int): 等待写入的最大帧数
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.keypoint_count = keypoint_count
+        self.frame_columns = {name: _Column(os.path.join(path, "frame.%s.bin" % name), dtype, shape, frame_chunk)
+                              for name, dtype, shape in FRAME_COLUMNS}
+        self.body_columns = {name: _Column(os.path.join(path, "body.%s.bin" % name), dtype, shape, body_chunk)
+                             for name, dtype, shape in _body_columns(keypoint_count)}
+        self.frames = 0
+        self.bodies = 0
+        self.dropped = 0
+        self.last_error = None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._write_meta()
+        self.thread = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self.thread.start()
+
+    def record(self, snapshot, sequence=0, expressions_by_id=None):
+        """
+        参数:
+        snapshot (BodyArrays): 一帧的快照 (BodyArrays.copy() 的结果，交给 recorder 后不能再修改)
+        sequence (int): 帧序号
+        expressions_by_id (dict): id -> 表情字典，可选
+
+        返回值:
+        bool: 是否成功放入写入队列
+        """
+        try:
+            self.queue.put_nowait((snapshot, sequence, expressions_by_id))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception as e:
+                self.last_error = repr(e)
+                print("Session recorder error:", e)
+
+    def _write(self, snapshot, sequence, expressions_by_id):
+        count = snapshot.count
+        expressions = np.full((count, len(EXPRESSION_KEYS)), np.nan, dtype=np.float32)
+        if expressions_by_id:
+            for i in range(count):
+                expression_dict = expressions_by_id.get(int(snapshot.ids[i]))
+                if expression_dict:
+                    expressions[i] = [expression_dict.get(key, 0) for key in EXPRESSION_KEYS]
+        for name in ARRAY_NAMES:
+            self.body_columns[name].append(getattr(snapshot, name)[:count])
+        self.body_columns["expressions"].append(expressions)
+
+        row = {"timestamp_ns": snapshot.timestamp_ns, "sequence": sequence,
+               "body_offset": self.bodies, "body_count": count}
+        for name, column in self.frame_columns.items():
+            column.append(np.array([row[name]]))
+        self.frames += 1
+        self.bodies += count
+        # 每写满一块帧表就更新一次 meta，程序异常退出时也能读到大部分数据
+        if self.frames % self.frame_columns["timestamp_ns"].chunk_rows == 0:
+            self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            "version": SESSION_VERSION,
+            "keypoint_count": self.keypoint_count,
+            "frames": self.frames,
+            "bodies": self.bodies,
+            "expression_keys": list(EXPRESSION_KEYS),
+            "frame_columns": {name: {"dtype": column.dtype.str, "shape": list(column.shape)}
+                              for name, column in self.frame_columns.items()},
+            "body_columns": {name: {"dtype": column.dtype.str, "shape": list(column.shape)}
+                             for name, column in self.body_columns.items()},
+        }
+        temporary = os.path.join(self.path, META_FILE + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(temporary, os.path.join(self.path, META_FILE))
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "bodies": self.bodies,
+            "queue_depth": self.queue.qsize(),
+            "dropped": self.dropped,
+            "last_error": self.last_error,
+        }
+
+    def close(self):
+        """
+        写完队列中剩余的帧，截掉预分配的空间并写入最终的 meta
+        """
+        self.queue.put(None)
+        self.thread.join()
+        for column in list(self.frame_columns.values()) + list(self.body_columns.values()):
+            column.close()
+        self._write_meta()
+
+
+class SessionReader:
+    """
+    以只读内存映射的方式打开录制的会话，不需要解析或载入全部数据
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != SESSION_VERSION:
+            raise ValueError("unsupported session version %r" % self.meta["version"])
+        self.path = path
+        self.keypoint_count = self.meta["keypoint_count"]
+        self.frame_columns = self._open("frame", self.meta["frame_columns"], self.meta["frames"])
+        self.body_columns = self._open("body", self.meta["body_columns"], self.meta["bodies"])
+        self.timestamps = self.frame_columns["timestamp_ns"]
+
+    def _open(self, table, columns, rows):
+        arrays = {}
+        for name, spec in columns.items():
+            shape = (rows,) + tuple(spec["shape"])
+            if rows == 0:
+                arrays[name] = np.zeros(shape, dtype=spec["dtype"])
+            else:
+                arrays[name] = np.memmap(os.path.join(self.path, "%s.%s.bin" % (table, name)),
+                                         dtype=spec["dtype"], mode="r", shape=shape)
+        return arrays
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def frame(self, index):
+        """
+        返回值:
+        dict: 该帧的 timestamp_ns, sequence 以及每个人体列的切片 (内存映射视图，不复制)
+        """
+        start = int(self.frame_columns["body_offset"][index])
+        stop = start + int(self.frame_columns["body_count"][index])
+        out = {name: column[start:stop] for name, column in self.body_columns.items()}
+        out["timestamp_ns"] = int(self.timestamps[index])
+        out["sequence"] = int(self.frame_columns["sequence"][index])
+        return out
+
+    def body_arrays(self, index, out=None):
+        """
+        把一帧读入 BodyArrays (out 为 None 时新建)
+
+        返回值:
+        BodyArrays
+        """
+        columns = self.frame(index)
+        out = BodyArrays(self.keypoint_count) if out is None else out
+        out.assign(columns, len(columns["ids"]), columns["timestamp_ns"])
+        return out
+
+    def index_at(self, timestamp_ns):
+        """
+        返回值:
+        int: 时间戳不晚于 timestamp_ns 的最后一帧，早于第一帧时为 0
+        """
+        return max(int(np.searchsorted(self.timestamps, timestamp_ns, side="right")) - 1, 0)
+
+    def between(self, start_ns, stop_ns):
+        """
+        返回值:
+        range: 时间戳在 [start_ns, stop_ns) 内的帧号
+        """
+        return range(int(np.searchsorted(self.timestamps, start_ns, side="left")),
+                     int(np.searchsorted(self.timestamps, stop_ns, side="left")))
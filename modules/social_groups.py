@@ -0,0 +1,224 @@
+import numpy as np
+
+from modules.interaction_checker import head_vectors_from_bboxes
+
+
+def o_space_votes(positions, orientations, stride=0.6, up_axis=1):
+    """
+    F-formation 的 O-space 投票：每个人沿头部朝向 (水平面内) 向前 stride 米投出一票，
+    同一个对话群体的人的票会落在他们中间的公共空间附近
+
+    参数:
+    positions (np.ndarray): (N, 3) 人的位置
+    orientations (np.ndarray): (N, 3) 朝向向量 (不要求单位长度)
+    stride (float): 投票距离，单位米
+    up_axis (int): 竖直轴
+
+    返回值:
+    np.ndarray: (N, 2) 水平面内的投票位置，朝向无效时为 NaN
+    """
+    horizontal_axes = [axis for axis in range(3) if axis != up_axis]
+    positions = np.asarray(positions, dtype=np.float64)[:, horizontal_axes]
+    directions = np.asarray(orientations, dtype=np.float64)[:, horizontal_axes]
+    norm = np.linalg.norm(directions, axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        directions = directions / norm
+    directions[~(norm[:, 0] > 1e-6)] = np.nan
+    return positions + stride * directions
+
+
+def _connected_components(adjacency):
+    """
+    参数:
+    adjacency (np.ndarray): (N, N) bool 对称邻接矩阵
+
+    返回值:
+    list: [[i, j, ...], ...] 每个连通分量的行号，按最小行号排序
+    """
+    count = len(adjacency)
+    seen = np.zeros(count, dtype=bool)
+    components = []
+    for start in range(count):
+        if seen[start]:
+            continue
+        seen[start] = True
+        component = [start]
+        stack = [start]
+        while stack:
+            neighbours = np.flatnonzero(adjacency[stack.pop()] & ~seen)
+            seen[neighbours] = True
+            component.extend(neighbours.tolist())
+            stack.extend(neighbours.tolist())
+        components.append(sorted(component))
+    return components
+
+
+def group_links(positions, orientations, stride=0.6, radius=0.6, max_distance=2.5, up_axis=1):
+    """
+    一帧内两两之间是否属于同一个 F-formation：两人的 O-space 投票相距不超过 radius，且两人相距不超过 max_distance
+
+    返回值:
+    np.ndarray: (N, N) bool，对角线为 False
+    """
+    votes = o_space_votes(positions, orientations, stride, up_axis)
+    horizontal_axes = [axis for axis in range(3) if axis != up_axis]
+    ground = np.asarray(positions, dtype=np.float64)[:, horizontal_axes]
+    with np.errstate(invalid='ignore'):
+        vote_distance = np.linalg.norm(votes[:, None, :] - votes[None, :, :], axis=-1)
+        body_distance = np.linalg.norm(ground[:, None, :] - ground[None, :, :], axis=-1)
+        links = (vote_distance <= radius) & (body_distance <= max_distance)
+    np.fill_diagonal(links, False)
+    return links
+
+
+def detect_groups(positions, orientations, min_size=2, **kwargs):
+    """
+    单帧检测对话群体 (不带跨帧平滑)
+
+    参数:
+    positions (np.ndarray): (N, 3)
+    orientations (np.ndarray): (N, 3)
+    min_size (int): 群体最少人数
+    kwargs: 传给 group_links 的参数
+
+    返回值:
+    np.ndarray: (N,) int32，每个人所属群体的编号，不属于任何群体时为 -1
+    """
+    labels = np.full(len(positions), -1, dtype=np.int32)
+    if len(positions) < min_size:
+        return labels
+    components = _connected_components(group_links(positions, orientations, **kwargs))
+    for label, component in enumerate(c for c in components if len(c) >= min_size):
+        labels[component] = label
+    return labels
+
+
+class GroupTracker:
+    """
+    跨帧增量维护对话群体。
+    每一对人有一个连接强度 (对每帧的投票结果做指数平滑)，强度高于 enter 时连接，低于 exit 时断开，
+    中间保持上一帧的状态 (滞回)，因此短暂转头不会让群体闪烁。
+    连接关系没有变化时直接沿用上一帧的分组；分组变化时按成员重叠继承原来的群体 id，保证编号稳定。
+    """
+    def __init__(self, enter=0.6, exit=0.3, smoothing=0.3, min_size=2, capacity=16, **link_kwargs):
+        """
+        参数:
+        enter / exit (float): 连接 / 断开的强度阈值
+        smoothing (float): 每帧的平滑系数，越大反应越快
+        min_size (int): 群体最少人数
+        capacity (int): 初始可跟踪人数，超出时按倍数扩容
+        link_kwargs: 传给 group_links 的参数 (stride, radius, max_distance, up_axis)
+        """
+        self.enter = enter
+        self.exit = exit
+        self.smoothing = smoothing
+        self.min_size = min_size
+        self.link_kwargs = link_kwargs
+        # id -> 矩阵中的行号
+        self.slots = {}
+        self.free_slots = []
+        self._allocate(capacity)
+        # 群体 id -> 成员 id 列表
+        self.groups = {}
+        self.group_of = {}
+        self.next_group_id = 0
+        self._previous_links = None
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self.strength = np.zeros((capacity, capacity), dtype=np.float32)
+        self.linked = np.zeros((capacity, capacity), dtype=bool)
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def _reserve(self, count):
+        if count <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < count:
+            capacity *= 2
+        strength, linked = self.strength, self.linked
+        used = self.capacity
+        self._allocate(capacity)
+        self.strength[:used, :used] = strength
+        self.linked[:used, :used] = linked
+        taken = set(self.slots.values())
+        self.free_slots = [slot for slot in range(capacity - 1, -1, -1) if slot not in taken]
+
+    def _evict(self, active_ids):
+        for person_id in [person_id for person_id in self.slots if person_id not in active_ids]:
+            slot = self.slots.pop(person_id)
+            self.strength[slot, :] = 0
+            self.strength[:, slot] = 0
+            self.linked[slot, :] = False
+            self.linked[:, slot] = False
+            self.free_slots.append(slot)
+
+    def update(self, ids, positions, orientations):
+        """
+        用一帧的数据更新群体
+
+        参数:
+        ids (array-like): 每个人的 id，长度 N
+        positions (np.ndarray): (N, 3)
+        orientations (np.ndarray): (N, 3) 头部朝向
+
+        返回值:
+        np.ndarray: (N,) int32，每个人所属的稳定群体 id，不属于任何群体时为 -1
+        """
+        ids = [int(person_id) for person_id in ids]
+        active = set(ids)
+        self._evict(active)
+        self._reserve(len(active))
+        for person_id in ids:
+            if person_id not in self.slots:
+                self.slots[person_id] = self.free_slots.pop()
+
+        slots = np.array([self.slots[person_id] for person_id in ids], dtype=np.intp)
+        block = np.ix_(slots, slots)
+        if len(ids):
+            observed = group_links(positions, orientations, **self.link_kwargs)
+            strength = self.strength[block]
+            strength += self.smoothing * (observed - strength)
+            linked = self.linked[block]
+            linked = np.where(strength >= self.enter, True, np.where(strength <= self.exit, False, linked))
+            np.fill_diagonal(linked, False)
+            self.strength[block] = strength
+            self.linked[block] = linked
+        else:
+            linked = np.zeros((0, 0), dtype=bool)
+
+        links = (tuple(ids), linked.tobytes())
+        if links != self._previous_links:
+            self._previous_links = links
+            self._regroup(ids, linked)
+        return np.array([self.group_of.get(person_id, -1) for person_id in ids], dtype=np.int32)
+
+    def update_from_bodies(self, body_arrays):
+        """
+        对 BodyArrays 的有效行更新群体，位置为头部位置，朝向由头部 bounding box 计算
+        """
+        count = body_arrays.count
+        return self.update(body_arrays.ids[:count], body_arrays.head_positions[:count],
+                           head_vectors_from_bboxes(body_arrays.head_bounding_box[:count]))
+
+    def _regroup(self, ids, linked):
+        previous = self.group_of
+        self.groups = {}
+        self.group_of = {}
+        components = [c for c in _connected_components(linked) if len(c) >= self.min_size]
+        # 成员最多的群体优先继承原来的 id
+        for component in sorted(components, key=len, reverse=True):
+            members = [ids[i] for i in component]
+            votes = {}
+            for person_id in members:
+                group_id = previous.get(person_id)
+                if group_id is not None and group_id not in self.groups:
+                    votes[group_id] = votes.get(group_id, 0) + 1
+            if votes:
+                group_id = max(votes, key=lambda g: (votes[g], -g))
+            else:
+                group_id = self.next_group_id
+                self.next_group_id += 1
+            self.groups[group_id] = sorted(members)
+            for person_id in members:
+                self.group_of[person_id] = group_id
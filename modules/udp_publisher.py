@@ -0,0 +1,67 @@
+import socket
+import threading
+
+
+class UdpPublisher:
+    """
+    长期持有的 UDP 发送器：目标地址在构造时解析一次，所有通道复用同一个非阻塞 socket，
+    并统计每个通道的发送数、字节数、丢弃数与错误数
+    """
+    def __init__(self, destinations):
+        """
+        参数:
+        destinations (dict): 通道名 -> (host, port)，例如 {"skeleton": ("192.168.1.251", 1111)}
+        """
+        self.addresses = {}
+        for channel, (host, port) in destinations.items():
+            # 只在启动时做一次 DNS / 地址解析
+            self.addresses[channel] = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+        self.lock = threading.Lock()
+        self.counters = {channel: {"sent": 0, "bytes": 0, "dropped": 0, "errors": 0, "last_error": None}
+                         for channel in self.addresses}
+
+    def send(self, channel, payload):
+        """
+        向指定通道发送一个数据报
+
+        参数:
+        channel (str): 通道名
+        payload (bytes or str): 数据，str 会先 encode
+
+        返回值:
+        bool: 是否已交给内核发送
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        counters = self.counters[channel]
+        try:
+            self.sock.sendto(payload, self.addresses[channel])
+        except BlockingIOError:
+            # 发送缓冲区已满：非阻塞模式下直接丢弃这一帧，下一帧会覆盖它
+            with self.lock:
+                counters["dropped"] += 1
+            return False
+        except OSError as e:
+            with self.lock:
+                counters["errors"] += 1
+                counters["last_error"] = repr(e)
+            return False
+        with self.lock:
+            counters["sent"] += 1
+            counters["bytes"] += len(payload)
+        return True
+
+    def stats(self):
+        """
+        返回值:
+        dict: 通道名 -> 计数器快照
+        """
+        with self.lock:
+            return {channel: dict(counters) for channel, counters in self.counters.items()}
+
+    def close(self):
+        self.sock.close()
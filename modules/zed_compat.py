@@ -0,0 +1,100 @@
+import numpy as np
+
+# ZED SDK 是可选依赖：回放录制数据、跑基准测试时不需要安装。
+# 需要 SDK 的地方 (相机、SVO) 在运行时检查 sl 是否为 None。
+try:
+    import pyzed.sl as sl
+except ImportError:
+    sl = None
+
+# sl.OBJECT_TRACKING_STATE 的取值
+TRACKING_OFF, TRACKING_OK, TRACKING_SEARCHING, TRACKING_TERMINATE = 0, 1, 2, 3
+TRACKING_STATE_NAMES = {"OFF": TRACKING_OFF, "OK": TRACKING_OK, "TRACKED": TRACKING_OK,
+                        "SEARCHING": TRACKING_SEARCHING, "TERMINATE": TRACKING_TERMINATE}
+
+# sl.BODY_34_PARTS 的顺序
+BODY_34_PARTS = (
+    "PELVIS", "NAVAL_SPINE", "CHEST_SPINE", "NECK",
+    "LEFT_CLAVICLE", "LEFT_SHOULDER", "LEFT_ELBOW", "LEFT_WRIST", "LEFT_HAND", "LEFT_HANDTIP", "LEFT_THUMB",
+    "RIGHT_CLAVICLE", "RIGHT_SHOULDER", "RIGHT_ELBOW", "RIGHT_WRIST", "RIGHT_HAND", "RIGHT_HANDTIP", "RIGHT_THUMB",
+    "LEFT_HIP", "LEFT_KNEE", "LEFT_ANKLE", "LEFT_FOOT",
+    "RIGHT_HIP", "RIGHT_KNEE", "RIGHT_ANKLE", "RIGHT_FOOT",
+    "HEAD", "NOSE", "LEFT_EYE", "LEFT_EAR", "RIGHT_EYE", "RIGHT_EAR", "LEFT_HEEL", "RIGHT_HEEL",
+)
+
+_BODY_34_BONE_NAMES = (
+    ("PELVIS", "NAVAL_SPINE"), ("NAVAL_SPINE", "CHEST_SPINE"),
+    ("CHEST_SPINE", "LEFT_CLAVICLE"), ("LEFT_CLAVICLE", "LEFT_SHOULDER"), ("LEFT_SHOULDER", "LEFT_ELBOW"),
+    ("LEFT_ELBOW", "LEFT_WRIST"), ("LEFT_WRIST", "LEFT_HAND"), ("LEFT_HAND", "LEFT_HANDTIP"), ("LEFT_WRIST", "LEFT_THUMB"),
+    ("CHEST_SPINE", "RIGHT_CLAVICLE"), ("RIGHT_CLAVICLE", "RIGHT_SHOULDER"), ("RIGHT_SHOULDER", "RIGHT_ELBOW"),
+    ("RIGHT_ELBOW", "RIGHT_WRIST"), ("RIGHT_WRIST", "RIGHT_HAND"), ("RIGHT_HAND", "RIGHT_HANDTIP"), ("RIGHT_WRIST", "RIGHT_THUMB"),
+    ("PELVIS", "LEFT_HIP"), ("LEFT_HIP", "LEFT_KNEE"), ("LEFT_KNEE", "LEFT_ANKLE"), ("LEFT_ANKLE", "LEFT_FOOT"),
+    ("PELVIS", "RIGHT_HIP"), ("RIGHT_HIP", "RIGHT_KNEE"), ("RIGHT_KNEE", "RIGHT_ANKLE"), ("RIGHT_ANKLE", "RIGHT_FOOT"),
+    ("CHEST_SPINE", "NECK"), ("NECK", "HEAD"), ("HEAD", "NOSE"),
+    ("NOSE", "LEFT_EYE"), ("LEFT_EYE", "LEFT_EAR"), ("NOSE", "RIGHT_EYE"), ("RIGHT_EYE", "RIGHT_EAR"),
+    ("LEFT_ANKLE", "LEFT_HEEL"), ("RIGHT_ANKLE", "RIGHT_HEEL"), ("LEFT_HEEL", "LEFT_FOOT"), ("RIGHT_HEEL", "RIGHT_FOOT"),
+)
+
+# (B, 2) 骨骼两端的关键点索引
+BODY_34_BONES = np.array([(BODY_34_PARTS.index(a), BODY_34_PARTS.index(b)) for a, b in _BODY_34_BONE_NAMES], dtype=np.intp)
+
+_bones_cache = {}
+
+
+def body_format_name(body_format):
+    """
+    参数:
+    body_format: sl.BODY_FORMAT 枚举或 "BODY_34" 这样的字符串
+
+    返回值:
+    str: 例如 "BODY_34"
+    """
+    return getattr(body_format, "name", str(body_format).split(".")[-1])
+
+
+def body_bones(body_format):
+    """
+    返回值:
+    np.ndarray: (B, 2) 骨骼两端的关键点索引。有 SDK 时使用 sl.<格式>_BONES，否则只支持 BODY_34
+    """
+    name = body_format_name(body_format)
+    if name not in _bones_cache:
+        if sl is not None and hasattr(sl, name + "_BONES"):
+            _bones_cache[name] = np.array([(a.value, b.value) for a, b in getattr(sl, name + "_BONES")], dtype=np.intp)
+        elif name == "BODY_34":
+            _bones_cache[name] = BODY_34_BONES
+        else:
+            raise ValueError("bone table for %s needs the ZED SDK (pyzed)" % name)
+    return _bones_cache[name]
+
+
+def body_part_count(body_format):
+    """
+    返回值:
+    int: 该格式的关键点数
+    """
+    name = body_format_name(body_format)
+    if sl is not None and hasattr(sl, name + "_PARTS"):
+        return len(getattr(sl, name + "_PARTS")) - 1     # 不含 LAST
+    if name == "BODY_34":
+        return len(BODY_34_PARTS)
+    raise ValueError("part list for %s needs the ZED SDK (pyzed)" % name)
+
+
+def tracking_state_value(state):
+    """
+    把 sl.OBJECT_TRACKING_STATE、整数或 serializeBodyData 写出的字符串 ("OK" / "OBJECT_TRACKING_STATE.OK") 转成整数
+    """
+    if isinstance(state, str):
+        return TRACKING_STATE_NAMES.get(state.split(".")[-1].upper(), TRACKING_OFF)
+    return int(getattr(state, "value", state))
+
+
+def is_renderable(body, is_tracking_on):
+    """
+    与 ZED 示例中的 render_object 相同：开启跟踪时只显示 OK 的人，否则 OK 和 OFF 都显示
+    """
+    state = tracking_state_value(body.tracking_state)
+    if is_tracking_on:
+        return state == TRACKING_OK
+    return state in (TRACKING_OK, TRACKING_OFF)
@@ -8,7 +8,8 @@ import sys
 import array
 import math
 import ctypes
-import pyzed.sl as sl
+from functools import lru_cache
+from modules.zed_compat import body_bones, body_part_count, is_renderable
 M_PI = 3.1415926
 
 SK_SPHERE_SHADER = """
@@ -29,6 +30,25 @@ void main() {
 }
 """
 
+# 所有人的关键点球一次画完：球心和颜色是每个实例的属性 (glVertexAttribDivisor = 1)
+SK_SPHERE_INSTANCED_SHADER = """
+# version 330 core
+layout(location = 0) in vec3 in_Vertex;
+layout(location = 1) in vec3 in_Normal;
+layout(location = 2) in vec3 in_Center;
+layout(location = 3) in vec4 in_Color;
+out vec4 b_color;
+out vec3 b_position;
+out vec3 b_normal;
+uniform mat4 u_mvpMatrix;
+void main() {
+   b_color = in_Color;
+   b_position = in_Vertex;
+   b_normal = in_Normal;
+   gl_Position =  u_mvpMatrix * vec4(in_Center + in_Vertex, 1);
+}
+"""
+
 SK_VERTEX_SHADER = """
 # version 330 core
 layout(location = 0) in vec3 in_Vertex;
@@ -63,6 +83,41 @@ void main() {
 }
 """
 
+@lru_cache(maxsize=None)
+def sphere_mesh(radius=0.025, stack_count=12, sector_count=12):
+    """
+    生成关键点球的网格 (与原来逐点的 add_sphere 相同，每 4 个顶点一个四边形)，同一组参数只计算一次
+
+    返回值:
+    tuple: (vertices, normals) 均为 (stack_count + 1) * sector_count * 4 行、3 列的只读 float32 数组
+    """
+    i = np.arange(stack_count + 1)[:, None]
+    j = np.arange(sector_count)[None, :]
+    lat0 = M_PI * (-0.5 + (i - 1) / stack_count)
+    lat1 = M_PI * (-0.5 + i / stack_count)
+    lng0 = 2 * M_PI * (j - 1) / sector_count
+    lng1 = 2 * M_PI * j / sector_count
+    # 四边形的四个角: (lng0, lat0) (lng0, lat1) (lng1, lat1) (lng1, lat0)
+    lat0, lat1, lng0, lng1 = np.broadcast_arrays(lat0, lat1, lng0, lng1)
+    lat = np.stack([lat0, lat1, lat1, lat0], axis=-1)
+    lng = np.stack([lng0, lng0, lng1, lng1], axis=-1)
+    normals = np.stack([np.cos(lng) * np.cos(lat), np.sin(lng) * np.cos(lat), np.sin(lat)], axis=-1)
+    normals = normals.reshape(-1, 3).astype(np.float32)
+    vertices = (radius * normals).astype(np.float32)
+    vertices.flags.writeable = False
+    normals.flags.writeable = False
+    return vertices, normals
+
+
+def quad_triangle_indices(vertex_count):
+    """
+    返回值:
+    np.ndarray: 把连续 4 个顶点组成的四边形拆成两个三角形的索引 (uint32)
+    """
+    quads = np.arange(vertex_count, dtype=np.uint32).reshape(-1, 4)
+    return quads[:, [0, 1, 2, 0, 2, 3]].ravel()
+
+
 def generate_color_id(_idx):
     clr = np.divide(generate_color_id_u(_idx),255.0)
     clr[0], clr[2] = clr[2], clr[0]
@@ -126,10 +181,16 @@ class Simple3DObject:
         self.indices = array.array('I')
 
     def __del__(self):
+        # 这里不能调用 GL (可能在别的线程或上下文已销毁之后)，缓冲要用 release 显式释放
         self.is_init = False
         if self.vaoID:
             self.vaoID = 0
 
+    def release(self):
+        if self.is_init:
+            glDeleteBuffers(3, self.vboID)
+            self.is_init = False
+
     def add_vert(self, i_f, limit, height):
         p1 = [i_f, height, -limit]
         p2 = [i_f, height, limit]
@@ -185,59 +246,30 @@ class Simple3DObject:
         self.add_point_clr(_p2)
     
     def add_sphere(self): 
-        m_radius = 0.025
-        m_stack_count = 12
-        m_sector_count = 12
-
-        for i in range(m_stack_count+1):
-            lat0 = M_PI * (-0.5 + (i - 1) / m_stack_count)
-            z0 = math.sin(lat0)
-            zr0 = math.cos(lat0)
-
-            lat1 = M_PI * (-0.5 + i / m_stack_count)
-            z1 = math.sin(lat1)
-            zr1 = math.cos(lat1)
-            for j in range(m_sector_count):
-                lng = 2 * M_PI * (j - 1) / m_sector_count
-                x = math.cos(lng)
-                y = math.sin(lng)
-
-                v = [m_radius * x * zr0, m_radius * y * zr0, m_radius * z0]
-                normal = [x * zr0, y * zr0, z0]
-                self.add_point_clr_norm(v, normal)
-
-                v = [m_radius * x * zr1, m_radius * y * zr1, m_radius * z1]
-                normal = [x * zr1, y * zr1, z1]
-                self.add_point_clr_norm(v, normal)
-
-                lng = 2 * M_PI * j / m_sector_count
-                x = math.cos(lng)
-                y = math.sin(lng)
-
-                v= [m_radius * x * zr1, m_radius * y * zr1, m_radius * z1]
-                normal = [x * zr1, y * zr1, z1]
-                self.add_point_clr_norm(v, normal)
-
-                v = [m_radius * x * zr0, m_radius * y * zr0, m_radius * z0]
-                normal = [x * zr0, y * zr0, z0]                
-                self.add_point_clr_norm(v, normal)
+        vertices, normals = sphere_mesh()
+        start = len(self.indices)
+        self.vertices.frombytes(vertices.tobytes())
+        self.normals.frombytes(normals.tobytes())
+        self.indices.frombytes(np.arange(start, start + len(vertices), dtype=np.uint32).tobytes())
 
     def push_to_GPU(self):
         if( self.is_init == False):
             self.vboID = glGenBuffers(3)
             self.is_init = True
 
+        usage = GL_STATIC_DRAW if self.is_static else GL_DYNAMIC_DRAW
+        # np.frombuffer 直接引用 array 的内存，不再逐个元素构造 ctypes 数组
         if len(self.vertices):
             glBindBuffer(GL_ARRAY_BUFFER, self.vboID[0])
-            glBufferData(GL_ARRAY_BUFFER, len(self.vertices) * self.vertices.itemsize, (GLfloat * len(self.vertices))(*self.vertices), GL_STATIC_DRAW)         
+            glBufferData(GL_ARRAY_BUFFER, len(self.vertices) * self.vertices.itemsize, np.frombuffer(self.vertices, dtype=np.float32), usage)
         
         if len(self.normals):
             glBindBuffer(GL_ARRAY_BUFFER, self.vboID[1])
-            glBufferData(GL_ARRAY_BUFFER, len(self.normals) * self.normals.itemsize, (GLfloat * len(self.normals))(*self.normals), GL_STATIC_DRAW)
+            glBufferData(GL_ARRAY_BUFFER, len(self.normals) * self.normals.itemsize, np.frombuffer(self.normals, dtype=np.float32), usage)
 
         if len(self.indices):
             glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.vboID[2])
-            glBufferData(GL_ELEMENT_ARRAY_BUFFER,len(self.indices) * self.indices.itemsize,(GLuint * len(self.indices))(*self.indices), GL_STATIC_DRAW)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER,len(self.indices) * self.indices.itemsize, np.frombuffer(self.indices, dtype=np.uint32), usage)
             
         self.elementbufferSize = len(self.indices)
 
@@ -265,48 +297,97 @@ class Simple3DObject:
             glDisableVertexAttribArray(0)
             glDisableVertexAttribArray(1)
 
+class DynamicBuffer:
+    """
+    可重复使用的顶点缓冲：CPU 端是预分配的 NumPy 数组，GPU 端的 VBO 只在容量不够时重新分配，
+    平时每帧用 glBufferSubData 覆盖前 count 行
+    """
+    def __init__(self, components, capacity):
+        self.data = np.zeros((capacity, components), dtype=np.float32)
+        self.count = 0
+        self.vboID = 0
+        self.gpu_capacity = 0
+
+    def fill(self, parts):
+        """
+        参数:
+        parts (list): 若干个 (n, components) 数组，按顺序拼接到缓冲开头
+
+        返回值:
+        list: 每一部分在缓冲中的起始行
+        """
+        offsets = []
+        total = 0
+        for part in parts:
+            offsets.append(total)
+            total += len(part)
+        if total > len(self.data):
+            # 人数超过预设上限时扩容 (很少发生)
+            self.data = np.zeros((max(total, 2 * len(self.data)), self.data.shape[1]), dtype=np.float32)
+        if total:
+            np.concatenate(parts, out=self.data[:total])
+        self.count = total
+        return offsets
+
+    def push_to_GPU(self):
+        if not self.vboID:
+            self.vboID = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vboID)
+        if len(self.data) > self.gpu_capacity:
+            glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, None, GL_DYNAMIC_DRAW)
+            self.gpu_capacity = len(self.data)
+        if self.count:
+            glBufferSubData(GL_ARRAY_BUFFER, 0, self.count * self.data.strides[0], self.data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def bind(self, location):
+        glEnableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vboID)
+        glVertexAttribPointer(location, self.data.shape[1], GL_FLOAT, GL_FALSE, 0, None)
+
+    def release(self):
+        if self.vboID:
+            glDeleteBuffers(1, [self.vboID])
+            self.vboID = 0
+            self.gpu_capacity = 0
+
 class Skeleton:
-    def __init__(self, _body_format = sl.BODY_FORMAT.BODY_18):
+    """
+    一个人的绘制数据 (只在 CPU 端)：骨骼线段的端点和有效关键点。GPU 缓冲由 GLViewer 的缓冲池统一管理
+    """
+    def __init__(self, _body_format = "BODY_18"):
         self.clr = [0,0,0,1]
-        self.kps = []
-        self.joints = Simple3DObject(False)
+        self.kps = np.zeros((0, 3), dtype=np.float32)
+        self.lines = np.zeros((0, 3), dtype=np.float32)
+        # 在骨骼缓冲中的起始顶点，由 GLViewer.update_view 设置
+        self.first = 0
         self.Z = 1
         self.body_format = _body_format
 
-    def createSk(self, obj, BODY_PARTS, BODY_BONES):
-        for bone in BODY_BONES:
-            kp_1 = obj.keypoint[bone[0].value]
-            kp_2 = obj.keypoint[bone[1].value]
-            if math.isfinite(kp_1[0]) and math.isfinite(kp_2[0]):
-                self.joints.add_line(kp_1, kp_2)
-
-        for part in range(len(BODY_PARTS)-1):    # -1 to avoid LAST
-            kp = obj.keypoint[part]
-            norm = np.linalg.norm(kp)
-            if math.isfinite(norm):
-                self.kps.append(kp)
-
-    def set(self, obj):
-        self.joints.set_drawing_type(GL_LINES)
+    def createSk(self, keypoints, part_count, BODY_BONES):
+        keypoints = np.asarray(keypoints[:part_count], dtype=np.float32)
+        ends = keypoints[BODY_BONES]                       # (B, 2, 3)
+        self.lines = ends[np.isfinite(ends).all(axis=(1, 2))].reshape(-1, 3)
+        self.kps = keypoints[np.isfinite(keypoints).all(axis=1)]
+
+    def set(self, obj, keypoints=None):
+        """
+        keypoints 为已经转换到显示坐标系的关键点，为 None 时使用 obj.keypoint
+        """
         self.clr = generate_color_id(obj.id)
         self.Z = abs(obj.position[2])
+        keypoints = obj.keypoint if keypoints is None else keypoints
         # Draw skeletons
-        if obj.keypoint.size > 0:
-            if self.body_format == sl.BODY_FORMAT.BODY_18:
-                self.createSk(obj, sl.BODY_18_PARTS, sl.BODY_18_BONES)
-            elif self.body_format == sl.BODY_FORMAT.BODY_34:
-                self.createSk(obj, sl.BODY_34_PARTS, sl.BODY_34_BONES)
-            elif self.body_format == sl.BODY_FORMAT.BODY_38:
-                self.createSk(obj, sl.BODY_38_PARTS, sl.BODY_38_BONES)
-
-    def push_to_GPU(self):
-        self.joints.push_to_GPU()
+        if keypoints.size > 0:
+            self.createSk(keypoints, body_part_count(self.body_format), body_bones(self.body_format))
 
-    def draw(self, shader_sk_clr, sphere, shader_mvp, projection):
+    def draw(self, shader_sk_clr):
+        if not len(self.lines):
+            return
         glUniform4f(shader_sk_clr, self.clr[0],self.clr[1],self.clr[2],self.clr[3])
         line_w = (20. / self.Z)
         glLineWidth(line_w)
-        self.joints.draw()
+        glDrawArrays(GL_LINES, self.first, len(self.lines))
 
     def drawKPS(self, shader_clr, sphere, shader_pt):
         glUniform4f(shader_clr, self.clr[0],self.clr[1],self.clr[2],self.clr[3])         
@@ -314,6 +395,76 @@ class Skeleton:
             glUniform4f(shader_pt, k[0],k[1],k[2], 1)
             sphere.draw()
 
+class InstancedSpheres:
+    """
+    所有人的关键点球：球网格只上传一次，球心和颜色放在实例缓冲里，每帧一次 glDrawElementsInstanced
+    """
+    def __init__(self, capacity=0):
+        self.is_init = False
+        self.centers = DynamicBuffer(3, capacity)
+        self.colors = DynamicBuffer(4, capacity)
+
+    def init(self):
+        vertices, normals = sphere_mesh()
+        indices = quad_triangle_indices(len(vertices))
+        # 0: 顶点 1: 法线 2: 索引
+        self.vboID = glGenBuffers(3)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vboID[0])
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vboID[1])
+        glBufferData(GL_ARRAY_BUFFER, normals.nbytes, normals, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.vboID[2])
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.index_count = len(indices)
+        self.is_init = True
+
+    def set(self, skeletons):
+        """
+        参数:
+        skeletons (list): Skeleton，取其中的有效关键点和颜色
+        """
+        self.centers.fill([sk.kps for sk in skeletons])
+        self.colors.fill([np.broadcast_to(np.asarray(sk.clr, dtype=np.float32), (len(sk.kps), 4)) for sk in skeletons])
+
+    def push_to_GPU(self):
+        self.centers.push_to_GPU()
+        self.colors.push_to_GPU()
+
+    def draw(self):
+        instance_count = self.centers.count
+        if not self.is_init or not instance_count:
+            return
+        glEnableVertexAttribArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vboID[0])
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, None)
+
+        glEnableVertexAttribArray(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vboID[1])
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 0, None)
+
+        self.centers.bind(2)
+        glVertexAttribDivisor(2, 1)
+        self.colors.bind(3)
+        glVertexAttribDivisor(3, 1)
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.vboID[2])
+        glDrawElementsInstanced(GL_TRIANGLES, self.index_count, GL_UNSIGNED_INT, None, instance_count)
+
+        glVertexAttribDivisor(2, 0)
+        glVertexAttribDivisor(3, 0)
+        for location in range(4):
+            glDisableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        if self.is_init:
+            glDeleteBuffers(3, self.vboID)
+            self.is_init = False
+        self.centers.release()
+        self.colors.release()
+
 IMAGE_FRAGMENT_SHADER = """
 # version 330 core
 in vec2 UV;
@@ -411,16 +562,22 @@ class GLViewer:
     """
     Class that manages input events, window and OpenGL rendering pipeline
     """
-    def __init__(self):
+    def __init__(self, max_bodies=32):
         self.available = False
         self.bodies = []
+        self.max_bodies = max_bodies
         self.mutex = Lock()
         # Create the rendering camera
         self.projection = array.array('f')
         self.basic_sphere = Simple3DObject(True)
+        self.keypoint_spheres = InstancedSpheres()
+        # 所有人的骨骼线段共用一个 VBO，按最多 max_bodies 人预分配
+        self.skeleton_lines = DynamicBuffer(3, 0)
+        # 不支持实例化绘制的 (GL < 3.3) 驱动退回逐个关键点绘制
+        self.use_instancing = False
         # Show tracked objects only
         self.is_tracking_on = False
-        self.body_format = sl.BODY_FORMAT.BODY_18
+        self.body_format = "BODY_18"
 
     def init(self, _params, _is_tracking_on, _body_format): 
         glutInit()
@@ -457,6 +614,11 @@ class GLViewer:
         self.shader_sphere_clr = glGetUniformLocation(self.shader_sphere_image.get_program_id(), "u_color")
         self.shader_sphere_pt = glGetUniformLocation(self.shader_sphere_image.get_program_id(), "u_pt")
 
+        self.use_instancing = bool(glDrawElementsInstanced) and bool(glVertexAttribDivisor)
+        if self.use_instancing:
+            self.shader_instanced_sphere = Shader(SK_SPHERE_INSTANCED_SHADER, SK_FRAGMENT_SHADER)
+            self.shader_instanced_sphere_MVP = glGetUniformLocation(self.shader_instanced_sphere.get_program_id(), "u_mvpMatrix")
+
         self.set_render_camera_projection(_params, 0.1, 200)
 
         self.floor_plane_set = False
@@ -478,6 +640,10 @@ class GLViewer:
 
         self.available = True
         self.body_format = _body_format
+        self.skeleton_lines = DynamicBuffer(3, self.max_bodies * len(body_bones(_body_format)) * 2)
+        self.keypoint_spheres = InstancedSpheres(self.max_bodies * body_part_count(_body_format))
+        if self.use_instancing:
+            self.keypoint_spheres.init()
 
     def set_floor_plane_equation(self, _eq):
         self.floor_plane_set = True
@@ -519,10 +685,7 @@ class GLViewer:
         return self.available
 
     def render_object(self, _object_data):      # _object_data of type sl.ObjectData
-        if self.is_tracking_on:
-            return (_object_data.tracking_state == sl.OBJECT_TRACKING_STATE.OK)
-        else:
-            return (_object_data.tracking_state == sl.OBJECT_TRACKING_STATE.OK or _object_data.tracking_state == sl.OBJECT_TRACKING_STATE.OFF)
+        return is_renderable(_object_data, self.is_tracking_on)
 
     # def update_view(self, _image, _bodies):       # _objs of type sl.Bodies
     #     self.mutex.acquire()
@@ -538,30 +701,38 @@ class GLViewer:
     #     self.mutex.release()
     
     def update_view(self, _image, _bodies):
-        self.mutex.acquire()
-        self.bodies.clear()
-
-        for _body in _bodies.body_list:
+        # 直接渲染 SDK 的 RIGHT_HANDED_Y_UP 相机坐标；pipeline.Frame 带有每帧共享的数组，sl.Bodies 则逐个读取
+        transforms = getattr(_bodies, "transforms", None)
+        if transforms is not None:
+            keypoints = transforms.keypoints("camera")
+        else:
+            keypoints = [np.asarray(_body.keypoint, dtype=np.float32).reshape(-1, 3) for _body in _bodies.body_list]
+        skeletons = []
+        for i, _body in enumerate(_bodies.body_list):
             if self.render_object(_body):
                 current_sk = Skeleton(self.body_format)
-                self.convert_to_right_handed_y_up(_body)
-                current_sk.set(_body)
-                self.bodies.append(current_sk)
-        self.mutex.release()
-
-    def convert_to_right_handed_y_up(self, body):
-        for i, keypoint in enumerate(body.keypoint):
-            # Convert from RIGHT_HANDED_Z_UP to RIGHT_HANDED_Y_UP
-            body.keypoint[i] = [keypoint[0], keypoint[2], keypoint[1]]  # Z and Y swapped, Z inverted
+                current_sk.set(_body, keypoints[i])
+                skeletons.append(current_sk)
 
+        self.mutex.acquire()
+        self.bodies = skeletons
+        offsets = self.skeleton_lines.fill([body.lines for body in self.bodies])
+        for body, first in zip(self.bodies, offsets):
+            body.first = first
+        if self.use_instancing:
+            self.keypoint_spheres.set(self.bodies)
+        self.mutex.release()
 
     def idle(self):
         if self.available:
             glutPostRedisplay()
 
     def exit(self):      
-        if self.available:
-            self.available = False
+        # 关闭窗口时 close_func 已把 available 置为 False，GPU 缓冲仍要释放 (各 release 可重复调用)
+        self.available = False
+        self.skeleton_lines.release()
+        self.keypoint_spheres.release()
+        self.basic_sphere.release()
 
     def close_func(self): 
         if self.available:
@@ -584,18 +755,32 @@ class GLViewer:
             glutPostRedisplay()
 
     def update(self):
-        for body in self.bodies:
-            body.push_to_GPU()
+        self.skeleton_lines.push_to_GPU()
+        if self.use_instancing:
+            self.keypoint_spheres.push_to_GPU()
 
     def draw(self):
         glUseProgram(self.shader_sk_image.get_program_id())
         glUniformMatrix4fv(self.shader_sk_MVP, 1, GL_TRUE,  (GLfloat * len(self.projection))(*self.projection))
         
         glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-        for body in self.bodies:
-            body.draw(self.shader_sphere_clr, self.basic_sphere, self.shader_sphere_MVP, self.projection)
+        if self.skeleton_lines.count:
+            self.skeleton_lines.bind(0)
+            # 线段的法线都一样，用常量属性代替法线缓冲
+            glVertexAttrib3f(1, 0.3, 0.3, 0.3)
+            for body in self.bodies:
+                body.draw(self.shader_sk_clr)
+            glDisableVertexAttribArray(0)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
         glUseProgram(0)
 
+        if self.use_instancing:
+            glUseProgram(self.shader_instanced_sphere.get_program_id())
+            glUniformMatrix4fv(self.shader_instanced_sphere_MVP, 1, GL_TRUE,  (GLfloat * len(self.projection))(*self.projection))
+            self.keypoint_spheres.draw()
+            glUseProgram(0)
+            return
+
         glUseProgram(self.shader_sphere_image.get_program_id())
         glUniformMatrix4fv(self.shader_sphere_MVP, 1, GL_TRUE,  (GLfloat * len(self.projection))(*self.projection))
         for body in self.bodies: